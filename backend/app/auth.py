@@ -0,0 +1,164 @@
+import os
+import hmac
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+# Argon2 cost, tunable per deployment. Defaults match passlib's (t=3, 64 MiB, p=4).
+# Hashes made with other settings still verify and are re-hashed on the next login.
+ARGON2_SETTINGS = {
+    "argon2__time_cost": int(os.getenv("ARGON2_TIME_COST", 3)),
+    "argon2__memory_cost": int(os.getenv("ARGON2_MEMORY_KIB", 65536)),
+    "argon2__parallelism": int(os.getenv("ARGON2_PARALLELISM", 4)),
+}
+
+# Hashing runs in its own processes so it can never occupy the FastAPI threadpool.
+# 0 workers keeps it in-process (on a worker thread), e.g. for environments without fork/spawn.
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(2, os.cpu_count() or 1)))
+# Requests beyond this many queued hashes wait on the semaphore instead of piling into the pool
+HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE", max(1, HASH_WORKERS) * 8))
+
+SESSION_TTL = int(os.getenv("SESSION_TTL_SECONDS", 12 * 3600))
+# Without SESSION_SECRET, a key is generated once and kept in this file, so every worker
+# (and the next restart) signs and accepts the same tokens
+SESSION_SECRET_FILE = os.getenv("SESSION_SECRET_FILE", "./.session_secret")
+
+def _load_or_create_secret(path: str) -> str:
+    try:
+        with open(path) as f:
+            secret = f.read().strip()
+        if secret:
+            return secret
+    except FileNotFoundError:
+        pass
+    # Written to a temp file and linked into place: link() fails if another worker got
+    # there first, and nobody ever reads a half-written key
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(secrets.token_hex(32))
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.link(tmp, path)
+        print(f"⚠️ SESSION_SECRET not set. Generated one in {path}.")
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp)
+    with open(path) as f:
+        return f.read().strip()
+
+SESSION_SECRET = os.getenv("SESSION_SECRET", "") or _load_or_create_secret(SESSION_SECRET_FILE)
+
+# --- worker side (runs inside the pool processes) ---
+
+_context = None
+
+def _pwd_context():
+    global _context
+    if _context is None:
+        from passlib.context import CryptContext
+        _context = CryptContext(schemes=["argon2"], deprecated="auto", **ARGON2_SETTINGS)
+    return _context
+
+def _warm():
+    _pwd_context()
+
+def _hash(password: str) -> str:
+    return _pwd_context().hash(password)
+
+def _verify_and_update(password: str, hashed: str):
+    """(ok, new_hash): new_hash is set when the stored hash used outdated cost settings."""
+    try:
+        return _pwd_context().verify_and_update(password, hashed)
+    except (ValueError, TypeError):
+        return False, None
+
+# --- API side ---
+
+class PasswordHasher:
+    """
+    Bounded process pool for argon2. start() is called on the event loop thread at
+    the top of the app lifespan, so the workers fork before the warm-up and DB
+    driver threads exist; if it wasn't, the first hash starts the pool.
+    """
+    def __init__(self, workers: int = HASH_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self._pool = None
+        self._slots = asyncio.Semaphore(queue_limit)
+
+    def _executor(self):
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def start(self):
+        pool = self._executor()
+        if pool is not None:
+            # Fork every worker now and build its CryptContext ahead of the first login
+            for future in [pool.submit(_warm) for _ in range(self.workers)]:
+                future.result()
+
+    async def _run(self, fn, *args):
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        ok, _ = await self._run(_verify_and_update, password, hashed)
+        return ok
+
+    async def verify_and_update(self, password: str, hashed: str):
+        return await self._run(_verify_and_update, password, hashed)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+password_hasher = PasswordHasher()
+
+# --- Session tokens ---
+# <base64url(json claims)>.<base64url(hmac-sha256)>: verifying one is a single HMAC,
+# no database or argon2 work. Claims: uid, prem, exp.
+
+class InvalidSessionToken(Exception):
+    pass
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+def issue_session_token(user_id: int, is_premium: bool = False, ttl: int = SESSION_TTL) -> str:
+    claims = {"uid": user_id, "prem": bool(is_premium), "exp": int(time.time()) + ttl}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+def read_session_token(token: str) -> dict:
+    try:
+        payload, signature = token.split(".", 1)
+    except (AttributeError, ValueError):
+        raise InvalidSessionToken("Malformed session token")
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidSessionToken("Bad session signature")
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise InvalidSessionToken("Malformed session token")
+    if claims.get("exp", 0) < time.time():
+        raise InvalidSessionToken("Session expired")
+    return claims
@@ -0,0 +1,389 @@
+"""
+Cross-worker message bus for the WebSocket layer.
+
+ConnectionManager delivers to its own sockets directly and uses a backplane to reach
+sockets held by other uvicorn workers: room and duel broadcasts are published on
+channels, and the matchmaking queue lives in one place so players on different
+workers can be paired.
+
+  WS_BACKPLANE=local   (default) single process, nothing leaves the worker
+  WS_BACKPLANE=unix    every worker connects to one broker over a Unix socket:
+                           python -m app.backplane --socket /tmp/deepblue-backplane.sock
+
+Running several workers (uvicorn --workers N, one host):
+  - WS_BACKPLANE=unix with the broker running; "local" keeps rooms, duels and the
+    match queue inside each worker.
+  - Session tokens: set SESSION_SECRET, or let the workers share the key generated in
+    SESSION_SECRET_FILE (app/auth.py).
+  - Mail outbox and OTP codes are in the database; a mail row is claimed by one worker.
+  - Still per worker, by design: the CPU scheduler's quotas (a user's effective rate is
+    up to N times CPU_USER_RATE), the analysis cache, the AI circuit breaker, and the
+    leaderboard and solved-mission caches (bounded by their TTLs).
+"""
+import os
+import abc
+import json
+import asyncio
+import argparse
+from collections import deque
+from app.matchmaking import MatchQueue, MATCH_SWEEP_INTERVAL
+
+BACKPLANE = os.getenv("WS_BACKPLANE", "local")
+BACKPLANE_SOCKET = os.getenv("WS_BACKPLANE_SOCKET", "/tmp/deepblue-backplane.sock")
+RECONNECT_MAX = 5.0
+# Largest frame either side accepts. Room snapshots carry documents of up to
+# WS_SYNC_MAX_CHARS characters, escaped twice (message JSON inside frame JSON), so this
+# is several times that; larger frames are refused by the sender and skipped by the reader
+BACKPLANE_MAX_FRAME = int(os.getenv("WS_BACKPLANE_MAX_FRAME", 8 * 1024 * 1024))
+# Bytes queued for one peer before new frames to it are dropped (a peer that stopped reading)
+BACKPLANE_MAX_BACKLOG = int(os.getenv("WS_BACKPLANE_MAX_BACKLOG", 32 * 1024 * 1024))
+
+class Backplane(abc.ABC):
+    """
+    Interface used by ConnectionManager. All calls are non-blocking; results arrive
+    through the callbacks passed to start():
+      on_message(channel, kind, text)     a message another worker published
+      on_matched(duel_id, tickets)        a pair formed that includes one of our tickets
+      on_expired(tickets)                 some of our tickets timed out unmatched
+    publish() never echoes back to the publishing worker.
+    """
+    async def start(self, on_message, on_matched, on_expired=None):
+        self.on_message, self.on_matched = on_message, on_matched
+        self.on_expired = on_expired or (lambda tickets: None)
+
+    async def stop(self):
+        pass
+
+    def subscribe(self, channel: str):
+        pass
+
+    def unsubscribe(self, channel: str):
+        pass
+
+    def publish(self, channel: str, kind: str, text: str):
+        pass
+
+    @abc.abstractmethod
+    def match(self, ticket: dict):
+        """Queues a match ticket; its pair arrives through on_matched."""
+
+    @abc.abstractmethod
+    def cancel_match(self, ticket_id: str):
+        """Withdraws a ticket that hasn't been matched yet."""
+
+    def queue_stats(self) -> dict:
+        """The shared match queue's depth and wait times, as last known to this worker."""
+        return {}
+
+class InProcessBackplane(Backplane):
+    """Single worker: there is nobody to publish to, and the match queue is local."""
+    def __init__(self):
+        self.queue = MatchQueue()
+        self._task = None
+
+    async def start(self, on_message, on_matched, on_expired=None):
+        await super().start(on_message, on_matched, on_expired)
+        self._task = asyncio.create_task(self._sweeper())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(MATCH_SWEEP_INTERVAL)
+            pairs, expired = self.queue.sweep()
+            for paired in pairs:
+                self.on_matched(*paired)
+            if expired:
+                self.on_expired(expired)
+
+    def match(self, ticket: dict):
+        paired = self.queue.add(ticket)
+        if paired:
+            # Deliver on the next loop turn, as a remote broker would
+            asyncio.get_running_loop().call_soon(self.on_matched, *paired)
+
+    def cancel_match(self, ticket_id: str):
+        self.queue.cancel(ticket_id)
+
+    def queue_stats(self) -> dict:
+        return self.queue.stats()
+
+def _frame(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode() + b"\n"
+
+async def _read_frame(reader):
+    """
+    The next frame's bytes, b"" at end of stream, or None for a frame over the limit
+    (it is read past and dropped, the connection stays up). The reader is opened with
+    limit=BACKPLANE_MAX_FRAME.
+    """
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    except asyncio.LimitOverrunError:
+        pass
+    while True:
+        try:
+            await reader.readuntil(b"\n")
+            return None
+        except asyncio.IncompleteReadError:
+            return b""
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(max(e.consumed, 1))
+
+class _Outbox:
+    """
+    Frames queued for one peer and written by a single task that awaits drain() after
+    each, so a slow peer fills this bounded queue rather than the transport's buffer.
+    Past BACKPLANE_MAX_BACKLOG bytes new frames are dropped until it catches up.
+    """
+    def __init__(self, writer, max_backlog: int = BACKPLANE_MAX_BACKLOG):
+        self.writer = writer
+        self.max_backlog = max_backlog
+        self.frames = deque()
+        self.size = 0
+        self.dropped = 0
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._pump())
+
+    def put(self, data: bytes) -> bool:
+        if len(data) > BACKPLANE_MAX_FRAME:
+            print(f"⚠️ Backplane frame of {len(data)} bytes exceeds WS_BACKPLANE_MAX_FRAME; not sent")
+            return False
+        if self.size + len(data) > self.max_backlog or self.writer.is_closing():
+            self.dropped += 1
+            return False
+        self.frames.append(data)
+        self.size += len(data)
+        self._ready.set()
+        return True
+
+    async def _pump(self):
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while self.frames:
+                    data = self.frames.popleft()
+                    self.size -= len(data)
+                    self.writer.write(data)
+                    await self.writer.drain()
+        except (OSError, ConnectionError):
+            pass
+
+    def close(self):
+        self._task.cancel()
+        self.writer.close()
+
+class SocketBackplane(Backplane):
+    """
+    Client side of the Unix-socket broker. Frames are newline-delimited JSON of at most
+    BACKPLANE_MAX_FRAME bytes.
+    If the broker goes away the client reconnects with backoff and replays its
+    subscriptions and open match tickets, so a broker restart only loses in-flight messages.
+    """
+    def __init__(self, worker_id: str, path: str = BACKPLANE_SOCKET):
+        self.worker_id = worker_id
+        self.path = path
+        self.channels = set()
+        self.tickets = {}  # open match tickets, replayed on reconnect
+        self._outbox = None
+        self._task = None
+        self._queue_stats = {}
+        self.connected = asyncio.Event()
+
+    async def start(self, on_message, on_matched, on_expired=None):
+        await super().start(on_message, on_matched, on_expired)
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self.connected.wait(), timeout=5.0)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Backplane broker not reachable at {self.path}; retrying in the background")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self._outbox:
+            self._outbox.close()
+
+    def _send(self, obj):
+        if self._outbox is not None:
+            self._outbox.put(_frame(obj))
+
+    async def _run(self):
+        delay = 0.1
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=BACKPLANE_MAX_FRAME)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(RECONNECT_MAX, delay * 2)
+                continue
+            delay = 0.1
+            self._outbox = _Outbox(writer)
+            self._send({"op": "hello", "worker": self.worker_id})
+            for channel in self.channels:
+                self._send({"op": "sub", "ch": channel})
+            for ticket in self.tickets.values():
+                self._send({"op": "match", "ticket": ticket})
+            self.connected.set()
+            try:
+                while (line := await _read_frame(reader)) != b"":
+                    if line is None:
+                        print("⚠️ Backplane frame over WS_BACKPLANE_MAX_FRAME skipped")
+                        continue
+                    self._dispatch(json.loads(line))
+            except (OSError, ValueError):
+                pass
+            self.connected.clear()
+            self._outbox.close()
+            self._outbox = None
+            print("⚠️ Backplane connection lost; reconnecting")
+
+    def _dispatch(self, frame):
+        if frame["op"] == "msg":
+            self.on_message(frame["ch"], frame["kind"], frame["text"])
+        elif frame["op"] == "matched":
+            for ticket in frame["tickets"]:
+                self.tickets.pop(ticket["id"], None)
+            self.on_matched(frame["duel_id"], frame["tickets"])
+        elif frame["op"] == "expired":
+            for ticket in frame["tickets"]:
+                self.tickets.pop(ticket["id"], None)
+            self.on_expired(frame["tickets"])
+        elif frame["op"] == "queue_stats":
+            self._queue_stats = frame["stats"]
+
+    def subscribe(self, channel: str):
+        if channel not in self.channels:
+            self.channels.add(channel)
+            self._send({"op": "sub", "ch": channel})
+
+    def unsubscribe(self, channel: str):
+        if channel in self.channels:
+            self.channels.discard(channel)
+            self._send({"op": "unsub", "ch": channel})
+
+    def publish(self, channel: str, kind: str, text: str):
+        self._send({"op": "pub", "ch": channel, "kind": kind, "text": text})
+
+    def match(self, ticket: dict):
+        self.tickets[ticket["id"]] = ticket
+        self._send({"op": "match", "ticket": ticket})
+
+    def cancel_match(self, ticket_id: str):
+        self.tickets.pop(ticket_id, None)
+        self._send({"op": "cancel", "id": ticket_id})
+
+    def queue_stats(self) -> dict:
+        return self._queue_stats
+
+class BackplaneBroker:
+    """
+    The one process every worker connects to. Routes published messages to the other
+    subscribed workers and owns the shared MatchQueue; after each sweep it sends every
+    worker the queue's stats. Each worker connection is written through an _Outbox.
+    """
+    def __init__(self, path: str = BACKPLANE_SOCKET):
+        self.path = path
+        self.queue = MatchQueue()
+        self.subscribers = {}  # channel -> set of outboxes
+        self.workers = {}  # outbox -> worker id
+        self.outbox_for_worker = {}
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._client, path=self.path, limit=BACKPLANE_MAX_FRAME)
+        print(f"🛰️ Backplane broker listening on {self.path}")
+        sweeper = asyncio.create_task(self._sweeper())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(MATCH_SWEEP_INTERVAL)
+            pairs, expired = self.queue.sweep()
+            for paired in pairs:
+                self._announce(*paired)
+            for worker in {t["worker"] for t in expired}:
+                self._to_worker(worker, _frame({"op": "expired", "tickets": [t for t in expired if t["worker"] == worker]}))
+            data = _frame({"op": "queue_stats", "stats": self.queue.stats()})
+            for outbox in self.workers:
+                outbox.put(data)
+
+    async def _client(self, reader, writer):
+        channels = set()
+        outbox = _Outbox(writer)
+        try:
+            while (line := await _read_frame(reader)) != b"":
+                if line is None:
+                    print(f"⚠️ Frame over WS_BACKPLANE_MAX_FRAME from {self.workers.get(outbox)} skipped")
+                    continue
+                frame = json.loads(line)
+                op = frame.get("op")
+                if op == "hello":
+                    self.workers[outbox] = frame["worker"]
+                    self.outbox_for_worker[frame["worker"]] = outbox
+                elif op == "sub":
+                    self.subscribers.setdefault(frame["ch"], set()).add(outbox)
+                    channels.add(frame["ch"])
+                elif op == "unsub":
+                    self._unsubscribe(frame["ch"], outbox)
+                    channels.discard(frame["ch"])
+                elif op == "pub":
+                    data = _frame({"op": "msg", "ch": frame["ch"], "kind": frame["kind"], "text": frame["text"]})
+                    for subscriber in self.subscribers.get(frame["ch"], ()):
+                        if subscriber is not outbox:
+                            subscriber.put(data)
+                elif op == "match":
+                    paired = self.queue.add(frame["ticket"])
+                    if paired:
+                        self._announce(*paired)
+                elif op == "cancel":
+                    self.queue.cancel(frame["id"])
+        except (OSError, ValueError):
+            pass
+        finally:
+            for channel in channels:
+                self._unsubscribe(channel, outbox)
+            worker = self.workers.pop(outbox, None)
+            if worker is not None:
+                if self.outbox_for_worker.get(worker) is outbox:
+                    del self.outbox_for_worker[worker]
+                self.queue.drop_worker(worker)
+            outbox.close()
+
+    def _unsubscribe(self, channel, outbox):
+        members = self.subscribers.get(channel)
+        if members is not None:
+            members.discard(outbox)
+            if not members:
+                del self.subscribers[channel]
+
+    def _announce(self, duel_id, tickets):
+        data = _frame({"op": "matched", "duel_id": duel_id, "tickets": tickets})
+        for worker in {t["worker"] for t in tickets}:
+            self._to_worker(worker, data)
+
+    def _to_worker(self, worker, data: bytes):
+        outbox = self.outbox_for_worker.get(worker)
+        if outbox is not None:
+            outbox.put(data)
+
+def create_backplane(worker_id: str) -> Backplane:
+    if BACKPLANE == "unix":
+        return SocketBackplane(worker_id, BACKPLANE_SOCKET)
+    return InProcessBackplane()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the WebSocket backplane broker for multi-worker deployments.")
+    parser.add_argument("--socket", default=BACKPLANE_SOCKET)
+    args = parser.parse_args()
+    asyncio.run(BackplaneBroker(args.socket).serve())
@@ -0,0 +1,189 @@
+import os
+import json
+import asyncio
+from app.realtime import encode
+
+# Edits arriving within this window are flushed to the room as one delta
+SYNC_DEBOUNCE = float(os.getenv("WS_SYNC_DEBOUNCE_MS", 50)) / 1000
+MAX_DOCUMENT_CHARS = int(os.getenv("WS_SYNC_MAX_CHARS", 200_000))
+
+class InvalidEdit(Exception):
+    pass
+
+def apply_ops(text: str, ops) -> str:
+    """Applies range-replace ops in order; each op's offsets refer to the text after the previous op."""
+    for op in ops:
+        try:
+            start, end, insert = int(op["from"]), int(op["to"]), str(op.get("text", ""))
+        except (KeyError, TypeError, ValueError):
+            raise InvalidEdit("Malformed op")
+        if not 0 <= start <= end <= len(text):
+            raise InvalidEdit(f"Range {start}-{end} outside document of length {len(text)}")
+        text = text[:start] + insert + text[end:]
+        if len(text) > MAX_DOCUMENT_CHARS:
+            raise InvalidEdit("Document too large")
+    return text
+
+def diff_op(old: str, new: str):
+    """Smallest single range-replace turning old into new (common prefix/suffix trim), or None."""
+    if old == new:
+        return None
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end_old, end_new = len(old), len(new)
+    while end_old > start and end_new > start and old[end_old - 1] == new[end_new - 1]:
+        end_old -= 1
+        end_new -= 1
+    return {"from": start, "to": end_old, "text": new[start:end_new]}
+
+class RoomDocument:
+    """
+    The authoritative text for one room. `version` counts accepted edit batches;
+    `flushed_text`/`flushed_version` are what the room was last told about.
+    """
+    __slots__ = ("text", "version", "flushed_text", "flushed_version", "contributors", "timer")
+
+    def __init__(self):
+        self.text = ""
+        self.version = 0
+        self.flushed_text = ""
+        self.flushed_version = 0
+        self.contributors = set()
+        self.timer = None
+
+class CodeSyncHub:
+    """
+    Server side of the collaborative editor protocol.
+
+      client -> server  {"type": "code_ops", "base_version": n, "ops": [{"from", "to", "text"}, ...]}
+                        {"type": "code_sync", "code": "..."}        (full replace, legacy clients)
+                        {"type": "code_snapshot_request"}
+      server -> client  {"type": "code_delta", "base_version": n, "version": m, "ops": [...]}
+                        {"type": "code_snapshot", "version": m, "code": "..."}
+
+    Edits are applied to the room document immediately, but the room only hears about
+    them once per debounce window, as a single diff of everything that changed.
+    A reader whose version doesn't match a delta's base_version (it missed one, e.g.
+    dropped by the slow-consumer policy) asks for a snapshot; so does a late joiner.
+
+    Across workers, flushed deltas are published on the room's backplane channel and
+    every worker with members in the room keeps a replica by applying them. A worker
+    without an up-to-date replica asks the others for one ("sync:snapshot_request").
+    The writer's worker is the authority, so cross-worker rooms assume a single writer
+    (the pilot); concurrent writers on different workers fall back to snapshots.
+    """
+    def __init__(self, manager, debounce: float = SYNC_DEBOUNCE):
+        self.manager = manager
+        self.debounce = debounce
+        self.documents: dict[str, RoomDocument] = {}
+        self.pending: dict[str, set] = {}  # room -> local sockets waiting for a remote snapshot
+        # bytes_in counts inserted text only; bytes_out is the encoded deltas as sent
+        self.stats = {"ops_in": 0, "bytes_in": 0, "deltas_out": 0, "bytes_out": 0, "rejected": 0}
+        manager.room_closed_hooks.append(self.close_room)
+        manager.channel_hooks.append(self._on_remote)
+
+    def snapshot(self, websocket, session_id: str):
+        doc = self.documents.get(session_id)
+        if doc is None:
+            # Another worker may hold the room's document
+            self.pending.setdefault(session_id, set()).add(websocket)
+            self.manager.publish_room(session_id, ("sync:snapshot_request", "{}"))
+            return
+        self.manager.send(websocket, {"type": "code_snapshot", "version": doc.version, "code": doc.text})
+
+    def _accept(self, websocket, session_id, doc, new_text):
+        doc.text = new_text
+        doc.version += 1
+        doc.contributors.add(websocket)
+        if doc.timer is None:
+            doc.timer = asyncio.get_running_loop().call_later(self.debounce, self._flush, session_id)
+
+    def submit_ops(self, websocket, session_id: str, base_version: int, ops):
+        doc = self.documents.setdefault(session_id, RoomDocument())
+        self.stats["ops_in"] += 1
+        self.stats["bytes_in"] += sum(len(str(op.get("text", ""))) for op in ops if isinstance(op, dict))
+        if base_version != doc.version:
+            # Edited against an old version (another writer got in first): resync the sender
+            self.stats["rejected"] += 1
+            self.snapshot(websocket, session_id)
+            return
+        try:
+            new_text = apply_ops(doc.text, ops)
+        except InvalidEdit:
+            self.stats["rejected"] += 1
+            self.snapshot(websocket, session_id)
+            return
+        self._accept(websocket, session_id, doc, new_text)
+
+    def submit_full(self, websocket, session_id: str, code: str):
+        doc = self.documents.setdefault(session_id, RoomDocument())
+        self.stats["ops_in"] += 1
+        self.stats["bytes_in"] += len(code or "")
+        self._accept(websocket, session_id, doc, (code or "")[:MAX_DOCUMENT_CHARS])
+
+    def _flush(self, session_id: str):
+        doc = self.documents.get(session_id)
+        if doc is None:
+            return
+        doc.timer = None
+        contributors, doc.contributors = doc.contributors, set()
+        op = diff_op(doc.flushed_text, doc.text)
+        base_version, doc.flushed_version, doc.flushed_text = doc.flushed_version, doc.version, doc.text
+        if op is None and base_version == doc.version:
+            return
+        # An edit undone within the window still bumps versions, so readers get an empty delta
+        delta = {"type": "code_delta", "base_version": base_version, "version": doc.version, "ops": [op] if op else []}
+        members = self.manager.active_rooms.get(session_id, ())
+        encoded = encode(delta)
+        self.manager.publish_room(session_id, encoded)
+        if len(contributors) == 1:
+            # The lone writer already has this text (and tracks versions itself)
+            sent = self.manager.fan_out(members, encoded, sender=next(iter(contributors)))
+        else:
+            # Several writers in one window: their local copies diverge, so each gets a snapshot
+            sent = self.manager.fan_out([ws for ws in members if ws not in contributors], encoded)
+            for writer in contributors:
+                self.snapshot(writer, session_id)
+        self.stats["deltas_out"] += sent
+        self.stats["bytes_out"] += sent * len(encoded[1])
+
+    def _on_remote(self, channel: str, kind: str, text: str):
+        scope, _, session_id = channel.partition(":")
+        if scope != "room":
+            return
+        doc = self.documents.get(session_id)
+        if kind == "code_delta":
+            delta = json.loads(text)
+            if doc is None and delta["base_version"] == 0:
+                doc = self.documents[session_id] = RoomDocument()
+            if doc is None:
+                return
+            if doc.version != delta["base_version"] or doc.timer is not None:
+                # Our replica diverged (missed a delta, or a local writer raced a remote one)
+                self.close_room(session_id)
+                return
+            try:
+                doc.text = apply_ops(doc.text, delta["ops"])
+            except InvalidEdit:
+                self.close_room(session_id)
+                return
+            doc.version = doc.flushed_version = delta["version"]
+            doc.flushed_text = doc.text
+        elif kind == "sync:snapshot_request" and doc is not None and doc.timer is None:
+            self.manager.publish_room(session_id, ("sync:snapshot", json.dumps({"version": doc.version, "code": doc.text})))
+        elif kind == "sync:snapshot":
+            snap = json.loads(text)
+            if doc is None or (doc.timer is None and doc.version < snap["version"]):
+                doc = self.documents[session_id] = RoomDocument()
+                doc.text = doc.flushed_text = snap["code"]
+                doc.version = doc.flushed_version = snap["version"]
+            for websocket in self.pending.pop(session_id, ()):
+                self.snapshot(websocket, session_id)
+
+    def close_room(self, session_id: str):
+        self.pending.pop(session_id, None)
+        doc = self.documents.pop(session_id, None)
+        if doc is not None and doc.timer is not None:
+            doc.timer.cancel()
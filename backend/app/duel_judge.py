@@ -0,0 +1,172 @@
+import os
+import json
+import uuid
+import asyncio
+from app.mission_catalog import mission_catalog, entry_point
+from app.engine.executor import judge_solution
+
+# Timed batches per solution, each repeating the mission's test cases for at least
+# JUDGE_MIN_BATCH seconds (app/engine/executor.py)
+DUEL_REPEATS = int(os.getenv("DUEL_REPEATS", 7))
+DUEL_JUDGE_TIMEOUT = float(os.getenv("DUEL_JUDGE_TIMEOUT", 10.0))
+# After the first submission the opponent has this long to submit before judging starts
+DUEL_SUBMIT_GRACE = float(os.getenv("DUEL_SUBMIT_GRACE", 60.0))
+# Medians closer than this (relative) are a draw: below it the difference is timer noise
+DUEL_TIE_TOLERANCE = float(os.getenv("DUEL_TIE_TOLERANCE", 0.03))
+MAX_SOLUTION_CHARS = 50_000
+
+# Judging runs one solution at a time per worker, so timings don't compete for the CPU
+_judge_slot = asyncio.Semaphore(int(os.getenv("DUEL_JUDGE_CONCURRENCY", 1)))
+
+def duel_mission(duel_id: str):
+    """
+    The mission both players solve. Derived from the duel id, like the challenge
+    question, so every worker picks the same one. Only single-file missions with test
+    cases and no database fixture can be judged server-side.
+    """
+    candidates = [m for m in mission_catalog.snapshot().missions
+                  if m.get("test_cases") and not (m.get("meta") or {}).get("needs_db")
+                  and entry_point(m.get("starter_code"))]
+    if not candidates:
+        return None
+    candidates.sort(key=lambda m: m["id"])
+    return candidates[uuid.UUID(duel_id).int % len(candidates)]
+
+def decide(results: dict):
+    """Winning seat by correctness (all cases, then cases passed), then median runtime; None for a draw."""
+    def key(seat):
+        r = results[seat]
+        return (r["correct"], r["passed"])
+    a, b = results
+    if key(a) != key(b):
+        return a if key(a) > key(b) else b
+    ra, rb = results[a], results[b]
+    if not ra["correct"]:
+        return None
+    fast, slow = sorted((ra["median_ms"], rb["median_ms"]))
+    if slow - fast <= DUEL_TIE_TOLERANCE * slow:
+        return None
+    return a if ra["median_ms"] == fast else b
+
+class DuelJudge:
+    """
+    Decides duels by running both players' code on the server.
+
+      server -> client  {"type": "duel_mission", "mission": {...}}               after duel_start
+      client -> server  {"type": "duel_submit", "code": "..."}
+      server -> client  {"type": "opponent_submitted"}
+                        {"type": "duel_end", "result": "win"|"lose"|"draw", "reason": "judged",
+                         "you": {...}, "opponent": {...}}
+
+    Submissions are published on the duel's backplane channel, so the duel's host worker
+    (the first seat's) sees both even when the players are on different workers. The
+    host judges once both are in, or DUEL_SUBMIT_GRACE after the first, then publishes
+    the result and every worker sends each of its players their side of it.
+    """
+    def __init__(self, manager):
+        self.manager = manager
+        self.submissions: dict[str, dict] = {}  # duel_id -> seat -> code
+        self.timers: dict = {}
+        self.judging: set = set()
+        self.stats = {"judged": 0, "runs": 0, "draws": 0}
+        manager.duel_started_hooks.append(self._on_started)
+        manager.duel_closed_hooks.append(self._on_closed)
+        manager.channel_hooks.append(self._on_remote)
+
+    def _on_started(self, duel_id: str, sockets):
+        mission = duel_mission(duel_id)
+        if mission is not None:
+            self.manager.fan_out(sockets, {"type": "duel_mission", "mission": dict(mission)})
+
+    def _on_closed(self, duel_id: str):
+        self.submissions.pop(duel_id, None)
+        timer = self.timers.pop(duel_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def submit(self, websocket, code: str):
+        duel_id = self.manager.ws_to_duel.get(websocket)
+        seat = self.manager.seat_of.get(websocket)
+        if duel_id is None or seat is None or duel_id in self.judging:
+            return
+        code = (code or "")[:MAX_SOLUTION_CHARS]
+        self.manager.backplane.publish("duel:" + duel_id, "sync:duel_submit", json.dumps({"seat": seat, "code": code}))
+        self._record(duel_id, seat, code)
+        self.manager.fan_out(self.manager.active_duels.get(duel_id, ()), {"type": "opponent_submitted"}, sender=websocket)
+
+    def _record(self, duel_id: str, seat: str, code: str):
+        info = self.manager.duel_info.get(duel_id)
+        if info is None:
+            return
+        self.submissions.setdefault(duel_id, {})[seat] = code
+        if info["host"] != self.manager.worker_id or duel_id in self.judging:
+            return
+        if len(self.submissions[duel_id]) == len(info["seats"]):
+            self._start_judging(duel_id)
+        elif duel_id not in self.timers:
+            self.timers[duel_id] = asyncio.get_running_loop().call_later(DUEL_SUBMIT_GRACE, self._start_judging, duel_id)
+
+    def _start_judging(self, duel_id: str):
+        timer = self.timers.pop(duel_id, None)
+        if timer is not None:
+            timer.cancel()
+        if duel_id not in self.judging:
+            self.judging.add(duel_id)
+            asyncio.create_task(self._judge(duel_id))
+
+    async def _judge(self, duel_id: str):
+        try:
+            info = self.manager.duel_info.get(duel_id)
+            mission = duel_mission(duel_id)
+            if info is None or mission is None:
+                return
+            function_name = entry_point(mission["starter_code"])
+            submitted = dict(self.submissions.get(duel_id, {}))
+            results = {}
+            for seat in info["seats"]:
+                code = submitted.get(seat)
+                if code is None:
+                    results[seat] = {"correct": False, "passed": 0, "total": len(mission["test_cases"]),
+                                     "error": "No submission", "runs_ms": [], "median_ms": None, "loops": None}
+                    continue
+                async with _judge_slot:
+                    results[seat] = await asyncio.to_thread(
+                        judge_solution, code, function_name, mission["test_cases"], DUEL_REPEATS, DUEL_JUDGE_TIMEOUT)
+                self.stats["runs"] += 1
+            winner = decide(results)
+            self.stats["judged"] += 1
+            if winner is None:
+                self.stats["draws"] += 1
+            verdict = {"mission_id": mission["id"], "winner": winner, "results": results}
+            self.manager.backplane.publish("duel:" + duel_id, "sync:duel_result", json.dumps(verdict))
+            self._deliver(duel_id, verdict)
+        finally:
+            self.judging.discard(duel_id)
+
+    def _deliver(self, duel_id: str, verdict: dict):
+        results, winner = verdict["results"], verdict["winner"]
+        for websocket in tuple(self.manager.active_duels.get(duel_id, ())):
+            seat = self.manager.seat_of.get(websocket)
+            if seat not in results:
+                continue
+            opponent = next((s for s in results if s != seat), None)
+            self.manager.send(websocket, {
+                "type": "duel_end",
+                "result": "draw" if winner is None else ("win" if winner == seat else "lose"),
+                "reason": "judged",
+                "mission_id": verdict["mission_id"],
+                "you": results[seat],
+                "opponent": results.get(opponent),
+            })
+        self.manager.end_duel(duel_id)
+
+    def _on_remote(self, channel: str, kind: str, text: str):
+        scope, _, duel_id = channel.partition(":")
+        if scope != "duel":
+            return
+        if kind == "sync:duel_submit":
+            submission = json.loads(text)
+            self._record(duel_id, submission["seat"], submission["code"])
+            self.manager.fan_out(self.manager.active_duels.get(duel_id, ()), {"type": "opponent_submitted"})
+        elif kind == "sync:duel_result":
+            self._deliver(duel_id, json.loads(text))
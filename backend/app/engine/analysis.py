@@ -0,0 +1,239 @@
+import os
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+from app.engine.ast_parser import graph_from_tree
+from app.engine.static_rules import report_for_tree, report_for_error
+
+try:
+    import radon.complexity as radon_cc
+except ImportError:
+    radon_cc = None
+
+# Parsed trees kept for passes that haven't run yet; results live as long as their entry
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", 256))
+
+class ParsedCode:
+    """
+    One cache entry: the code parsed once, plus each pass's result as it's computed.
+    `tree` is None when the parser rejected the code; `error` then holds the exception.
+    """
+    __slots__ = ("code", "key", "tree", "error", "results")
+
+    def __init__(self, code: str, key: str):
+        self.code = code
+        self.key = key
+        self.tree = None
+        self.error = None
+        self.results = {}
+        try:
+            self.tree = ast.parse(code)
+        except (SyntaxError, ValueError, RecursionError) as e:
+            self.error = e
+
+class AnalysisPass:
+    """
+    Base class for a pass. run() gets the shared tree; on_error() answers for code that
+    didn't parse. Results are cached and shared between callers: treat them as read-only.
+    """
+    name = ""
+
+    def run(self, parsed: ParsedCode):
+        raise NotImplementedError
+
+    def on_error(self, parsed: ParsedCode):
+        return {"error": str(parsed.error)}
+
+PASS_REGISTRY: dict[str, AnalysisPass] = {}
+
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+
+def clear_cache():
+    """Drops every cached result, e.g. when a pass or a static rule is registered."""
+    with _cache_lock:
+        _cache.clear()
+
+def register_pass(cls):
+    """Class decorator: instantiate the pass and make it available by name."""
+    analysis_pass = cls()
+    PASS_REGISTRY[analysis_pass.name] = analysis_pass
+    clear_cache()
+    return cls
+
+# --- PASSES ---
+
+@register_pass
+class GraphPass(AnalysisPass):
+    """3D graph for /analyze (same output as parse_code_to_3d)."""
+    name = "graph"
+
+    def run(self, parsed):
+        if not parsed.code.strip():
+            return {"error": "Code input is empty.", "nodes": [], "links": [], "line_index": {}}
+        return graph_from_tree(parsed.tree)
+
+    def on_error(self, parsed):
+        e = parsed.error
+        if isinstance(e, SyntaxError):
+            return {"error": f"Syntax Error: {e.msg} at line {e.lineno}", "nodes": [], "links": [], "line_index": {}}
+        return {"error": str(e), "nodes": [], "links": [], "line_index": {}}
+
+@register_pass
+class ComplexityPass(AnalysisPass):
+    """Cyclomatic complexity with radon, ranked for /analyze-quality."""
+    name = "complexity"
+
+    def run(self, parsed):
+        if not radon_cc:
+            return {"error": "Radon library not installed on server."}
+        try:
+            blocks = radon_cc.cc_visit_ast(parsed.tree)
+        except Exception as e:
+            return {"error": f"Analysis failed: {str(e)}"}
+        if not blocks:
+            return {"complexity_score": 1, "rank": "A", "feedback": "Simple script. Looks clean!"}
+
+        max_cc = max(block.complexity for block in blocks)
+        avg_cc = sum(block.complexity for block in blocks) / len(blocks)
+
+        if max_cc <= 5: rank, feedback = "A", "Pristine. Logic is simple and easy to read."
+        elif max_cc <= 10: rank, feedback = "B", "Acceptable. A bit of logic, but manageable."
+        elif max_cc <= 20: rank, feedback = "C", "Complex. Consider extracting methods or reducing nesting."
+        else: rank, feedback = "F", "Spaghetti Code detected! High risk of bugs. Refactor immediately."
+
+        return {
+            "complexity_score": max_cc,
+            "average_complexity": avg_cc,
+            "rank": rank,
+            "feedback": feedback,
+            "blocks": [{"name": b.name, "complexity": b.complexity} for b in blocks]
+        }
+
+    def on_error(self, parsed):
+        if not radon_cc:
+            return {"error": "Radon library not installed on server."}
+        return {"error": f"Analysis failed: {str(parsed.error)}"}
+
+@register_pass
+class IssuesPass(AnalysisPass):
+    """The static rules from static_rules.py (what the offline tutor answers from)."""
+    name = "issues"
+
+    def run(self, parsed):
+        return report_for_tree(parsed.tree)
+
+    def on_error(self, parsed):
+        return report_for_error(parsed.error)
+
+@register_pass
+class SymbolsPass(AnalysisPass):
+    """Functions (arguments and locals), classes (methods), imports and module-level names."""
+    name = "symbols"
+
+    def run(self, parsed):
+        functions, classes, imports, module_names = [], [], [], []
+        for node in parsed.tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                functions.append(self._function(node))
+            elif isinstance(node, ast.ClassDef):
+                methods = [self._function(n) for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+                classes.append({"name": node.name, "lineno": node.lineno, "methods": methods})
+            else:
+                module_names.extend(self._stored_names(node))
+        for node in ast.walk(parsed.tree):
+            if isinstance(node, ast.Import):
+                imports.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                imports.append("." * node.level + (node.module or ""))
+        return {
+            "functions": functions,
+            "classes": classes,
+            "imports": list(dict.fromkeys(imports)),
+            "globals": list(dict.fromkeys(module_names)),
+        }
+
+    @staticmethod
+    def _stored_names(node):
+        return [n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store)]
+
+    def _function(self, node):
+        args = node.args
+        params = [a.arg for a in args.posonlyargs + args.args + args.kwonlyargs]
+        if args.vararg:
+            params.append("*" + args.vararg.arg)
+        if args.kwarg:
+            params.append("**" + args.kwarg.arg)
+        local_names = [name for stmt in node.body for name in self._stored_names(stmt)]
+        return {
+            "name": node.name,
+            "lineno": node.lineno,
+            "args": params,
+            "locals": [name for name in dict.fromkeys(local_names) if name not in params],
+        }
+
+@register_pass
+class SpansPass(AnalysisPass):
+    """
+    Line extent of each statement, for joining line-level data (profiles) onto graph nodes:
+    `blocks` maps a statement's first line to its last, `decorated` maps a decorated
+    function's first decorator line (where its code object starts) to its `def` line.
+    """
+    name = "spans"
+
+    def run(self, parsed):
+        blocks, decorated = {}, {}
+        for node in ast.walk(parsed.tree):
+            if not isinstance(node, ast.stmt):
+                continue
+            end = node.end_lineno or node.lineno
+            blocks[node.lineno] = max(blocks.get(node.lineno, end), end)
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.decorator_list:
+                decorated[min(d.lineno for d in node.decorator_list)] = node.lineno
+        return {"blocks": blocks, "decorated": decorated}
+
+    def on_error(self, parsed):
+        return {"blocks": {}, "decorated": {}}
+
+# --- PIPELINE ---
+
+def _entry(code: str) -> ParsedCode:
+    key = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    with _cache_lock:
+        parsed = _cache.get(key)
+        if parsed is not None:
+            _cache.move_to_end(key)
+            return parsed
+    # Parse outside the lock; two threads racing on new code both parse, one entry wins
+    parsed = ParsedCode(code, key)
+    with _cache_lock:
+        parsed = _cache.setdefault(key, parsed)
+        _cache.move_to_end(key)
+        if len(_cache) > ANALYSIS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return parsed
+
+def analyze(code: str, passes=None) -> dict:
+    """
+    Results of the named passes (all registered passes by default) for this code,
+    keyed by pass name. The code is parsed once per hash and each pass runs at most
+    once per cache entry, however many endpoints ask for it.
+    """
+    parsed = _entry(code or "")
+    results = {}
+    for name in passes or PASS_REGISTRY:
+        result = parsed.results.get(name)
+        if result is None:
+            analysis_pass = PASS_REGISTRY[name]
+            try:
+                result = analysis_pass.run(parsed) if parsed.error is None else analysis_pass.on_error(parsed)
+            except Exception as e:
+                # e.g. RecursionError from a recursive visitor on very deep code
+                result = {"error": str(e)}
+            parsed.results[name] = result
+        results[name] = result
+    return results
+
+def code_hash(code: str) -> str:
+    return _entry(code or "").key
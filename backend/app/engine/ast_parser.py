@@ -99,6 +99,28 @@ class CodeTo3DVisitor(ast.NodeVisitor):
         
         self.generic_visit(node)
 
+def graph_from_tree(tree):
+    """Graph for an already parsed module (the analysis pipeline shares one tree between passes)."""
+    visitor = CodeTo3DVisitor()
+    visitor.visit(tree)
+
+    # Use integer IDs as numbers for strict JSON formatting
+    final_nodes = [{k: int(v) if k == 'id' else v for k, v in node.items()} for node in visitor.nodes]
+    final_links = [{k: int(v) if isinstance(v, str) and v.isdigit() else v for k, v in link.items()} for link in visitor.links]
+
+    return {"nodes": final_nodes, "links": final_links, "line_index": line_index(final_nodes)}
+
+def line_index(nodes):
+    """
+    Line number -> ids of the nodes on that line, in visit order (the first is the outermost
+    statement). Lets trace playback find the active node per step without scanning the graph.
+    """
+    index = {}
+    for node in nodes:
+        if "lineno" in node:
+            index.setdefault(node["lineno"], []).append(node["id"])
+    return index
+
 def parse_code_to_3d(code_string):
     """
     Parses Python code into an AST and converts it into a network graph structure.
@@ -106,18 +128,10 @@ def parse_code_to_3d(code_string):
     try:
         # Prevent parsing empty code to avoid unnecessary errors
         if not code_string.strip():
-             return {"error": "Code input is empty.", "nodes": [], "links": []}
+             return {"error": "Code input is empty.", "nodes": [], "links": [], "line_index": {}}
              
-        tree = ast.parse(code_string)
-        visitor = CodeTo3DVisitor()
-        visitor.visit(tree)
-        
-        # Use integer IDs as numbers for strict JSON formatting
-        final_nodes = [{k: int(v) if k == 'id' else v for k, v in node.items()} for node in visitor.nodes]
-        final_links = [{k: int(v) if isinstance(v, str) and v.isdigit() else v for k, v in link.items()} for link in visitor.links]
-        
-        return {"nodes": final_nodes, "links": final_links}
+        return graph_from_tree(ast.parse(code_string))
     except SyntaxError as e:
-        return {"error": f"Syntax Error: {e.msg} at line {e.lineno}", "nodes": [], "links": []}
+        return {"error": f"Syntax Error: {e.msg} at line {e.lineno}", "nodes": [], "links": [], "line_index": {}}
     except Exception as e:
-        return {"error": str(e), "nodes": [], "links": []}
\ No newline at end of file
+        return {"error": str(e), "nodes": [], "links": [], "line_index": {}}
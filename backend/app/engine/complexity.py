@@ -0,0 +1,298 @@
+import os
+import io
+import math
+import copy
+import time
+import queue as queue_module
+import random
+import signal
+import contextlib
+import multiprocessing
+from app.engine.executor import _solution_globals, sandbox_in_flight, sandbox_runs, sandbox_timeouts
+from app.mission_catalog import entry_point
+
+# Input sizes tried: 16, 32, ... up to COMPLEXITY_MAX_N, stopping early once the budget is spent
+COMPLEXITY_MIN_N = int(os.getenv("COMPLEXITY_MIN_N", 16))
+COMPLEXITY_MAX_N = int(os.getenv("COMPLEXITY_MAX_N", 1 << 16))
+COMPLEXITY_REPEATS = int(os.getenv("COMPLEXITY_REPEATS", 5))
+# Seconds of measuring inside the sandbox, and the hard limit for the whole process
+COMPLEXITY_BUDGET = float(os.getenv("COMPLEXITY_BUDGET", 4.0))
+COMPLEXITY_TIMEOUT = float(os.getenv("COMPLEXITY_TIMEOUT", 8.0))
+# Fits whose error is within this factor of the best one count as ties; the simplest tie wins
+COMPLEXITY_TIE_FACTOR = 1.1
+MIN_POINTS = 4
+TARGET_SAMPLE_SECONDS = 0.002  # calls are batched until one timed sample is about this long
+MAX_BATCH_ELEMENTS = 1_000_000  # cap on (calls per batch x input size) when every call needs a fresh copy
+
+MODELS = (
+    ("O(1)", lambda n: 1.0),
+    ("O(log n)", lambda n: math.log2(n)),
+    ("O(n)", lambda n: float(n)),
+    ("O(n log n)", lambda n: n * math.log2(n)),
+    ("O(n²)", lambda n: float(n) * n),
+)
+
+# --- INPUT GENERATION ---
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _scale(value, n: int, rng: random.Random):
+    """A size-n version of one test-case argument, keeping the property that matters for it."""
+    if isinstance(value, str):
+        # Tiling keeps the pattern: "()[]" stays balanced, an anagram pair stays one
+        return (value * (n // len(value) + 1))[:n] if value else "a" * n
+    if not value:
+        return [rng.randint(0, 100) for _ in range(n)]
+    if all(_is_number(v) for v in value):
+        lo, hi = min(value), max(value)
+        if len(value) > 1 and list(value) == sorted(value):
+            # Sorted input (binary search, merges) stays sorted and distinct
+            step = _sorted_step(value)
+            return [lo + i * step for i in range(n)]
+        if all(isinstance(v, int) for v in value):
+            return [rng.randint(lo, hi) for _ in range(n)]
+        return [rng.uniform(lo, hi) for _ in range(n)]
+    return [copy.deepcopy(value[i % len(value)]) for i in range(n)]
+
+def _sorted_step(value) -> float:
+    # Integer steps of at least 2 leave a gap between neighbours for "not found" targets
+    step = (max(value) - min(value)) / (len(value) - 1)
+    return max(2, round(step)) if all(isinstance(v, int) for v in value) else step or 1.0
+
+def _remap_target(x: int, value: list, n: int) -> int:
+    """
+    Moves an int parameter (a search target) into a grown sorted list at the same
+    relative position, and keeps its membership: present stays present, absent stays absent.
+    """
+    lo, hi, step = min(value), max(value), _sorted_step(value)
+    if x < lo or x > hi:
+        return x if x < lo else lo + (n - 1) * step + (x - hi)
+    if x in value:
+        return lo + round(value.index(x) / (len(value) - 1) * (n - 1)) * step
+    return lo + int((x - lo) / (hi - lo) * (n - 1)) * step + 1
+
+def input_generator(template: list):
+    """
+    From one test case's input, a function n -> arguments of size n, or None when
+    nothing in it can grow. Lists and strings grow; plain ints grow only when there
+    are no sequences (climb_stairs(n)), otherwise they're parameters (a target, a cap).
+    """
+    sequences = [i for i, v in enumerate(template) if isinstance(v, (list, str))]
+    counts = [i for i, v in enumerate(template) if isinstance(v, int) and not isinstance(v, bool) and v >= 0]
+    growing = sequences or counts
+    if not growing:
+        return None
+
+    # The first sorted list of ints, if any: int parameters next to it are positions in it
+    anchor = next((template[i] for i in sequences if isinstance(template[i], list) and len(template[i]) > 1
+                   and all(isinstance(v, int) and not isinstance(v, bool) for v in template[i])
+                   and template[i] == sorted(template[i])), None)
+
+    def generate(n: int):
+        rng = random.Random(n)
+        args = list(template)
+        for i in growing:
+            args[i] = n if i not in sequences else _scale(template[i], n, rng)
+        if anchor is not None:
+            for i, v in enumerate(template):
+                if isinstance(v, int) and not isinstance(v, bool):
+                    args[i] = _remap_target(v, anchor, n)
+        return args
+    return generate
+
+def _fresh(args):
+    """A copy the solution may mutate. Generated inputs are flat, so slicing is enough for most."""
+    out = []
+    for value in args:
+        if isinstance(value, list) and not (value and isinstance(value[0], (list, dict, set))):
+            out.append(value[:])
+        else:
+            out.append(copy.deepcopy(value) if isinstance(value, (list, dict, set)) else value)
+    return out
+
+# --- SANDBOX ---
+
+class _BudgetExceeded(Exception):
+    pass
+
+def _on_alarm(signum, frame):
+    raise _BudgetExceeded()
+
+def _growth_script(code, function_name, template, sizes, repeats, budget, queue):
+    """
+    Child process: times the solution at each size and streams ("size", n, seconds per call)
+    as it goes, so a run killed at the timeout still returns the sizes it finished.
+    """
+    generate = input_generator(template)
+    signal.signal(signal.SIGALRM, _on_alarm)
+    deadline = time.perf_counter() + budget
+    reason = None
+    try:
+        safe_globals = _solution_globals()
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(code, safe_globals)
+            fn = safe_globals.get(function_name)
+            if not callable(fn):
+                queue.put(("done", f"Function '{function_name}' is not defined"))
+                return
+            for n in sizes:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    reason = "budget"
+                    break
+                # A single call that outlives the budget (exponential recursion) is interrupted
+                signal.setitimer(signal.ITIMER_REAL, remaining)
+                args = generate(n)
+                first = _fresh(args)
+                start = time.perf_counter()
+                fn(*first)
+                single = time.perf_counter() - start
+                # Solutions that leave their input alone reuse it; the rest need a copy per call
+                mutates = first != args
+                batch = max(1, int(TARGET_SAMPLE_SECONDS / max(single, 1e-9)))
+                if mutates:
+                    batch = max(1, min(batch, MAX_BATCH_ELEMENTS // n))
+                best = single
+                for _ in range(repeats):
+                    copies = [_fresh(args) for _ in range(batch)] if mutates else [args] * batch
+                    start = time.perf_counter()
+                    for call_args in copies:
+                        fn(*call_args)
+                    best = min(best, (time.perf_counter() - start) / batch)
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                # Minimum over repeats: noise only ever adds time
+                queue.put(("size", n, best))
+    except _BudgetExceeded:
+        reason = "budget"
+    except RecursionError:
+        reason = "recursion limit"
+    except Exception as e:
+        reason = f"{type(e).__name__}: {e}"
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    queue.put(("done", reason))
+
+def _sizes():
+    sizes, n = [], COMPLEXITY_MIN_N
+    while n <= COMPLEXITY_MAX_N:
+        sizes.append(n)
+        n *= 2
+    return sizes
+
+def measure_growth(code: str, function_name: str, template: list, timeout: float = COMPLEXITY_TIMEOUT):
+    """Returns ([(n, seconds per call)], stop reason or None) from a sandbox run."""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_growth_script, args=(
+        code, function_name, template, _sizes(), COMPLEXITY_REPEATS, min(COMPLEXITY_BUDGET, timeout * 0.8), queue))
+    points, reason = [], "Unknown execution error."
+    deadline = time.monotonic() + timeout
+    with sandbox_in_flight.track("complexity"), sandbox_runs.time("complexity"):
+        process.start()
+        while True:
+            try:
+                item = queue.get(timeout=max(0.01, deadline - time.monotonic()))
+            except queue_module.Empty:
+                if process.is_alive():
+                    process.terminate()
+                    sandbox_timeouts.inc("complexity")
+                    reason = "Time Limit Exceeded"
+                break
+            if item[0] == "size":
+                points.append((item[1], item[2]))
+            else:
+                reason = item[1]
+                break
+        process.join(1.0)
+        if process.is_alive():
+            process.terminate()
+    return points, reason
+
+# --- FITTING ---
+
+def _fit(points, model):
+    """Weighted least squares for t = a + b*f(n) with a, b >= 0; weights 1/t^2 fit relative error."""
+    xs = [model(n) for n, _ in points]
+    ts = [t for _, t in points]
+    ws = [1.0 / (t * t) for t in ts]
+    s, sx, sy = sum(ws), sum(w * x for w, x in zip(ws, xs)), sum(w * t for w, t in zip(ws, ts))
+    sxx, sxy = sum(w * x * x for w, x in zip(ws, xs)), sum(w * x * t for w, x, t in zip(ws, xs, ts))
+    denominator = s * sxx - sx * sx
+    b = (s * sxy - sx * sy) / denominator if denominator > 1e-12 * s * sxx else 0.0
+    a = (sy - b * sx) / s
+    if b < 0:
+        a, b = sy / s, 0.0
+    elif a < 0:
+        a, b = 0.0, sxy / sxx
+    rss = sum(w * (t - a - b * x) ** 2 for w, x, t in zip(ws, xs, ts))
+    return a, b, math.sqrt(rss / len(points))  # RMS relative error
+
+def fit_complexity(points) -> dict:
+    """
+    Best-fitting growth class for [(n, seconds)] measurements.
+    Every model gets a constant term (call overhead). Among fits within
+    COMPLEXITY_TIE_FACTOR of the lowest error the simplest class wins, since a
+    richer curve can always absorb noise. Confidence is how clearly the chosen
+    class beats the best other class, scaled down for few points or a narrow size range.
+    """
+    if len(points) < MIN_POINTS:
+        note = f"Only {len(points)} input sizes finished; at least {MIN_POINTS} are needed."
+        if len(points) >= 2:
+            (n0, t0), (n1, t1) = points[-2:]
+            exponent = math.log(t1 / t0) / math.log(n1 / n0) if t0 > 0 else 0.0
+            if exponent > 2.5:
+                note = f"Time grew faster than O(n²) (x{t1 / t0:.0f} from n={n0} to n={n1}) and ran out of budget."
+        return {"complexity": None, "confidence": 0.0, "note": note}
+    fits = [(label, *_fit(points, model)) for label, model in MODELS]
+    best_error = min(error for *_, error in fits)
+    chosen = next(fit for fit in fits if fit[3] <= best_error * COMPLEXITY_TIE_FACTOR + 1e-12)
+    other_error = min(error for label, _, _, error in fits if label != chosen[0])
+    separation = max(0.0, 1.0 - chosen[3] / other_error) if other_error > 0 else 0.0
+    # A flat profile fits every model equally (b ~ 0); the flatness itself is the evidence
+    if chosen[0] == "O(1)":
+        times = [t for _, t in points]
+        separation = max(separation, 1.0 - min(1.0, (max(times) / min(times) - 1.0)))
+    coverage = min(1.0, (len(points) - 2) / 4) * min(1.0, math.log2(points[-1][0] / points[0][0]) / 6)
+    (n0, t0), (n1, t1) = points[0], points[-1]
+    return {
+        "complexity": chosen[0],
+        "confidence": round(separation * coverage, 2),
+        # Slope of log(time) against log(n) over the measured range
+        "exponent": round(math.log(t1 / t0) / math.log(n1 / n0), 2) if t0 > 0 and n1 > n0 else None,
+        "fits": {label: round(error, 4) for label, _, _, error in fits},
+    }
+
+def estimate_complexity(code: str, function_name: str, test_cases: list) -> dict:
+    """
+    Runs the solution at geometrically growing input sizes (shaped like the mission's
+    first test case) and fits the timings against O(1) .. O(n²). Concurrent estimates
+    skew each other's timings: main.py runs them as the scheduler's "complexity" kind,
+    which COMPLEXITY_CONCURRENCY caps.
+    """
+    template = (test_cases[0] or {}).get("input") if test_cases else None
+    if not isinstance(template, list) or input_generator(template) is None:
+        return {"complexity": None, "confidence": 0.0, "note": "This mission's inputs have no size to grow."}
+    points, reason = measure_growth(code, function_name, template)
+    result = fit_complexity(points)
+    result["sizes"] = [n for n, _ in points]
+    result["timings_us"] = [round(t * 1e6, 3) for _, t in points]
+    if reason and reason != "budget":
+        result["stopped"] = reason
+    return result
+
+def estimate_mission_complexity(mission, code: str) -> dict:
+    """estimate_complexity for a mission's entry point, plus a feedback line for the student."""
+    function_name = entry_point(mission.get("starter_code"))
+    if not mission.get("test_cases") or (mission.get("meta") or {}).get("needs_db") or not function_name:
+        return {"complexity": None, "confidence": 0.0, "note": "Complexity isn't measured for this mission."}
+    result = estimate_complexity(code, function_name, mission["test_cases"])
+    result["feedback"] = describe(result)
+    return result
+
+def describe(result: dict) -> str:
+    if not result.get("complexity"):
+        return f"⏱️ Growth rate not measured: {result.get('stopped') or result.get('note')}"
+    sizes = result["sizes"]
+    certainty = "likely" if result["confidence"] >= 0.5 else "possibly"
+    return (f"⏱️ Your solution {certainty} scales as {result['complexity']} "
+            f"(confidence {result['confidence']:.0%}, measured n={sizes[0]}..{sizes[-1]}).")
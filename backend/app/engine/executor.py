@@ -1,18 +1,61 @@
+import os
 import sys
 import io
+import builtins
+import copy
+import time
 import contextlib
 import traceback
+import statistics
 import multiprocessing
+from app.metrics import registry
 
-def _run_script(code, queue):
-    output_buffer = io.StringIO()
+# Every sandbox run is its own process; more than one per core and runs start queueing for CPU
+SANDBOX_CAPACITY = os.cpu_count() or 1
+sandbox_in_flight = registry.gauge("deepblue_sandbox_processes", "Sandbox processes currently running.", ("kind",))
+sandbox_runs = registry.histogram("deepblue_sandbox_run_duration_seconds", "Sandbox run wall time, process start to result.", ("kind",))
+sandbox_timeouts = registry.counter("deepblue_sandbox_timeouts_total", "Sandbox runs killed at their timeout.", ("kind",))
+sandbox_saturation = registry.gauge("deepblue_sandbox_saturation", "Running sandbox processes per CPU core.")
+
+@registry.collector
+def _collect_sandbox():
+    sandbox_saturation.set(round(sandbox_in_flight.total() / SANDBOX_CAPACITY, 3))
+
+def _safe_globals():
     # Secure Sandbox
-    safe_globals = {"__builtins__": {
+    return {"__builtins__": {
         "print": print, "range": range, "len": len, "int": int, "float": float,
         "str": str, "list": list, "dict": dict, "set": set, "bool": bool,
         "abs": abs, "round": round, "min": min, "max": max, "sum": sum,
     }}
 
+# Mission solutions are written against the browser runner (Pyodide, full Python), so the
+# sandboxes that run them as-is (judge, complexity estimate) need the builtins a solution
+# uses: the pure functions, types, exceptions and class support. import, open and
+# eval/exec are not among them, but this only trims the builtins: dunder attribute access
+# (e.g. ().__class__.__base__.__subclasses__()) still reaches the rest of the runtime.
+# The real limits are the separate process and its timeout; it is not an isolation boundary.
+SOLUTION_BUILTINS = {name: getattr(builtins, name) for name in (
+    "abs", "all", "any", "ascii", "bin", "bool", "bytearray", "bytes", "callable", "chr",
+    "complex", "dict", "divmod", "enumerate", "filter", "float", "format", "frozenset",
+    "hash", "hex", "id", "int", "isinstance", "issubclass", "iter", "len", "list", "map",
+    "max", "min", "next", "object", "oct", "ord", "pow", "print", "range", "repr",
+    "reversed", "round", "set", "slice", "sorted", "str", "sum", "tuple", "zip",
+    "classmethod", "staticmethod", "property", "super", "__build_class__",
+    "Exception", "ArithmeticError", "AssertionError", "AttributeError", "IndexError",
+    "KeyError", "LookupError", "NotImplementedError", "OverflowError", "RecursionError",
+    "RuntimeError", "StopIteration", "TypeError", "ValueError", "ZeroDivisionError",
+    "NotImplemented", "Ellipsis",
+)}
+
+def _solution_globals():
+    # __name__ is needed by class bodies (for __module__) and by `if __name__ == "__main__":`
+    return {"__builtins__": dict(SOLUTION_BUILTINS), "__name__": "__main__"}
+
+def _run_script(code, queue):
+    output_buffer = io.StringIO()
+    safe_globals = _safe_globals()
+
     try:
         with contextlib.redirect_stdout(output_buffer):
             exec(code, safe_globals)
@@ -23,14 +66,147 @@ def _run_script(code, queue):
 def execute_code_safely(code: str, timeout: float = 2.0) -> dict:
     queue = multiprocessing.Queue()
     process = multiprocessing.Process(target=_run_script, args=(code, queue))
-    process.start()
-    process.join(timeout)
+    with sandbox_in_flight.track("execute"), sandbox_runs.time("execute"):
+        process.start()
+        process.join(timeout)
 
     if process.is_alive():
         process.terminate()
+        sandbox_timeouts.inc("execute")
         return {"success": False, "output": "⏱️ Time Limit Exceeded: Check for infinite loops!"}
 
     if not queue.empty():
         return queue.get()
 
-    return {"success": False, "output": "Unknown execution error."}
\ No newline at end of file
+    return {"success": False, "output": "Unknown execution error."}
+
+# Each timed batch repeats the suite until it takes at least this long, as timeit.autorange
+# does: a single pass over a couple of cases takes microseconds, below the timer's noise
+JUDGE_MIN_BATCH = float(os.getenv("JUDGE_MIN_BATCH_SECONDS", 0.02))
+JUDGE_MAX_LOOPS = int(os.getenv("JUDGE_MAX_LOOPS", 100_000))
+
+def _timed_batch(fn, test_cases, loops):
+    # Inputs are copied before the clock starts so only the solution is measured
+    args = [copy.deepcopy(case["input"]) for _ in range(loops) for case in test_cases]
+    start = time.perf_counter()
+    for case_args in args:
+        fn(*case_args)
+    return time.perf_counter() - start
+
+def _autorange(fn, test_cases, min_time):
+    """Passes per batch (1, 2, 5, 10, 20, ...) so that a batch takes at least min_time."""
+    base = 1
+    while True:
+        for multiple in (1, 2, 5):
+            loops = base * multiple
+            if _timed_batch(fn, test_cases, loops) >= min_time or loops >= JUDGE_MAX_LOOPS:
+                return loops
+        base *= 10
+
+def _judge_script(code, function_name, test_cases, repeats, queue):
+    result = {"correct": False, "passed": 0, "total": len(test_cases), "error": None,
+              "runs_ms": [], "median_ms": None, "loops": None}
+    try:
+        safe_globals = _solution_globals()
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(code, safe_globals)
+            fn = safe_globals.get(function_name)
+            if not callable(fn):
+                result["error"] = f"Function '{function_name}' is not defined"
+                queue.put(result)
+                return
+            for case in test_cases:
+                if fn(*copy.deepcopy(case["input"])) == case["expected"]:
+                    result["passed"] += 1
+            result["correct"] = result["passed"] == len(test_cases)
+            if result["correct"]:
+                # Calibration doubles as the warm-up; then `repeats` batches of `loops` passes,
+                # each reported as the time of one pass over the suite
+                loops = _autorange(fn, test_cases, JUDGE_MIN_BATCH)
+                for _ in range(repeats):
+                    elapsed = _timed_batch(fn, test_cases, loops)
+                    result["runs_ms"].append(round(elapsed / loops * 1000, 6))
+                result["loops"] = loops
+                result["median_ms"] = round(statistics.median(result["runs_ms"]), 6)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["correct"] = False
+    queue.put(result)
+
+def judge_solution(code: str, function_name: str, test_cases: list, repeats: int = 7, timeout: float = 5.0) -> dict:
+    """
+    Runs `function_name` from `code` against the test cases in a fresh sandbox process.
+    If every case passes, times `repeats` batches, each repeating the suite `loops` times
+    (at least JUDGE_MIN_BATCH seconds), and reports the per-pass time of each batch and
+    their median (ms). Solutions compared against each other should be judged one after
+    another, not concurrently, so they don't compete for the CPU.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_judge_script, args=(code, function_name, test_cases, repeats, queue))
+    with sandbox_in_flight.track("judge"), sandbox_runs.time("judge"):
+        process.start()
+        process.join(timeout)
+
+    if process.is_alive():
+        process.terminate()
+        sandbox_timeouts.inc("judge")
+        return {"correct": False, "passed": 0, "total": len(test_cases), "error": "Time Limit Exceeded",
+                "runs_ms": [], "median_ms": None, "loops": None}
+
+    if not queue.empty():
+        return queue.get()
+
+    return {"correct": False, "passed": 0, "total": len(test_cases), "error": "Unknown execution error.",
+            "runs_ms": [], "median_ms": None, "loops": None}
+
+class _StepLimitExceeded(Exception):
+    pass
+
+def _dry_run_script(code, max_steps, watch_lines, queue):
+    steps = 0
+    hit_lines = set()
+
+    def tracer(frame, event, arg):
+        nonlocal steps
+        if event == "line":
+            steps += 1
+            if frame.f_lineno in watch_lines:
+                hit_lines.add(frame.f_lineno)
+            if steps > max_steps:
+                raise _StepLimitExceeded()
+        return tracer
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            sys.settrace(tracer)
+            try:
+                exec(code, _safe_globals())
+            finally:
+                sys.settrace(None)
+        queue.put({"completed": True, "steps": steps, "error": None, "hit_lines": sorted(hit_lines)})
+    except _StepLimitExceeded:
+        queue.put({"completed": False, "steps": steps, "error": "step_limit", "hit_lines": sorted(hit_lines)})
+    except Exception as e:
+        queue.put({"completed": True, "steps": steps, "error": f"{type(e).__name__}: {e}", "hit_lines": sorted(hit_lines)})
+
+def dry_run_steps(code: str, max_steps: int = 5000, timeout: float = 1.0, watch_lines=()) -> dict:
+    """
+    Executes the code in the sandbox for at most `max_steps` traced lines.
+    completed=False means the step budget (or the wall-clock timeout) ran out first.
+    hit_lines reports which of `watch_lines` actually executed.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_dry_run_script, args=(code, max_steps, set(watch_lines), queue))
+    with sandbox_in_flight.track("dry_run"), sandbox_runs.time("dry_run"):
+        process.start()
+        process.join(timeout)
+
+    if process.is_alive():
+        process.terminate()
+        sandbox_timeouts.inc("dry_run")
+        return {"completed": False, "steps": max_steps, "error": "timeout"}
+
+    if not queue.empty():
+        return queue.get()
+
+    return {"completed": False, "steps": 0, "error": "Unknown execution error."}
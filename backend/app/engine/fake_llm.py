@@ -0,0 +1,85 @@
+import os
+import time
+import json
+import zlib
+import random
+import threading
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from app.engine.local_index import LocalCodeEmbeddings
+
+# LLM_BACKEND=fake: stand-ins for Gemini used by the load tests (benchmarks/load_test.py).
+# Answers and vectors depend only on the input; latency and 429s come from one seeded
+# stream, so the same request sequence sees the same failures on every run.
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", 0.8))          # seconds per chat call
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", 0.4))            # + uniform [0, jitter)
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", 0.0))    # fraction of calls answered 429
+FAKE_EMBED_LATENCY = float(os.getenv("FAKE_EMBED_LATENCY", 0.05))
+FAKE_EMBED_ERROR_RATE = float(os.getenv("FAKE_EMBED_ERROR_RATE", 0.0))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", 7))
+
+# Tag on every fake answer, so a load test can tell them from the offline fallback
+FAKE_MARKER = "[fake-llm]"
+
+class ResourceExhausted(Exception):
+    """Same name and message shape as the Google client's quota error, so is_quota_error() matches it."""
+
+_rng = random.Random(FAKE_LLM_SEED)
+_rng_lock = threading.Lock()
+stats = {"chat_calls": 0, "embed_calls": 0, "errors_429": 0}
+
+def _simulate(kind: str, latency: float, error_rate: float):
+    with _rng_lock:
+        stats[kind] += 1
+        failed = _rng.random() < error_rate
+        stats["errors_429"] += failed
+        delay = latency + FAKE_LLM_JITTER * _rng.random() if kind == "chat_calls" else latency
+    time.sleep(delay)
+    if failed:
+        raise ResourceExhausted("429 Resource has been exhausted (e.g. check quota). [fake-llm]")
+
+SOCRATIC_REPLIES = (
+    "🧐 **Observation**: Your loop visits every element.\n💡 **Strategic Hint**: Track what changes between iterations.\n❓ **Guiding Question**: Which value do you need after the loop ends?",
+    "🧐 **Observation**: The function has a clear entry point.\n💡 **Strategic Hint**: Handle the empty input first.\n❓ **Guiding Question**: What should happen when the list is empty?",
+    "🧐 **Observation**: You are building the result step by step.\n💡 **Strategic Hint**: Check the boundary indices.\n❓ **Guiding Question**: Does your range include the last element?",
+)
+
+def _reply(prompt: str) -> str:
+    """A canned answer in the shape the calling prompt asks for."""
+    digest = zlib.crc32(prompt.encode("utf-8"))
+    if "System Diagnostics" in prompt:
+        return json.dumps({"line": 1 + digest % 5, "explanation": f"Logic gate fracture in sector {digest % 9}. {FAKE_MARKER}"})
+    if "Time Travel" in prompt:
+        return json.dumps({"risk_level": "Safe", "prediction": f"Execution completes normally. {FAKE_MARKER}",
+                           "suggestion": "No change needed."})
+    if "Mission Control" in prompt:
+        return json.dumps({"id": 90000 + digest % 1000, "title": "Load Test Protocol", "difficulty": "Hard",
+                           "description": FAKE_MARKER, "roles": {}, "starter_code": "def solve(x):\n    pass\n",
+                           "solution_keywords": ["return"], "test_cases": [{"input": [1], "expected": 1}]})
+    if "Voice-to-Code" in prompt:
+        return f"def solve(data):\n    # {FAKE_MARKER}\n    return data"
+    return f"{SOCRATIC_REPLIES[digest % len(SOCRATIC_REPLIES)]} {FAKE_MARKER}"
+
+class FakeChatModel(BaseChatModel):
+    """Drop-in for ChatGoogleGenerativeAI in SocraticAI's chains and _invoke_llm."""
+    temperature: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "deepblue-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        _simulate("chat_calls", FAKE_LLM_LATENCY, FAKE_LLM_ERROR_RATE)
+        prompt = "\n".join(str(m.content) for m in messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=_reply(prompt)))])
+
+class FakeEmbeddings(LocalCodeEmbeddings):
+    """The offline hashed embeddings (deterministic), with Gemini-like latency and 429s."""
+    def embed_query(self, text: str) -> list[float]:
+        _simulate("embed_calls", FAKE_EMBED_LATENCY, FAKE_EMBED_ERROR_RATE)
+        return super().embed_query(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        _simulate("embed_calls", FAKE_EMBED_LATENCY, FAKE_EMBED_ERROR_RATE)
+        return super().embed_documents(texts)
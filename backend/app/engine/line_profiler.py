@@ -0,0 +1,211 @@
+import os
+import io
+import sys
+import time
+import queue as queue_module
+import signal
+import contextlib
+import multiprocessing
+from collections import defaultdict
+from app.engine.executor import _solution_globals, sandbox_in_flight, sandbox_runs, sandbox_timeouts
+from app.engine.analysis import analyze
+
+# "trace" counts every line (exact hits and times, the run is a few times slower); "sample"
+# interrupts every PROFILE_SAMPLE_INTERVAL seconds of CPU time and counts where it lands
+# (no hits, times are estimates, next to no slowdown)
+PROFILE_MODES = ("trace", "sample")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.001))
+# Seconds the profiled run may take; after that it is stopped and the partial profile returned
+PROFILE_BUDGET = float(os.getenv("PROFILE_BUDGET", 2.0))
+PROFILE_TIMEOUT = float(os.getenv("PROFILE_TIMEOUT", 5.0))
+MAX_OUTPUT_CHARS = 10_000
+
+# Filename the student code is compiled under, so the profiler can skip every other frame
+FILENAME = "<student>"
+
+class _BudgetExceeded(BaseException):
+    # BaseException: a bare `except Exception` in the profiled code must not swallow it
+    pass
+
+def _on_alarm(signum, frame):
+    raise _BudgetExceeded()
+
+class _Collector:
+    """Per-line hits and self time, per-function calls and inclusive time, in one sandbox run."""
+
+    def __init__(self):
+        self.lines = defaultdict(lambda: [0, 0])       # lineno -> [hits, ns]
+        self.functions = {}                            # first line -> [name, calls, ns]
+        self.depth = defaultdict(int)
+        self.entered = {}
+        self.current = None
+        self.stamp = 0
+        self.overhead = 0                              # ns spent in the tracer itself
+        self.samples = 0
+
+    def _charge(self, now):
+        if self.current is not None:
+            self.lines[self.current][1] += now - self.stamp
+
+    # --- trace mode: time between events goes to the line that was running ---
+
+    def trace_call(self, frame, event, arg):
+        code = frame.f_code
+        if code.co_filename != FILENAME:
+            return None
+        now = time.perf_counter_ns()
+        self._charge(now)
+        self.current = None
+        if not code.co_name.startswith("<"):
+            entry = self.functions.setdefault(code.co_firstlineno, [code.co_name, 0, 0])
+            entry[1] += 1
+            self.depth[code] += 1
+            if self.depth[code] == 1:
+                self.entered[code] = (now, self.overhead)
+        self._done(now)
+        return self.trace_local
+
+    def trace_local(self, frame, event, arg):
+        now = time.perf_counter_ns()
+        self._charge(now)
+        if event == "line":
+            self.current = frame.f_lineno
+            self.lines[self.current][0] += 1
+        elif event == "return":
+            code = frame.f_code
+            if code in self.depth:
+                self.depth[code] -= 1
+                # Recursion: only the outermost call's duration counts
+                if not self.depth[code]:
+                    entered, overhead = self.entered.pop(code)
+                    self.functions[code.co_firstlineno][2] += now - entered - (self.overhead - overhead)
+            back = frame.f_back
+            self.current = back.f_lineno if back is not None and back.f_code.co_filename == FILENAME else None
+        self._done(now)
+        return self.trace_local
+
+    def _done(self, now):
+        # The clock restarts after the bookkeeping, which is left out of every time reported
+        self.stamp = time.perf_counter_ns()
+        self.overhead += self.stamp - now
+
+    # --- sample mode: the innermost student line is charged, each student function on the stack is in a call ---
+
+    def sample(self, signum, frame):
+        self.samples += 1
+        innermost = True
+        seen = set()
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename == FILENAME:
+                if innermost:
+                    self.lines[frame.f_lineno][1] += 1
+                    innermost = False
+                if not code.co_name.startswith("<") and code not in seen:
+                    seen.add(code)
+                    self.functions.setdefault(code.co_firstlineno, [code.co_name, None, 0])[2] += 1
+            frame = frame.f_back
+
+    def report(self, mode: str, total_ms: float) -> dict:
+        # Samples become each line's share of the run's time: timers fire at the kernel's
+        # granularity, which can be coarser than the interval asked for
+        scale = 1e-6 if mode == "trace" else total_ms / max(self.samples, 1)
+        lines = [{"lineno": lineno, "hits": hits if mode == "trace" else None, "time_ms": round(t * scale, 4)}
+                 for lineno, (hits, t) in sorted(self.lines.items())]
+        functions = [{"name": name, "lineno": lineno, "calls": calls, "time_ms": round(t * scale, 4)}
+                     for lineno, (name, calls, t) in sorted(self.functions.items())]
+        return {"lines": lines, "functions": functions, "samples": self.samples if mode == "sample" else None}
+
+def _profile_script(code, mode, interval, budget, queue):
+    collector = _Collector()
+    output_buffer = io.StringIO()
+    result = {"mode": mode, "completed": False, "stopped": None, "error": None}
+    signal.signal(signal.SIGALRM, _on_alarm)
+    start = time.perf_counter()
+    try:
+        code_obj = compile(code, FILENAME, "exec")
+        with contextlib.redirect_stdout(output_buffer):
+            signal.setitimer(signal.ITIMER_REAL, budget)
+            if mode == "trace":
+                sys.settrace(collector.trace_call)
+            else:
+                signal.signal(signal.SIGPROF, collector.sample)
+                signal.setitimer(signal.ITIMER_PROF, interval, interval)
+            try:
+                exec(code_obj, _solution_globals())
+            finally:
+                sys.settrace(None)
+                signal.setitimer(signal.ITIMER_PROF, 0)
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        result["completed"] = True
+    except _BudgetExceeded:
+        result["stopped"] = "budget"
+    except SyntaxError as e:
+        result["error"] = f"Syntax Error: {e.msg} at line {e.lineno}"
+    except Exception as e:
+        result["completed"] = True
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    result["output"] = output_buffer.getvalue()[:MAX_OUTPUT_CHARS]
+    result.update(collector.report(mode, result["total_ms"]))
+    queue.put(result)
+
+def profile_code(code: str, mode: str = "trace", interval: float = PROFILE_SAMPLE_INTERVAL,
+                 budget: float = PROFILE_BUDGET, timeout: float = PROFILE_TIMEOUT) -> dict:
+    """
+    Runs the code in the sandbox under the line profiler. completed=False with
+    stopped="budget" means it ran out of time; the lines it had run are still reported,
+    which is usually enough to see the runaway loop.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_profile_script, args=(code, mode, interval, min(budget, timeout * 0.8), queue))
+    with sandbox_in_flight.track("profile"), sandbox_runs.time("profile"):
+        process.start()
+        try:
+            # Read before joining: a large result would block the child's queue feeder
+            result = queue.get(timeout=timeout)
+        except queue_module.Empty:
+            result = None
+        process.join(0.5)
+
+    if process.is_alive():
+        process.terminate()
+        sandbox_timeouts.inc("profile")
+    if result is None:
+        return {"mode": mode, "completed": False, "stopped": "timeout", "error": "⏱️ Time Limit Exceeded: Check for infinite loops!",
+                "output": "", "total_ms": None, "lines": [], "functions": [], "samples": None}
+    return result
+
+# --- HEATMAP ---
+
+def heatmap(code: str, graph: dict, profile: dict) -> dict:
+    """
+    The 3D graph with the profile joined on by line number. Each node with a lineno gets
+    `hits`, `time_ms` and `heat` (its share of the run's time, 0..1). Functions use their
+    inclusive time; loops and branches add up the lines they contain; anything else is its
+    own line. Returns a copy: the graph from analyze() is shared.
+    """
+    spans = analyze(code, ("spans",))["spans"]
+    lines = {line["lineno"]: line for line in profile.get("lines", [])}
+    functions = {spans["decorated"].get(f["lineno"], f["lineno"]): f for f in profile.get("functions", [])}
+    total = sum(line["time_ms"] for line in lines.values()) or 0.0
+
+    nodes = []
+    for node in graph.get("nodes", []):
+        node = dict(node)
+        lineno = node.get("lineno")
+        if lineno is not None:
+            line = lines.get(lineno, {})
+            if node["type"] == "function" and lineno in functions:
+                hits, time_ms = functions[lineno]["calls"], functions[lineno]["time_ms"]
+            elif node["type"] in ("loop", "decision"):
+                end = spans["blocks"].get(lineno, lineno)
+                hits = line.get("hits")
+                time_ms = sum(lines[n]["time_ms"] for n in range(lineno, end + 1) if n in lines)
+            else:
+                hits, time_ms = line.get("hits"), line.get("time_ms", 0.0)
+            node["hits"] = hits
+            node["time_ms"] = round(time_ms, 4)
+            node["heat"] = round(min(1.0, time_ms / total), 4) if total else 0.0
+        nodes.append(node)
+    return {**graph, "nodes": nodes}
@@ -0,0 +1,206 @@
+import os
+import re
+import ast
+import json
+import zlib
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# Tokens: identifiers/numbers, or any single non-space symbol (operators, brackets)
+TOKEN_PATTERN = re.compile(r"[A-Za-z_]\w*|\d+|[^\w\s]")
+
+class LocalCodeEmbeddings(Embeddings):
+    """
+    Offline code embedding using the hashing trick.
+    Token uni/bi-grams and AST parent->child node-type pairs are hashed into a
+    fixed-size signed vector, then L2 normalized so a dot product is cosine similarity.
+    """
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _bucket(self, feature: str, vec, weight: float = 1.0):
+        # crc32 is stable across processes (unlike the salted built-in hash())
+        h = zlib.crc32(feature.encode("utf-8"))
+        sign = 1.0 if h & 0x80000000 else -1.0
+        vec[h % self.dim] += sign * weight
+
+    def _ast_features(self, text: str):
+        try:
+            tree = ast.parse(text)
+        except (SyntaxError, ValueError):
+            return []
+        features = []
+        for parent in ast.walk(tree):
+            parent_name = type(parent).__name__
+            for child in ast.iter_child_nodes(parent):
+                features.append(f"ast:{parent_name}>{type(child).__name__}")
+        return features
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(t).tolist() for t in texts]
+
+    def _embed(self, text: str):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        tokens = TOKEN_PATTERN.findall(text or "")
+        for tok in tokens:
+            self._bucket(f"t:{tok}", vec)
+        for a, b in zip(tokens, tokens[1:]):
+            self._bucket(f"b:{a} {b}", vec)
+        # Structure counts more than spelling for "have we seen this mistake before"
+        for feat in self._ast_features(text or ""):
+            self._bucket(feat, vec, weight=2.0)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec
+
+class LocalVectorStore:
+    """
+    In-process NumPy vector index exposing the subset of the Chroma API that
+    SocraticAI uses (add_documents / similarity_search).
+    On disk, three files in persist_directory:
+      vectors.f32       raw float32 rows, appended (memory-mapped on load)
+      documents.jsonl   text and metadata, one line per row, appended
+      manifest.json     {"dim", "count"}: rows known to be complete in both files,
+                        replaced atomically after each append
+    A crash mid-append leaves rows past `count`; they are trimmed on the next load.
+    """
+    def __init__(self, embedding_function=None, persist_directory: str = None):
+        self.embeddings = embedding_function or LocalCodeEmbeddings()
+        self.persist_directory = persist_directory
+        self._lock = threading.Lock()
+        self._docs = []
+        self._matrix = np.zeros((0, self.embeddings.dim), dtype=np.float32)
+        self._size = 0
+        if persist_directory:
+            self._load()
+
+    # --- PERSISTENCE ---
+    def _paths(self):
+        return tuple(os.path.join(self.persist_directory, name)
+                     for name in ("vectors.f32", "documents.jsonl", "manifest.json"))
+
+    def _write_atomic(self, path: str, data: bytes):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _write_manifest(self):
+        self._write_atomic(self._paths()[2], json.dumps({"dim": self.embeddings.dim, "count": self._size}).encode("utf-8"))
+
+    def _reset(self):
+        """Empties the on-disk index, so later appends don't line up behind stale rows."""
+        vec_path, doc_path, _ = self._paths()
+        for path in (vec_path, doc_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._size = 0
+        self._write_manifest()
+
+    def _load(self):
+        vec_path, doc_path, manifest_path = self._paths()
+        if not os.path.exists(manifest_path):
+            # Data without a manifest is a first append that never committed
+            if os.path.exists(vec_path) or os.path.exists(doc_path):
+                self._reset()
+            return
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest["dim"] != self.embeddings.dim:
+                print("⚠️ Local index on disk does not match current config. Starting fresh.")
+                self._reset()
+                return
+            count = manifest["count"]
+            lines = []
+            if os.path.exists(doc_path):
+                with open(doc_path, "r") as f:
+                    lines = [line for line in f if line.strip()]
+            row_bytes = self.embeddings.dim * 4
+            vec_size = os.path.getsize(vec_path) if os.path.exists(vec_path) else 0
+            if len(lines) < count or vec_size < count * row_bytes:
+                print("⚠️ Local index files are shorter than their manifest. Starting fresh.")
+                self._reset()
+                return
+            # Drop the tail of an interrupted append so the next append lines up again
+            if len(lines) > count:
+                self._write_atomic(doc_path, "".join(lines[:count]).encode("utf-8"))
+            if vec_size > count * row_bytes:
+                os.truncate(vec_path, count * row_bytes)
+            if count:
+                self._matrix = np.memmap(vec_path, dtype=np.float32, mode="r", shape=(count, self.embeddings.dim))
+            self._size = count
+            docs = [json.loads(line) for line in lines[:count]]
+            self._docs = [Document(page_content=d["page_content"], metadata=d.get("metadata", {})) for d in docs]
+        except Exception as e:
+            print(f"⚠️ Local index load failed: {e}. Starting fresh.")
+            self._matrix = np.zeros((0, self.embeddings.dim), dtype=np.float32)
+            self._docs = []
+            self._reset()
+
+    def _persist(self, new_docs, vectors):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        vec_path, doc_path, _ = self._paths()
+        # Append both, then publish the new count; the manifest is the commit point
+        with open(vec_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(doc_path, "a") as f:
+            for d in new_docs:
+                f.write(json.dumps({"page_content": d.page_content, "metadata": d.metadata}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._write_manifest()
+
+    # --- INDEX OPERATIONS ---
+    def _reserve(self, extra: int):
+        # Grow by doubling so repeated single inserts stay amortized O(1).
+        # This also copies a read-only memory-mapped matrix into RAM on first write.
+        needed = self._size + extra
+        if needed <= self._matrix.shape[0] and self._matrix.flags.writeable:
+            return
+        capacity = max(needed, 2 * self._matrix.shape[0], 64)
+        grown = np.zeros((capacity, self.embeddings.dim), dtype=np.float32)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    def add_documents(self, documents):
+        if not documents:
+            return []
+        vectors = np.asarray(self.embeddings.embed_documents([d.page_content for d in documents]), dtype=np.float32)
+        with self._lock:
+            self._reserve(len(documents))
+            start = self._size
+            self._matrix[start:start + len(documents)] = vectors
+            self._size += len(documents)
+            self._docs.extend(documents)
+            if self.persist_directory:
+                self._persist(documents, vectors)
+            return [str(i) for i in range(start, self._size)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4):
+        q = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        with self._lock:
+            if self._size == 0:
+                return []
+            scores = self._matrix[:self._size] @ q
+            k = min(k, self._size)
+            # argpartition is O(n); only the k winners get fully sorted
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._docs[i], float(scores[i])) for i in top]
+
+    def similarity_search(self, query: str, k: int = 4):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    def __len__(self):
+        return self._size
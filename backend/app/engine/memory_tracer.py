@@ -5,9 +5,11 @@ import inspect
 import types
 
 class MemoryTracer:
-    def __init__(self):
+    def __init__(self, line_index=None):
         self.trace_data = []
         self.heap_snapshot = {}
+        # Line -> AST graph node ids (ast_parser.line_index); when given, each step lists its active nodes
+        self.line_index = line_index
 
     def serialize_obj(self, obj):
         """
@@ -65,12 +67,16 @@ class MemoryTracer:
                 self.heap_snapshot[obj_id] = self.serialize_obj(var_value)
 
         # 3. Record the Frame
-        self.trace_data.append({
+        step = {
             "line": frame.f_lineno,
             "event": event,
             "stack": stack_frame,
             "heap": self.heap_snapshot
-        })
+        }
+        if self.line_index is not None:
+            # Only lines of the traced code map onto its graph, not lines inside library calls
+            step["nodes"] = self.line_index.get(frame.f_lineno, []) if frame.f_code.co_filename == "<string>" else []
+        self.trace_data.append(step)
         
         return self.trace_calls
 
@@ -0,0 +1,296 @@
+import os
+import ast
+from app.engine.executor import dry_run_steps
+
+# Whether /predict settles an inconclusive static pass with a bounded sandbox run
+PREDICT_DRY_RUN = os.getenv("PREDICT_DRY_RUN", "1") == "1"
+
+# Calls that cannot change program state, so a loop test built from them is analyzable
+PURE_BUILTINS = {"len", "abs", "min", "max", "sum", "int", "float", "str", "bool", "any", "all", "sorted", "range"}
+GROWTH_METHODS = {"append", "extend", "insert", "add", "update", "appendleft"}
+SCOPE_BOUNDARY = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+LOOPS = (ast.For, ast.AsyncFor, ast.While)
+
+def _walk_local(node, skip_loops=False):
+    """ast.walk that stays inside the current function (and optionally the current loop)."""
+    stack = list(ast.iter_child_nodes(node))
+    while stack:
+        child = stack.pop()
+        yield child
+        if isinstance(child, SCOPE_BOUNDARY) or (skip_loops and isinstance(child, LOOPS)):
+            continue
+        stack.extend(ast.iter_child_nodes(child))
+
+def _base_name(node):
+    """x -> 'x', x.y[0].z -> 'x'"""
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Starred)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+def _target_names(target):
+    if isinstance(target, (ast.Tuple, ast.List)):
+        names = set()
+        for elt in target.elts:
+            names |= _target_names(elt)
+        return names
+    name = _base_name(target)
+    return {name} if name else set()
+
+class _ModuleFacts:
+    def __init__(self, tree):
+        # function name -> globals it rebinds via `global x`
+        self.global_writers = {}
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                declared = set()
+                for inner in _walk_local(node):
+                    if isinstance(inner, (ast.Global, ast.Nonlocal)):
+                        declared.update(inner.names)
+                self.global_writers[node.name] = declared
+
+def _modified_names(loop, facts):
+    """Names the loop body may rebind or mutate, and whether it calls into user code."""
+    modified, calls_user_code = set(), False
+    for node in _walk_local(loop):
+        if isinstance(node, ast.Assign):
+            for t in node.targets:
+                modified |= _target_names(t)
+        elif isinstance(node, (ast.AugAssign, ast.AnnAssign, ast.NamedExpr)):
+            modified |= _target_names(node.target)
+        elif isinstance(node, (ast.For, ast.AsyncFor)):
+            modified |= _target_names(node.target)
+        elif isinstance(node, ast.Delete):
+            for t in node.targets:
+                modified |= _target_names(t)
+        elif isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Attribute):
+                # q.pop(), self.step() -> q / self may change
+                name = _base_name(node.func.value)
+                if name:
+                    modified.add(name)
+            elif isinstance(node.func, ast.Name):
+                if node.func.id in facts.global_writers:
+                    calls_user_code = True
+                    modified |= facts.global_writers[node.func.id]
+                elif node.func.id not in PURE_BUILTINS and node.func.id != "print":
+                    calls_user_code = True
+            # Objects handed to anything but a pure builtin may be mutated by it
+            if not (isinstance(node.func, ast.Name) and node.func.id in PURE_BUILTINS | {"print"}):
+                for arg in node.args:
+                    name = _base_name(arg)
+                    if name:
+                        modified.add(name)
+    return modified, calls_user_code
+
+def _has_exit(loop):
+    for node in _walk_local(loop, skip_loops=True):
+        if isinstance(node, (ast.Break, ast.Return, ast.Raise)):
+            return True
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ("exit", "quit"):
+            return True
+    # return/raise inside a nested loop still leave this one
+    for node in _walk_local(loop):
+        if isinstance(node, (ast.Return, ast.Raise)):
+            return True
+    return False
+
+def _growth_names(loop):
+    grown = set()
+    for node in _walk_local(loop):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in GROWTH_METHODS:
+            name = _base_name(node.func.value)
+            if name:
+                grown.add(name)
+        elif isinstance(node, ast.AugAssign) and isinstance(node.op, ast.Add):
+            name = _base_name(node.target)
+            if name and isinstance(node.value, (ast.List, ast.Tuple, ast.ListComp, ast.Name, ast.BinOp)):
+                grown.add(name)
+    return grown
+
+def _test_is_opaque(test):
+    for node in ast.walk(test):
+        if isinstance(node, ast.Call):
+            if not (isinstance(node.func, ast.Name) and node.func.id in PURE_BUILTINS):
+                return True
+    return False
+
+def _check_while(loop, facts, findings):
+    if _has_exit(loop):
+        return
+    grown = _growth_names(loop)
+    growth_note = f" `{sorted(grown)[0]}` grows every iteration, so memory climbs until the process is killed." if grown else ""
+    test = loop.test
+
+    if isinstance(test, ast.Constant):
+        if test.value:
+            findings.append({
+                "line": loop.lineno, "kind": "infinite_loop", "severity": "Critical",
+                "message": f"`while {ast.unparse(test)}` on line {loop.lineno} has no break, return or raise and will never stop." + growth_note,
+                "suggestion": "Add a `break` when the goal is reached, or loop on a condition that changes."
+            })
+        return
+
+    test_names = {n.id for n in ast.walk(test) if isinstance(n, ast.Name)} - PURE_BUILTINS
+    modified, calls_user_code = _modified_names(loop, facts)
+    if test_names and not (test_names & modified) and not _test_is_opaque(test) and not calls_user_code:
+        names = ", ".join(f"`{n}`" for n in sorted(test_names))
+        findings.append({
+            "line": loop.lineno, "kind": "infinite_loop", "severity": "Critical",
+            "message": f"The condition on line {loop.lineno} depends on {names}, which never changes inside the loop. Once true, it stays true." + growth_note,
+            "suggestion": f"Update {names} inside the loop body so the condition can become False."
+        })
+    elif not (test_names & modified):
+        findings.append({
+            "line": loop.lineno, "kind": "uncertain_loop", "severity": "Warning",
+            "message": f"The loop on line {loop.lineno} only terminates if a function call changes its condition.",
+            "suggestion": "Make the loop's progress explicit in the loop body."
+        })
+
+def _check_for(loop, findings):
+    iter_name = _base_name(loop.iter) if isinstance(loop.iter, ast.Name) else None
+    if not iter_name or iter_name not in _growth_names(loop) or _has_exit(loop):
+        return
+    if iter_name in _unconditional_growth_names(loop):
+        findings.append({
+            "line": loop.lineno, "kind": "unbounded_growth", "severity": "Critical",
+            "message": f"The loop on line {loop.lineno} appends to `{iter_name}` on every iteration while iterating over it, so it never reaches the end and memory grows without bound.",
+            "suggestion": f"Iterate over a copy (`for x in list({iter_name}):`) or collect new items in a separate list."
+        })
+    else:
+        # Guarded growth (`if len(a) < 5: a.append(x)`) usually stops: only a run can tell
+        findings.append({
+            "line": loop.lineno, "kind": "possible_unbounded_growth", "severity": "Warning",
+            "message": f"The loop on line {loop.lineno} sometimes appends to `{iter_name}` while iterating over it; it only ends if the condition around the append stops holding.",
+            "suggestion": f"Iterate over a copy (`for x in list({iter_name}):`) or collect new items in a separate list."
+        })
+
+def _unconditional_growth_names(loop):
+    """Names grown by statements that run on every iteration (not under an if, try or inner loop)."""
+    grown = set()
+    body = list(loop.body)
+    while body:
+        stmt = body.pop(0)
+        if isinstance(stmt, (ast.With, ast.AsyncWith)):
+            body[:0] = stmt.body
+            continue
+        if isinstance(stmt, ast.AugAssign) and isinstance(stmt.op, ast.Add):
+            name = _base_name(stmt.target)
+            if name and isinstance(stmt.value, (ast.List, ast.Tuple, ast.ListComp, ast.Name, ast.BinOp)):
+                grown.add(name)
+            continue
+        if isinstance(stmt, (ast.Expr, ast.Assign, ast.AnnAssign)):
+            for call in _unconditional_calls(stmt):
+                if isinstance(call.func, ast.Attribute) and call.func.attr in GROWTH_METHODS:
+                    name = _base_name(call.func.value)
+                    if name:
+                        grown.add(name)
+        elif isinstance(stmt, (ast.Continue, ast.Break, ast.Return, ast.Raise)):
+            break
+    return grown
+
+def _unconditional_calls(node):
+    """Calls that always execute when this expression/statement runs."""
+    if isinstance(node, (ast.Lambda, ast.GeneratorExp, ast.ListComp, ast.SetComp, ast.DictComp)):
+        return
+    if isinstance(node, ast.IfExp):
+        yield from _unconditional_calls(node.test)
+        return
+    if isinstance(node, ast.BoolOp):
+        yield from _unconditional_calls(node.values[0])
+        return
+    if isinstance(node, ast.Call):
+        yield node
+    for child in ast.iter_child_nodes(node):
+        yield from _unconditional_calls(child)
+
+def _is_self_call(call, func_name):
+    func = call.func
+    if isinstance(func, ast.Name):
+        return func.id == func_name
+    return isinstance(func, ast.Attribute) and func.attr == func_name and _base_name(func.value) in ("self", "cls")
+
+def _check_recursion(func, findings):
+    for stmt in func.body:
+        if isinstance(stmt, (ast.If, ast.While, ast.For, ast.AsyncFor, ast.Try, ast.With, ast.AsyncWith, ast.Match)):
+            # A branch that can return/raise is a potential base case
+            if any(isinstance(n, (ast.Return, ast.Raise)) for n in _walk_local(stmt)):
+                return
+            continue
+        if isinstance(stmt, SCOPE_BOUNDARY):
+            continue
+        if any(_is_self_call(c, func.name) for c in _unconditional_calls(stmt)):
+            findings.append({
+                "line": stmt.lineno, "kind": "unbounded_recursion", "severity": "Critical",
+                "message": f"`{func.name}` calls itself on line {stmt.lineno} before any base case can return, so the stack overflows (RecursionError after ~1000 frames).",
+                "suggestion": f"Add an `if` at the top of `{func.name}` that returns without recursing for the smallest input."
+            })
+            return
+        if isinstance(stmt, (ast.Return, ast.Raise)):
+            return
+
+def _summarize(findings):
+    critical = [f for f in findings if f["severity"] == "Critical"]
+    if critical:
+        first = critical[0]
+        return {"risk_level": "Critical", "prediction": first["message"], "suggestion": first["suggestion"], "conclusive": True}
+    if findings:
+        first = findings[0]
+        return {"risk_level": "Warning", "prediction": first["message"], "suggestion": first["suggestion"], "conclusive": False}
+    return {
+        "risk_level": "Safe",
+        "prediction": "No runaway loops, unbounded growth or base-case-free recursion detected.",
+        "suggestion": "Trace the edge cases (empty input, zero, one element) to be sure.",
+        "conclusive": True
+    }
+
+def predict_execution_risks(code_string: str, dry_run: bool = False, max_steps: int = 5000) -> dict:
+    """
+    Offline predictive debugging. Returns the same risk_level/prediction/suggestion shape
+    as the LLM simulator plus `findings`, `source` and `conclusive`. When the static pass
+    is inconclusive and dry_run is set, a bounded-step sandbox run settles it.
+    """
+    try:
+        tree = ast.parse(code_string)
+    except (SyntaxError, ValueError) as e:
+        # ValueError: e.g. a null byte in the source, on older Pythons
+        where = f" at line {e.lineno}" if getattr(e, "lineno", None) else ""
+        return {
+            "risk_level": "Warning", "prediction": f"Code does not parse: {getattr(e, 'msg', e)}{where}.",
+            "suggestion": "Fix the syntax error before simulating.", "conclusive": True,
+            "findings": [], "source": "static"
+        }
+
+    facts = _ModuleFacts(tree)
+    findings = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.While):
+            _check_while(node, facts, findings)
+        elif isinstance(node, (ast.For, ast.AsyncFor)):
+            _check_for(node, findings)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            _check_recursion(node, findings)
+    findings.sort(key=lambda f: (f["severity"] != "Critical", f["line"]))
+
+    result = _summarize(findings)
+    result["findings"] = findings
+    result["source"] = "static"
+
+    if not result["conclusive"] and dry_run:
+        watched = [f["line"] for f in findings]
+        run = dry_run_steps(code_string, max_steps=max_steps, watch_lines=watched)
+        result["dry_run"] = run
+        # Finishing only proves something if the suspicious loops actually ran
+        if run["completed"] and run["error"] is None and set(watched) <= set(run.get("hit_lines", [])):
+            result.update({
+                "risk_level": "Safe",
+                "prediction": f"Dry run finished in {run['steps']} steps.",
+                "suggestion": "Loop terminates for the sample run; still check other inputs.",
+                "conclusive": True, "source": "static+dry_run"
+            })
+        elif run["error"] in ("step_limit", "timeout"):
+            result.update({
+                "risk_level": "Critical",
+                "prediction": f"{result['prediction']} A dry run did not finish within {max_steps} steps.",
+                "conclusive": True, "source": "static+dry_run"
+            })
+    return result
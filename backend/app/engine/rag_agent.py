@@ -3,6 +3,7 @@ import re
 import json
 import logging
 import ast
+import threading
 from dotenv import load_dotenv
 
 # --- 1. CONFIGURATION & LOGGING ---
@@ -10,15 +11,14 @@ from dotenv import load_dotenv
 logging.getLogger("langchain_google_genai").setLevel(logging.ERROR)
 logging.getLogger("google.api_core").setLevel(logging.ERROR)
 
-# Modern LangChain Imports
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_core.chat_history import InMemoryChatMessageHistory
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
-from google.api_core.exceptions import ResourceExhausted, InvalidArgument
+# LangChain, the Google GenAI client and Chroma cost seconds to import, so they
+# are imported inside SocraticAI.__init__; only get_ai_tutor() pays that cost.
+from app.startup_timing import timed_phase
+from app.engine.analysis import analyze
+from app.engine.predictive import predict_execution_risks, PREDICT_DRY_RUN
+from app.engine.resilience import (
+    CircuitBreaker, TokenBucket, CircuitOpenError, RateLimitedError, guarded_call, is_quota_error, llm_method
+)
 
 # Load API Keys
 load_dotenv()
@@ -97,29 +97,57 @@ Return ONLY valid JSON:
 Code: {code}
 """
 
+CHAT_MODEL = "models/gemini-1.5-flash"
+EMBEDDING_MODEL = "models/embedding-001"
+
 # --- 3. ROBUST AI CLASS ---
 class SocraticAI:
     def __init__(self):
         self.api_key = os.getenv("GOOGLE_API_KEY")
-        self.api_ready = bool(self.api_key)
+        # LLM_BACKEND=fake swaps Gemini for local stand-ins with simulated latency and 429s
+        # (app/engine/fake_llm.py), so load tests exercise the real online code path offline
+        self.llm_backend = os.getenv("LLM_BACKEND", "gemini").lower()
+        self.api_ready = bool(self.api_key) or self.llm_backend == "fake"
         
-        # CIRCUIT BREAKER: Prevents hanging if quota is hit
-        self.quota_exhausted = False 
+        # CIRCUIT BREAKER: Fails fast while the API is down or out of quota, then
+        # probes recovery after a cooldown instead of staying offline until restart
+        self.breaker = CircuitBreaker(
+            "gemini",
+            failure_threshold=int(os.getenv("GEMINI_BREAKER_FAILURES", 5)),
+            cooldown=float(os.getenv("GEMINI_BREAKER_COOLDOWN", 30)),
+            max_cooldown=float(os.getenv("GEMINI_BREAKER_MAX_COOLDOWN", 600))
+        )
+        # RATE LIMITER: One client-side token bucket per model (requests per minute)
+        self.limiters = {
+            CHAT_MODEL: TokenBucket(rate=float(os.getenv("GEMINI_RPM", 15)) / 60, capacity=float(os.getenv("GEMINI_RPM", 15))),
+            EMBEDDING_MODEL: TokenBucket(rate=float(os.getenv("GEMINI_EMBED_RPM", 100)) / 60, capacity=float(os.getenv("GEMINI_EMBED_RPM", 100))),
+        }
+
+        with timed_phase("ai: import langchain stack"):
+            from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+            from langchain_core.output_parsers import StrOutputParser
+            from langchain_core.runnables.history import RunnableWithMessageHistory
+            if self.api_ready and self.llm_backend != "fake":
+                from langchain_google_genai import ChatGoogleGenerativeAI
 
         # Initialize LLMs (if key exists)
-        if self.api_ready:
+        if self.llm_backend == "fake":
+            from app.engine.fake_llm import FakeChatModel
+            self.llm = FakeChatModel(temperature=0.5)
+            self.logic_llm = FakeChatModel(temperature=0.1)
+        elif self.api_ready:
             # FIXED: Added convert_system_message_to_human=True
             # This prevents INVALID_ARGUMENT errors by merging system prompts into user messages
             # if the API endpoint is strict about role placement.
             self.llm = ChatGoogleGenerativeAI(
-                model="models/gemini-1.5-flash", 
+                model=CHAT_MODEL, 
                 temperature=0.5,
                 google_api_key=self.api_key,
                 convert_system_message_to_human=True,
                 max_retries=1
             )
             self.logic_llm = ChatGoogleGenerativeAI(
-                model="models/gemini-1.5-flash", 
+                model=CHAT_MODEL, 
                 temperature=0.1,
                 google_api_key=self.api_key,
                 convert_system_message_to_human=True,
@@ -130,13 +158,38 @@ class SocraticAI:
             self.logic_llm = None
 
         # Initialize Vector DB (Memory)
+        # RAG_BACKEND=chroma -> Gemini embeddings + Chroma (network per search)
+        # RAG_BACKEND=local  -> hashed code embeddings + in-process NumPy index (offline)
+        self.rag_backend = os.getenv("RAG_BACKEND", "chroma").lower()
         self.memory_active = False
         self.vector_db = None
         
-        if self.api_ready:
+        if self.rag_backend == "local":
+            try:
+                from app.engine.local_index import LocalCodeEmbeddings, LocalVectorStore
+                self.embeddings = LocalCodeEmbeddings(dim=int(os.getenv("RAG_LOCAL_DIM", 512)))
+                self.vector_db = LocalVectorStore(
+                    embedding_function=self.embeddings,
+                    persist_directory=os.getenv("RAG_LOCAL_DIR", "./local_index")
+                )
+                self.memory_active = True
+            except Exception as e:
+                print(f"⚠️ Memory Init Warning: {e}")
+        elif self.llm_backend == "fake":
+            # In-memory index over the fake embeddings; searches still go through the
+            # breaker and embedding limiter like Chroma's remote calls do
+            from app.engine.fake_llm import FakeEmbeddings
+            from app.engine.local_index import LocalVectorStore
+            self.embeddings = FakeEmbeddings(dim=int(os.getenv("RAG_LOCAL_DIM", 512)))
+            self.vector_db = LocalVectorStore(embedding_function=self.embeddings)
+            self.memory_active = True
+        elif self.api_ready:
             try:
+                with timed_phase("ai: import chroma"):
+                    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+                    from langchain_chroma import Chroma
                 self.embeddings = GoogleGenerativeAIEmbeddings(
-                    model="models/embedding-001",
+                    model=EMBEDDING_MODEL,
                     google_api_key=self.api_key
                 )
                 self.vector_db = Chroma(
@@ -177,8 +230,24 @@ class SocraticAI:
                 self.doubt_chain, self.get_session_history, input_messages_key="input", history_messages_key="history"
             )
 
+    @property
+    def quota_exhausted(self) -> bool:
+        return self.breaker.is_open()
+
+    def _invoke_llm(self, prompt: str) -> str:
+        """Single guarded entry point for one-shot prompts (breaker + rate limiter)."""
+        return guarded_call(self.breaker, self.limiters[CHAT_MODEL], self.llm.invoke, prompt).content
+
+    def resilience_metrics(self):
+        return {
+            "api_ready": self.api_ready,
+            "breaker": self.breaker.snapshot(),
+            "limiters": {model: bucket.snapshot() for model, bucket in self.limiters.items()},
+        }
+
     # --- MEMORY MANAGEMENT ---
-    def get_session_history(self, session_id: str) -> InMemoryChatMessageHistory:
+    def get_session_history(self, session_id: str):
+        from langchain_core.chat_history import InMemoryChatMessageHistory
         if session_id not in self.store:
             self.store[session_id] = InMemoryChatMessageHistory()
         return self.store[session_id]
@@ -195,36 +264,13 @@ class SocraticAI:
         """
         user_query = user_input.lower().strip() if user_input else ""
         code_str = user_code.strip()
-        lines = code_str.split('\n')
 
         # --- A. DETECT CODE ISSUES (Static Analysis) ---
-        issues = []
-        
-        # 1. Assignment in Condition (if x = 5)
-        if re.search(r"if\s+[a-zA-Z_]\w*\s*=[^=]", code_str):
-            issues.append("assignment_in_if")
-            
-        # 2. Shadowing Built-ins (list = ...)
-        if re.search(r"\b(list|dict|str|int|sum|max|min)\s*=", code_str):
-            issues.append("shadowing_builtin")
-            
-        # 3. Missing Print Parentheses (Python 2 style)
-        if re.search(r"print\s+[\"']", code_str):
-            issues.append("missing_print_parens")
-            
-        # 4. Infinite Loop Risk (while True without break)
-        if "while True" in code_str and "break" not in code_str:
-            issues.append("infinite_loop")
-            
-        # 5. List Append Assignment (x = x.append(y))
-        if re.search(r"\w+\s*=\s*\w+\.append\(", code_str):
-            issues.append("append_assignment")
-
-        # 6. Missing Return in Function
-        has_def = "def " in code_str
-        has_return = "return" in code_str
-        if has_def and not has_return:
-            issues.append("missing_return")
+        # Static rules from the shared analysis pipeline: the tree /analyze parsed is reused
+        report = analyze(code_str, ("issues",))["issues"]
+        issues = report["issues"]
+        node_types = report["node_types"]
+        has_def = "FunctionDef" in node_types or "AsyncFunctionDef" in node_types
 
         # --- B. ANSWER USER QUERY (Context-Aware) ---
 
@@ -240,8 +286,10 @@ class SocraticAI:
                 return "🧐 **Observation**: Your `print` statement looks like Python 2.\n💡 **Strategic Hint**: Python 3 requires parentheses for functions.\n❓ **Guiding Question**: Can you wrap your text in `()`?"
             if "missing_return" in issues:
                 return "🧐 **Observation**: Your function runs but returns no data.\n💡 **Strategic Hint**: The system needs a result to verify success.\n❓ **Guiding Question**: What value should be returned at the end?"
-            if "pass" in code_str:
+            if "pass_placeholder" in issues:
                 return "🧐 **Observation**: `pass` placeholder detected.\n💡 **Strategic Hint**: Logic is required here to process the input.\n❓ **Guiding Question**: How will you manipulate the input data?"
+            if report["syntax_error"]:
+                return f"🧐 **Observation**: The parser rejected your code ({report['syntax_error']}).\n💡 **Strategic Hint**: Look at that line and the one just above it.\n❓ **Guiding Question**: Is a bracket, colon or quote left unclosed?"
             
             # If no specific errors found but user asks for logic
             if has_def:
@@ -251,9 +299,9 @@ class SocraticAI:
         if any(w in user_query for w in ["loop", "iterate", "repeat", "cycle"]):
             if "infinite_loop" in issues:
                 return "⚠️ **Risk Alert**: Your `while` loop has no exit condition.\n💡 **Strategic Hint**: This will run forever and freeze the system.\n❓ **Guiding Question**: Where should you place a `break` statement?"
-            if "for" in code_str:
+            if "For" in node_types:
                 return "🧐 **Observation**: You are using a `for` loop.\n💡 **Concept**: This controls the flow by iterating over a sequence (like a list or range).\n❓ **Guiding Question**: Is your iterator variable capturing the correct value?"
-            if "while" in code_str:
+            if "While" in node_types:
                 return "🧐 **Observation**: You are using a `while` loop.\n💡 **Concept**: This repeats logic as long as the condition remains `True`.\n❓ **Guiding Question**: Does your logic ensure the condition eventually becomes `False`?"
             return "🧐 **Observation**: No loops detected yet.\n💡 **Concept**: Loops allow you to process data collections or repeat actions.\n❓ **Guiding Question**: Do you need a `for` loop (fixed count) or `while` loop (conditional)?"
 
@@ -268,7 +316,7 @@ class SocraticAI:
         if not code_str:
             return "🧐 **Observation**: The workspace is empty.\n💡 **Strategic Hint**: Start by defining the solution structure.\n❓ **Guiding Question**: ready to write `def solve():`?"
         
-        if "pass" in code_str:
+        if "pass_placeholder" in issues:
             return "🧐 **Observation**: `pass` placeholder detected.\n💡 **Strategic Hint**: Logic is required here to process the input.\n❓ **Guiding Question**: How will you manipulate the input data?"
 
         if "missing_return" in issues:
@@ -278,56 +326,79 @@ class SocraticAI:
         return "🧐 **Observation**: Code structure appears valid.\n💡 **Strategic Hint**: Double-check your logic flow against the mission requirements.\n❓ **Guiding Question**: Have you run the **Execute** command to test specific inputs?"
 
     # --- 5. MAIN CHAT HANDLER (With Circuit Breaker) ---
+    def _recall(self, user_code: str) -> str:
+        """Feedback stored for the most similar past mistake, or "" (memory off, offline Chroma, no hit)."""
+        if not (self.memory_active and user_code):
+            return ""
+        try:
+            if self.rag_backend == "local":
+                # No network: searched even while the tutor itself is offline
+                results = self.vector_db.similarity_search(user_code, k=1)
+            elif not self.api_ready or self.quota_exhausted:
+                return ""
+            else:
+                # Chroma embeds the query remotely, so it shares the breaker
+                results = guarded_call(self.breaker, self.limiters[EMBEDDING_MODEL],
+                                       self.vector_db.similarity_search, user_code, k=1)
+        except (CircuitOpenError, RateLimitedError):
+            return ""  # Skip retrieval for this turn only
+        except Exception as e:
+            # Quota errors already tripped the breaker; anything else disables memory
+            if not is_quota_error(e):
+                self.memory_active = False
+            return ""
+        return results[0].metadata.get("feedback", "") if results else ""
+
+    def _offline_reply(self, user_code: str, user_input: str, past_feedback: str = "") -> str:
+        reply = self._get_mock_response(user_code, user_input)
+        if past_feedback:
+            reply += f"\n📚 **From a similar past attempt**: {past_feedback}"
+        return reply
+
+    @llm_method("chat")
     def chat(self, user_input: str, user_code: str = "", session_id: str = "default_user", mode: str = "socratic"):
-        # STEP 1: Check Circuit Breaker (Fail Fast)
+        # STEP 1: RAG Retrieval (Memory); the local index answers offline too
+        past_feedback = self._recall(user_code) if mode == "socratic" else ""
+
+        # STEP 2: Check Circuit Breaker (Fail Fast)
         if not self.api_ready or self.quota_exhausted:
-            return self._get_mock_response(user_code, user_input)
+            return self._offline_reply(user_code, user_input, past_feedback)
 
         try:
-            # STEP 2: RAG Retrieval (Memory)
-            rag_context = ""
-            if self.memory_active and user_code and mode == "socratic":
-                try:
-                    results = self.vector_db.similarity_search(user_code, k=1)
-                    if results:
-                        rag_context = f"\nContext from Past: '{results[0].metadata.get('feedback', '')}'"
-                except Exception as e:
-                    # If memory fails, just disable it locally and proceed
-                    self.memory_active = False 
-                    if "429" in str(e):
-                        self.quota_exhausted = True # Trip breaker if quota hit here
-
-            # STEP 3: Generate Response
-            if self.quota_exhausted:
-                 return self._get_mock_response(user_code, user_input)
+            rag_context = f"\nContext from Past: '{past_feedback}'" if past_feedback else ""
 
+            # STEP 3: Generate Response (raises CircuitOpenError if retrieval tripped the breaker)
             if mode == "socratic":
                 objective = self._extract_mission_context(user_input)
                 dynamic_prompt = f"{SOCRATIC_SYSTEM_PROMPT}\nMISSION: {objective}\n{rag_context}"
                 full_input = f"{user_input}\n[STUDENT CODE]:\n{user_code}"
                 
-                response = self.socratic_conversation.invoke(
+                response = guarded_call(
+                    self.breaker, self.limiters[CHAT_MODEL], self.socratic_conversation.invoke,
                     {"input": full_input, "system_prompt": dynamic_prompt},
                     config={"configurable": {"session_id": session_id}}
                 )
             else:
                 # Doubt Mode
-                response = self.doubt_conversation.invoke(
+                response = guarded_call(
+                    self.breaker, self.limiters[CHAT_MODEL], self.doubt_conversation.invoke,
                     {"input": user_input, "system_prompt": DOUBT_CLEARING_PROMPT},
                     config={"configurable": {"session_id": session_id}}
                 )
             
             return response
 
+        except (CircuitOpenError, RateLimitedError):
+            return self._offline_reply(user_code, user_input, past_feedback)
+
         except Exception as e:
             error_str = str(e)
             
             # STEP 4: Handle Quota Errors Gracefully
-            # 429 = Quota, 400/InvalidArgument = Bad Request
-            if "429" in error_str or "ResourceExhausted" in error_str:
-                print("⚠️ API QUOTA HIT. Enabling Offline Mode.")
-                self.quota_exhausted = True 
-                return self._get_mock_response(user_code, user_input)
+            # 429 = Quota (breaker is now open), 400/InvalidArgument = Bad Request
+            if is_quota_error(e):
+                print("⚠️ API QUOTA HIT. Offline Mode until the breaker probe succeeds.")
+                return self._offline_reply(user_code, user_input, past_feedback)
             
             if "INVALID_ARGUMENT" in error_str:
                 print(f"❌ Gemini Config Error: {error_str}")
@@ -344,17 +415,26 @@ class SocraticAI:
     def explain_logic_diff(self, user_code: str, mission_objective: str):
         return "Comparison unavailable in Offline Mode."
 
+    @llm_method("log_student_mistake")
     def log_student_mistake(self, user_code: str, feedback: str, topic: str):
-        if not self.api_ready or self.quota_exhausted or not self.memory_active: 
+        if not self.memory_active:
+            return
+        # The local index never touches the network, so it keeps learning while offline
+        if self.rag_backend != "local" and (not self.api_ready or self.quota_exhausted):
             return
         try:
+            from langchain_core.documents import Document
             doc = Document(page_content=user_code, metadata={"feedback": feedback, "topic": topic, "type": "mistake"})
-            self.vector_db.add_documents([doc])
+            if self.rag_backend == "local":
+                self.vector_db.add_documents([doc])
+            else:
+                guarded_call(self.breaker, self.limiters[EMBEDDING_MODEL], self.vector_db.add_documents, [doc])
         except Exception:
             pass 
 
     # --- 7. NEW ENHANCED METHODS ---
     
+    @llm_method("analyze_runtime_error")
     def analyze_runtime_error(self, code: str, error_trace: str):
         """
         Context-Aware Traceback Analysis using Gemini.
@@ -365,15 +445,18 @@ class SocraticAI:
         
         try:
             prompt = f"{ERROR_ANALYSIS_PROMPT}\n\nCODE:\n{code}\n\nTRACEBACK:\n{error_trace}"
-            response = self.llm.invoke(prompt).content
+            response = self._invoke_llm(prompt)
             
             # Sanitize response to ensure valid JSON
             cleaned = response.replace('```json', '').replace('```', '').strip()
             return json.loads(cleaned)
+        except (CircuitOpenError, RateLimitedError):
+            return {"line": 0, "explanation": "⚠️ AI Offline: Unable to analyze error diagnostics."}
         except Exception as e:
             print(f"Error Analysis Failed: {e}")
             return {"line": 0, "explanation": "System Failure: Diagnostics sub-routine interrupted."}
 
+    @llm_method("create_adaptive_mission")
     def create_adaptive_mission(self, topic: str):
         """
         Generates a harder mission if the user is progressing too fast.
@@ -383,15 +466,18 @@ class SocraticAI:
         
         try:
             prompt = f"{ADAPTIVE_MISSION_PROMPT}\n\nTOPIC: {topic}"
-            response = self.llm.invoke(prompt).content
+            response = self._invoke_llm(prompt)
             
             cleaned = response.replace('```json', '').replace('```', '').strip()
             return json.loads(cleaned)
+        except (CircuitOpenError, RateLimitedError):
+            return None
         except Exception as e:
             print(f"Adaptive Mission Gen Failed: {e}")
             return None
 
     # --- [NEW] VOICE TO LOGIC METHOD ---
+    @llm_method("generate_skeleton")
     def generate_skeleton(self, voice_input: str):
         """
         Converts spoken logic into Python code structure.
@@ -401,29 +487,56 @@ class SocraticAI:
         
         try:
             prompt = VOICE_TO_CODE_PROMPT.format(input=voice_input)
-            response = self.llm.invoke(prompt).content
+            response = self._invoke_llm(prompt)
             # Cleanup markdown
             return response.replace('```python', '').replace('```', '').strip()
+        except (CircuitOpenError, RateLimitedError):
+            return "# ⚠️ Voice module offline. Please type code."
         except Exception as e:
             print(f"Voice Gen Failed: {e}")
             return "# Error generating code structure."
 
     # --- [NEW] PREDICTIVE DEBUGGING METHOD ---
-    def predict_simulation(self, code: str):
+    @llm_method("predict_simulation")
+    def predict_simulation(self, code: str, static_result: dict = None):
         """
         Simulates future execution states to warn about spikes/loops.
+        The local static engine answers first; Gemini is only consulted when it is inconclusive.
+        Pass static_result when the caller already ran predict_execution_risks (e.g. through the scheduler).
         """
-        if not self.api_ready or self.quota_exhausted:
-            return {"risk_level": "Unknown", "prediction": "Simulation engine offline.", "suggestion": "Check manually."}
+        if static_result is None:
+            static_result = predict_execution_risks(code, dry_run=PREDICT_DRY_RUN)
+        if static_result["conclusive"] or not self.api_ready or self.quota_exhausted:
+            return static_result
         
         try:
-            prompt = PREDICTIVE_DEBUG_PROMPT.format(code=code)
-            response = self.llm.invoke(prompt).content
+            # The prompt embeds a JSON example, so str.format() would trip on its braces
+            prompt = PREDICTIVE_DEBUG_PROMPT.replace("{code}", code)
+            response = self._invoke_llm(prompt)
             cleaned = response.replace('```json', '').replace('```', '').strip()
-            return json.loads(cleaned)
+            result = json.loads(cleaned)
+            result["source"] = "llm"
+            return result
+        except (CircuitOpenError, RateLimitedError):
+            return static_result
         except Exception as e:
             print(f"Prediction Failed: {e}")
-            return {"risk_level": "Error", "prediction": "Analysis interrupted.", "suggestion": ""}
-
-# Initialize the global instance
-ai_tutor = SocraticAI()
\ No newline at end of file
+            return static_result
+
+# --- 8. LAZY SINGLETON ---
+# Built on first use (or by the warm-up task in main.py) rather than at import time,
+# so uvicorn workers and reloads can accept requests immediately.
+_ai_tutor = None
+_ai_tutor_lock = threading.Lock()
+
+def get_ai_tutor() -> SocraticAI:
+    global _ai_tutor
+    if _ai_tutor is None:
+        with _ai_tutor_lock:
+            if _ai_tutor is None:
+                with timed_phase("ai: SocraticAI init"):
+                    _ai_tutor = SocraticAI()
+    return _ai_tutor
+
+def ai_tutor_ready() -> bool:
+    return _ai_tutor is not None
\ No newline at end of file
@@ -0,0 +1,179 @@
+import time
+import threading
+import functools
+import contextvars
+from app.metrics import registry
+
+llm_calls = registry.counter("deepblue_llm_calls_total",
+                             "LLM/embedding calls by SocraticAI method and outcome.", ("method", "outcome"))
+llm_latency = registry.histogram("deepblue_llm_call_duration_seconds",
+                                 "Latency of LLM/embedding calls that reached the API.", ("method",))
+# Which SocraticAI method the current guarded_call belongs to (set by llm_method)
+_current_method = contextvars.ContextVar("llm_method", default="other")
+
+def llm_method(name: str):
+    """Decorator: guarded calls made inside the wrapped method are labelled `name` in the metrics."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _current_method.set(name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_method.reset(token)
+        return wrapper
+    return decorate
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised when the breaker rejects a call without attempting it."""
+
+class RateLimitedError(Exception):
+    """Raised when the client-side token bucket has no capacity left."""
+
+def is_quota_error(error: Exception) -> bool:
+    error_str = str(error)
+    return "429" in error_str or "ResourceExhausted" in error_str or type(error).__name__ == "ResourceExhausted"
+
+class TokenBucket:
+    """
+    Non-blocking token bucket. `rate` tokens are added per second up to `capacity`.
+    try_acquire() never sleeps: callers on the threadpool fall back instead of waiting.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.granted = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                self.granted += 1
+                return True
+            self.throttled += 1
+            return False
+
+    def snapshot(self):
+        with self._lock:
+            return {"rate_per_sec": self.rate, "capacity": self.capacity, "tokens": round(self.tokens, 2),
+                    "granted": self.granted, "throttled": self.throttled}
+
+class CircuitBreaker:
+    """
+    Closed -> Open after `failure_threshold` consecutive failures (or immediately on a
+    forced trip such as a 429). Open -> Half-open once the cooldown elapses, letting a
+    single probe through. A successful probe closes the breaker; a failed one re-opens
+    it with the cooldown doubled (capped at `max_cooldown`).
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 30.0, max_cooldown: float = 600.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.transitions = {}
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, new_state: str):
+        if new_state == self.state:
+            return
+        key = f"{self.state}->{new_state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        print(f"⚡ Circuit '{self.name}': {self.state} -> {new_state}")
+        self.state = new_state
+        if new_state == OPEN:
+            self.opened_at = time.monotonic()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """Give back a half-open probe slot when the call was never attempted."""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+            self.cooldown = self.base_cooldown
+            self._transition(CLOSED)
+
+    def record_failure(self, force_open: bool = False):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN:
+                self.probe_in_flight = False
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self._transition(OPEN)
+            elif force_open or self.consecutive_failures >= self.failure_threshold:
+                self._transition(OPEN)
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.cooldown
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures,
+                    "cooldown_sec": self.cooldown, "rejected": self.rejected,
+                    "transitions": dict(self.transitions)}
+
+def guarded_call(breaker: CircuitBreaker, limiter: TokenBucket, fn, *args, **kwargs):
+    """
+    Runs fn through the breaker and the limiter. Raises CircuitOpenError /
+    RateLimitedError without calling fn; re-raises fn's own exceptions after
+    recording them (quota errors trip the breaker immediately).
+    """
+    method = _current_method.get()
+    if not breaker.allow_request():
+        llm_calls.inc(method, "circuit_open")
+        raise CircuitOpenError(breaker.name)
+    if not limiter.try_acquire():
+        breaker.release()
+        llm_calls.inc(method, "rate_limited")
+        raise RateLimitedError(breaker.name)
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        llm_latency.observe(time.perf_counter() - start, method)
+        if "INVALID_ARGUMENT" in str(e):
+            # Our request was bad; says nothing about the API's health
+            breaker.release()
+            llm_calls.inc(method, "invalid_argument")
+        else:
+            quota = is_quota_error(e)
+            breaker.record_failure(force_open=quota)
+            llm_calls.inc(method, "quota" if quota else "error")
+        raise
+    llm_latency.observe(time.perf_counter() - start, method)
+    llm_calls.inc(method, "ok")
+    breaker.record_success()
+    return result
@@ -0,0 +1,205 @@
+import ast
+import re
+import sys
+from collections import OrderedDict
+
+# Built-ins students most often overwrite by accident (list = [...], sum = 0)
+SHADOWABLE_BUILTINS = {
+    "list", "dict", "str", "int", "float", "set", "tuple", "sum", "max", "min",
+    "len", "range", "input", "print", "type", "id", "sorted", "map", "filter",
+}
+
+FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+LOOP_NODES = (ast.For, ast.AsyncFor, ast.While)
+
+# Only used on the single offending line reported by the parser (pre-3.10 messages)
+ASSIGN_IN_CONDITION_LINE = re.compile(r"^\s*(if|elif|while)\s+[^=]*[^=!<>]=[^=]")
+PY2_PRINT_LINE = re.compile(r"^\s*print\s+[\"'\w]")
+
+class AnalysisContext:
+    """
+    Shared state for one walk over the tree.
+    The engine keeps the scope bookkeeping (functions, loops) so rules stay small.
+    """
+    def __init__(self):
+        self.issues = OrderedDict()  # issue name -> first line number
+        self.node_types = set()
+        self.function_stack = [{"node": None, "has_return": False, "loops": []}]
+
+    @property
+    def current_function(self):
+        return self.function_stack[-1]
+
+    @property
+    def current_loop(self):
+        loops = self.current_function["loops"]
+        return loops[-1] if loops else None
+
+    def report(self, issue: str, node=None):
+        if issue not in self.issues:
+            self.issues[issue] = getattr(node, "lineno", None)
+
+class StaticRule:
+    """
+    Base class for a check. `node_types` selects which nodes the engine hands to
+    enter()/leave(); leave() runs after the node's children have been walked.
+    """
+    name = ""
+    node_types = ()
+
+    def enter(self, node, ctx: AnalysisContext):
+        pass
+
+    def leave(self, node, ctx: AnalysisContext):
+        pass
+
+RULE_REGISTRY: dict[str, StaticRule] = {}
+_DISPATCH: dict[type, list[StaticRule]] = {}
+
+def register_rule(cls):
+    """Class decorator: instantiate the rule and index it by the node types it handles."""
+    rule = cls()
+    RULE_REGISTRY[rule.name] = rule
+    _DISPATCH.clear()
+    for registered in RULE_REGISTRY.values():
+        for node_type in registered.node_types:
+            _DISPATCH.setdefault(node_type, []).append(registered)
+    # Cached "issues" results predate this rule. The pipeline imports this module, so it
+    # only has a cache to clear once it has finished loading (a rule registered later)
+    clear_cache = getattr(sys.modules.get("app.engine.analysis"), "clear_cache", None)
+    if clear_cache is not None:
+        clear_cache()
+    return cls
+
+# --- RULES ---
+
+@register_rule
+class ShadowingBuiltinRule(StaticRule):
+    name = "shadowing_builtin"
+    node_types = (ast.Name,)
+
+    def enter(self, node, ctx):
+        if isinstance(node.ctx, ast.Store) and node.id in SHADOWABLE_BUILTINS:
+            ctx.report(self.name, node)
+
+@register_rule
+class AppendAssignmentRule(StaticRule):
+    name = "append_assignment"
+    node_types = (ast.Assign, ast.AnnAssign)
+
+    def enter(self, node, ctx):
+        value = node.value
+        if (isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute)
+                and value.func.attr == "append"):
+            ctx.report(self.name, node)
+
+@register_rule
+class MissingReturnRule(StaticRule):
+    name = "missing_return"
+    node_types = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+    def leave(self, node, ctx):
+        if not ctx.current_function["has_return"]:
+            ctx.report(self.name, node)
+
+@register_rule
+class UnboundedWhileRule(StaticRule):
+    name = "infinite_loop"
+    node_types = (ast.While,)
+
+    def leave(self, node, ctx):
+        always_true = isinstance(node.test, ast.Constant) and bool(node.test.value)
+        if always_true and not ctx.current_loop["exits"]:
+            ctx.report(self.name, node)
+
+@register_rule
+class PassPlaceholderRule(StaticRule):
+    name = "pass_placeholder"
+    node_types = (ast.Pass,)
+
+    def enter(self, node, ctx):
+        ctx.report(self.name, node)
+
+# --- ENGINE ---
+
+def _enter_scope(node, ctx):
+    if isinstance(node, FUNCTION_NODES):
+        # A lambda body is an expression, so it always "returns"
+        ctx.function_stack.append({"node": node, "has_return": isinstance(node, ast.Lambda), "loops": []})
+    elif isinstance(node, LOOP_NODES):
+        ctx.current_function["loops"].append({"node": node, "exits": False})
+    elif isinstance(node, ast.Break):
+        if ctx.current_loop:
+            ctx.current_loop["exits"] = True
+    elif isinstance(node, (ast.Return, ast.Raise)):
+        if isinstance(node, ast.Return):
+            ctx.current_function["has_return"] = True
+        # return/raise leave every loop of the enclosing function
+        for loop in ctx.current_function["loops"]:
+            loop["exits"] = True
+
+def _leave_scope(node, ctx):
+    if isinstance(node, FUNCTION_NODES):
+        ctx.function_stack.pop()
+    elif isinstance(node, LOOP_NODES):
+        ctx.current_function["loops"].pop()
+
+def _run_rules(tree) -> AnalysisContext:
+    ctx = AnalysisContext()
+    # Iterative walk with explicit leave markers: one pass, no recursion limit on deep code
+    stack = [(tree, False)]
+    while stack:
+        node, leaving = stack.pop()
+        rules = _DISPATCH.get(type(node), ())
+        if leaving:
+            for rule in rules:
+                rule.leave(node, ctx)
+            _leave_scope(node, ctx)
+            continue
+        ctx.node_types.add(type(node).__name__)
+        _enter_scope(node, ctx)
+        for rule in rules:
+            rule.enter(node, ctx)
+        stack.append((node, True))
+        children = list(ast.iter_child_nodes(node))
+        for child in reversed(children):
+            stack.append((child, False))
+    return ctx
+
+def _syntax_issues(error: SyntaxError):
+    """Map parser diagnostics onto the same issue names the rules use."""
+    msg = error.msg or ""
+    line = error.text or ""
+    if "Maybe you meant '=='" in msg or ASSIGN_IN_CONDITION_LINE.match(line):
+        return ["assignment_in_if"]
+    if "Missing parentheses in call to 'print'" in msg or PY2_PRINT_LINE.match(line):
+        return ["missing_print_parens"]
+    return []
+
+def _empty_report():
+    return {"issues": [], "lines": {}, "node_types": frozenset(), "syntax_error": None}
+
+def report_for_tree(tree) -> dict:
+    """Uncached report for an already parsed tree (used by the analysis pipeline)."""
+    report = _empty_report()
+    try:
+        ctx = _run_rules(tree)
+    except RecursionError as e:
+        report["syntax_error"] = str(e)
+        return report
+    report["issues"] = list(ctx.issues)
+    report["lines"] = dict(ctx.issues)
+    report["node_types"] = frozenset(ctx.node_types)
+    return report
+
+def report_for_error(error: Exception) -> dict:
+    """Report for code the parser rejected."""
+    report = _empty_report()
+    if isinstance(error, SyntaxError):
+        issues = _syntax_issues(error)
+        report["issues"] = issues
+        report["lines"] = {issue: error.lineno for issue in issues}
+        report["syntax_error"] = f"{error.msg} at line {error.lineno}"
+    else:
+        report["syntax_error"] = str(error)
+    return report
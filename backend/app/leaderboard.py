@@ -0,0 +1,224 @@
+import time
+import bisect
+import threading
+from datetime import datetime
+from sqlalchemy import text, func, select, update, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from app import models
+from app.matchmaking import DEFAULT_RATING
+
+TOP_K = 10
+# Matchmaking rating: DEFAULT_RATING plus these per completed mission and per top-K placement
+RATING_PER_MISSION = 25
+RATING_PER_PLACEMENT = 40
+RATING_TTL = 300.0
+
+def ensure_leaderboard_schema(engine):
+    """
+    create_all() never touches an existing table, so databases created before the
+    personal-best model still hold one row per submission. Collapse those to each
+    user's best run, then add the indexes the model now declares. Also adds the
+    complexity columns to tables created before them.
+    """
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        columns = {c["name"] for c in inspector.get_columns("leaderboard")}
+        for name, sql_type in (("complexity", "VARCHAR"), ("complexity_confidence", "FLOAT")):
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE leaderboard ADD COLUMN {name} {sql_type}"))
+        if "ux_leaderboard_mission_user" in {i["name"] for i in inspector.get_indexes("leaderboard")}:
+            return
+        conn.execute(text("""
+            DELETE FROM leaderboard WHERE id NOT IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY mission_id, user_id ORDER BY execution_time, id
+                    ) AS rn FROM leaderboard
+                ) AS ranked WHERE rn = 1
+            )
+        """))
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_leaderboard_mission_user ON leaderboard (mission_id, user_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_leaderboard_mission_time ON leaderboard (mission_id, execution_time)"))
+
+def _entry(row):
+    return {
+        "id": row.id,
+        "mission_id": row.mission_id,
+        "user_id": row.user_id,
+        "username": row.username,
+        "execution_time": row.execution_time,
+        "memory_usage": row.memory_usage,
+        "timestamp": row.timestamp,
+        "complexity": row.complexity,
+        "complexity_confidence": row.complexity_confidence,
+    }
+
+class LeaderboardService:
+    """
+    One personal-best row per (mission, user) in the database, plus an in-memory
+    top-K per mission. Because a user's best time only ever improves, an entry can
+    only enter the top-K or move up inside it, so submits update it in place.
+    A TTL reload picks up submissions made through other workers.
+    """
+    def __init__(self, k: int = TOP_K, ttl: float = 60.0):
+        self.k = k
+        self.ttl = ttl
+        self._boards = {}  # mission_id -> (loaded_at, [(time, id), ...], {id: entry})
+        self._ratings = {}  # user_id -> (computed_at, rating)
+        self._lock = threading.Lock()
+
+    async def _load(self, db, mission_id):
+        rows = (await db.execute(
+            select(models.Leaderboard)
+            .where(models.Leaderboard.mission_id == mission_id)
+            .order_by(models.Leaderboard.execution_time.asc())
+            .limit(self.k)
+        )).scalars().all()
+        entries = [_entry(r) for r in rows]
+        keys = [(e["execution_time"], e["id"]) for e in entries]
+        return (time.monotonic(), keys, {e["id"]: e for e in entries})
+
+    async def _board(self, db, mission_id):
+        with self._lock:
+            board = self._boards.get(mission_id)
+        if board is None or time.monotonic() - board[0] > self.ttl:
+            board = await self._load(db, mission_id)
+            with self._lock:
+                self._boards[mission_id] = board
+        return board
+
+    async def top(self, db, mission_id: int):
+        _, keys, entries = await self._board(db, mission_id)
+        return [entries[row_id] for _, row_id in keys]
+
+    def _update_board(self, mission_id, entry):
+        with self._lock:
+            board = self._boards.get(mission_id)
+            if board is None:
+                return
+            _, keys, entries = board
+            if entry["id"] in entries:
+                old = entries[entry["id"]]
+                keys.remove((old["execution_time"], old["id"]))
+            key = (entry["execution_time"], entry["id"])
+            if len(keys) >= self.k and key >= keys[-1]:
+                return
+            bisect.insort(keys, key)
+            entries[entry["id"]] = entry
+            while len(keys) > self.k:
+                _, dropped = keys.pop()
+                entries.pop(dropped, None)
+
+    async def submit(self, db, user, mission_id: int, execution_time: float, memory_usage: float,
+                     _retry: bool = True) -> dict:
+        """Upserts the user's personal best. Returns whether this run improved it."""
+        board = models.Leaderboard
+        user_id, username = user.id, user.username
+        stamp = datetime.now().isoformat()
+        # Conditional write: a concurrent slower submit can't overwrite a faster best
+        improved = await db.execute(
+            update(board)
+            .where(board.mission_id == mission_id, board.user_id == user_id, board.execution_time > execution_time)
+            .values(execution_time=execution_time, memory_usage=memory_usage, username=username, timestamp=stamp,
+                    # Measured for the previous best's code; record_complexity() fills it in again
+                    complexity=None, complexity_confidence=None)
+        )
+        if improved.rowcount:
+            row = (await db.execute(select(board).filter_by(mission_id=mission_id, user_id=user_id))).scalars().first()
+            await db.commit()
+            self._update_board(mission_id, _entry(row))
+            return {"personal_best": True, "best_time": execution_time}
+
+        best = (await db.execute(
+            select(board.execution_time).filter_by(mission_id=mission_id, user_id=user_id)
+        )).scalar()
+        if best is not None:
+            await db.rollback()
+            return {"personal_best": False, "best_time": best}
+
+        row = board(mission_id=mission_id, user_id=user_id, username=username,
+                    execution_time=execution_time, memory_usage=memory_usage, timestamp=stamp)
+        db.add(row)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # A concurrent first submit from the same user won the insert; retry once as an update.
+            # The rollback expired every loaded object, and reading an expired attribute
+            # (user.id) would lazy-load outside the async context, so reload the user first
+            await db.rollback()
+            if not _retry:
+                raise
+            await db.refresh(user)
+            return await self.submit(db, user, mission_id, execution_time, memory_usage, _retry=False)
+        self._update_board(mission_id, _entry(row))
+        return {"personal_best": True, "best_time": execution_time}
+
+    async def record_complexity(self, db, mission_id: int, user_id: int, complexity: str, confidence: float):
+        """Attaches the measured growth class to the user's personal best (row and cached board)."""
+        await db.execute(
+            update(models.Leaderboard)
+            .where(models.Leaderboard.mission_id == mission_id, models.Leaderboard.user_id == user_id)
+            .values(complexity=complexity, complexity_confidence=confidence)
+        )
+        await db.commit()
+        with self._lock:
+            board = self._boards.get(mission_id)
+            if board is not None:
+                for row_id, entry in board[2].items():
+                    if entry["user_id"] == user_id:
+                        board[2][row_id] = {**entry, "complexity": complexity, "complexity_confidence": confidence}
+
+    async def rank(self, db, mission_id: int, user_id: int):
+        """1-based rank of the user's best run (ties share a rank), via the (mission_id, execution_time) index."""
+        best = (await db.execute(
+            select(models.Leaderboard.execution_time).filter_by(mission_id=mission_id, user_id=user_id)
+        )).scalar()
+        if best is None:
+            return None
+        faster = (await db.execute(
+            select(func.count(models.Leaderboard.id)).where(
+                models.Leaderboard.mission_id == mission_id,
+                models.Leaderboard.execution_time < best
+            )
+        )).scalar()
+        total = (await db.execute(
+            select(func.count(models.Leaderboard.id)).where(models.Leaderboard.mission_id == mission_id)
+        )).scalar()
+        return {"mission_id": mission_id, "user_id": user_id, "rank": faster + 1, "total": total, "execution_time": best}
+
+    async def rating(self, db, user_id: int) -> int:
+        """
+        Matchmaking skill estimate from missions completed (users.completed_missions,
+        maintained from user_progress) and personal bests currently inside a mission's top-K.
+        Cached per user for RATING_TTL; ratings move slowly and queueing shouldn't hit the DB.
+        """
+        cached = self._ratings.get(user_id)
+        if cached and time.monotonic() - cached[0] < RATING_TTL:
+            return cached[1]
+        completed = (await db.execute(
+            select(models.User.completed_missions).where(models.User.id == user_id)
+        )).scalar()
+        if completed is None:
+            return DEFAULT_RATING
+        other = aliased(models.Leaderboard)
+        faster = select(func.count(other.id)).where(
+            other.mission_id == models.Leaderboard.mission_id,
+            other.execution_time < models.Leaderboard.execution_time
+        ).scalar_subquery()
+        placements = (await db.execute(
+            select(func.count(models.Leaderboard.id)).where(models.Leaderboard.user_id == user_id, faster < self.k)
+        )).scalar()
+        rating = DEFAULT_RATING + RATING_PER_MISSION * completed + RATING_PER_PLACEMENT * placements
+        self._ratings[user_id] = (time.monotonic(), rating)
+        return rating
+
+    def forget_user(self, user_id: int):
+        self._ratings.pop(user_id, None)
+        with self._lock:
+            stale = [m for m, (_, _, entries) in self._boards.items()
+                     if any(e["user_id"] == user_id for e in entries.values())]
+            for mission_id in stale:
+                del self._boards[mission_id]
+
+leaderboard = LeaderboardService()
@@ -0,0 +1,199 @@
+import os
+import time
+import random
+import asyncio
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from sqlalchemy import select, update, func
+from app import models
+from app.database import AsyncSessionLocal
+
+def _flag(name, default):
+    return os.getenv(name, default) == "1"
+
+# Same MAIL_* variables the FastMail config used. For local testing point it at a stand-in:
+#   python -m aiosmtpd -n -l localhost:1025
+#   MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_STARTTLS=0 MAIL_USE_CREDENTIALS=0
+MAIL_SETTINGS = {
+    "hostname": os.getenv("MAIL_SERVER", "smtp.gmail.com"),
+    "port": int(os.getenv("MAIL_PORT", 587)),
+    "start_tls": _flag("MAIL_STARTTLS", "1"),
+    "use_tls": _flag("MAIL_SSL_TLS", "0"),
+    "validate_certs": _flag("MAIL_VALIDATE_CERTS", "1"),
+    "timeout": float(os.getenv("MAIL_TIMEOUT", 30)),
+}
+MAIL_USERNAME = os.getenv("MAIL_USERNAME")
+MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
+MAIL_FROM = os.getenv("MAIL_FROM", MAIL_USERNAME)
+MAIL_USE_CREDENTIALS = _flag("MAIL_USE_CREDENTIALS", "1")
+
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 20))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 6))
+MAIL_BACKOFF_BASE = float(os.getenv("MAIL_BACKOFF_BASE", 2.0))
+MAIL_BACKOFF_MAX = float(os.getenv("MAIL_BACKOFF_MAX", 300.0))
+# An open SMTP connection is kept this long after the last send, then closed
+MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", 30.0))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", 5.0))
+# A claimed row whose worker died without finishing is picked up again after this long
+MAIL_CLAIM_LEASE = float(os.getenv("MAIL_CLAIM_LEASE", 300.0))
+
+def _backoff(attempts: int) -> float:
+    # Exponential with full jitter, so a recovering server isn't hit by every retry at once
+    return random.uniform(0, min(MAIL_BACKOFF_MAX, MAIL_BACKOFF_BASE * (2 ** attempts)))
+
+class MailWorker:
+    """
+    Delivers queued mail from the mail_outbox table over one reused SMTP connection.
+
+    Producers call enqueue(); the row is committed before the request returns, so
+    nothing is lost if the process restarts. The worker drains due rows in batches,
+    deletes each on success and reschedules failures with exponential backoff until
+    MAIL_MAX_ATTEMPTS, after which the row is kept as status="failed".
+    Every API worker runs one: a row is claimed (status="sending") by a conditional
+    UPDATE before it is sent, so only one of them delivers it. The claim is a lease of
+    MAIL_CLAIM_LEASE seconds, after which a crashed worker's rows are due again.
+    """
+    def __init__(self, session_factory=AsyncSessionLocal, batch_size: int = MAIL_BATCH_SIZE,
+                 max_attempts: int = MAIL_MAX_ATTEMPTS, idle_timeout: float = MAIL_IDLE_TIMEOUT,
+                 poll_interval: float = MAIL_POLL_INTERVAL, settings: dict = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.settings = dict(MAIL_SETTINGS if settings is None else settings)
+        self._smtp = None
+        self._last_used = 0.0
+        self._wake = asyncio.Event()
+        self.stats = {"sent": 0, "retried": 0, "failed": 0, "connections": 0}
+
+    async def enqueue(self, db, recipient: str, subject: str, body: str, subtype: str = "html"):
+        db.add(models.MailOutbox(recipient=recipient, subject=subject, body=body, subtype=subtype))
+        await db.commit()
+        self._wake.set()
+
+    def _build(self, row) -> EmailMessage:
+        msg = EmailMessage()
+        msg["From"] = MAIL_FROM
+        msg["To"] = row.recipient
+        msg["Subject"] = row.subject
+        msg.set_content(row.body or "", subtype=row.subtype or "plain")
+        return msg
+
+    async def _connection(self):
+        if self._smtp is not None and self._smtp.is_connected:
+            return self._smtp
+        import aiosmtplib
+        smtp = aiosmtplib.SMTP(**self.settings)
+        await smtp.connect()
+        if MAIL_USE_CREDENTIALS and MAIL_USERNAME:
+            await smtp.login(MAIL_USERNAME, MAIL_PASSWORD)
+        self._smtp = smtp
+        self.stats["connections"] += 1
+        return smtp
+
+    async def _close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except Exception:
+                smtp.close()
+
+    def _reschedule(self, row, error):
+        row.attempts = (row.attempts or 0) + 1
+        row.last_error = str(error)[:500]
+        if row.attempts >= self.max_attempts:
+            row.status = "failed"
+            self.stats["failed"] += 1
+            print(f"📭 Mail to {row.recipient} failed permanently: {error}")
+        else:
+            row.status = "pending"
+            row.next_attempt_at = datetime.utcnow() + timedelta(seconds=_backoff(row.attempts))
+            self.stats["retried"] += 1
+
+    async def _claim(self, db) -> tuple:
+        """(due, rows): how many rows were due, and the ones this worker claimed."""
+        now = datetime.utcnow()
+        outbox = models.MailOutbox
+        # Pending rows that are due, and claims whose lease ran out
+        due = (outbox.status.in_(("pending", "sending")), outbox.next_attempt_at <= now)
+        ids = (await db.execute(
+            select(outbox.id).where(*due).order_by(outbox.id).limit(self.batch_size)
+        )).scalars().all()
+        claimed = []
+        for row_id in ids:
+            # Another worker may have claimed it since the select: then no row matches
+            result = await db.execute(
+                update(outbox).where(outbox.id == row_id, *due)
+                .values(status="sending", next_attempt_at=now + timedelta(seconds=MAIL_CLAIM_LEASE))
+            )
+            if result.rowcount:
+                claimed.append(row_id)
+        await db.commit()
+        if not claimed:
+            return len(ids), []
+        rows = (await db.execute(
+            select(outbox).where(outbox.id.in_(claimed)).order_by(outbox.id)
+        )).scalars().all()
+        return len(ids), rows
+
+    async def run_once(self) -> int:
+        """Sends one batch of due mail. Returns how many rows were picked up."""
+        import aiosmtplib
+        async with self.session_factory() as db:
+            due, rows = await self._claim(db)
+            if not rows:
+                return due
+            for i, row in enumerate(rows):
+                try:
+                    smtp = await self._connection()
+                    await smtp.send_message(self._build(row))
+                except aiosmtplib.SMTPRecipientsRefused as e:
+                    # Permanent for this message only; the connection is still good
+                    row.attempts = self.max_attempts - 1
+                    self._reschedule(row, e)
+                except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+                    # Connection-level trouble: back off this message and the rest of the batch
+                    await self._close()
+                    for pending in rows[i:]:
+                        self._reschedule(pending, e)
+                    break
+                except Exception as e:
+                    # Anything else (e.g. a message that can't be built) is this row's problem:
+                    # it counts as an attempt, so the row ends up "failed" instead of being
+                    # re-claimed after every lease
+                    self._reschedule(row, e)
+                else:
+                    await db.delete(row)
+                    self.stats["sent"] += 1
+                    self._last_used = time.monotonic()
+            await db.commit()
+            return due
+
+    async def run(self):
+        while True:
+            # Cleared before draining, so an enqueue during run_once() still wakes the next wait
+            self._wake.clear()
+            try:
+                picked = await self.run_once()
+            except Exception as e:
+                print(f"⚠️ Mail worker error: {e}")
+                picked = 0
+            if picked >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                await self._close()
+
+    async def backlog(self) -> dict:
+        async with self.session_factory() as db:
+            rows = (await db.execute(
+                select(models.MailOutbox.status, func.count()).group_by(models.MailOutbox.status)
+            )).all()
+        return {status: count for status, count in rows}
+
+mail_worker = MailWorker()
@@ -0,0 +1,187 @@
+"""
+Rating-bucketed match queue. Owned by whichever process holds the shared queue
+(InProcessBackplane for a single worker, the backplane broker otherwise).
+
+Tickets are plain dicts, as they travel over the backplane:
+  {"id", "worker", "user", "rating", "queued_at"}   (queued_at is wall-clock time.time())
+
+Two players are compatible when their ratings differ by no more than the wider of
+their two windows; a window starts at MATCH_BASE_WINDOW and widens by
+MATCH_WIDEN_PER_SECOND while the player waits, up to MATCH_MAX_WINDOW.
+"""
+import os
+import time
+import math
+import uuid
+from collections import deque
+
+DEFAULT_RATING = 1000
+MATCH_BUCKET_WIDTH = int(os.getenv("MATCH_BUCKET_WIDTH", 100))
+MATCH_BASE_WINDOW = int(os.getenv("MATCH_BASE_WINDOW", 150))
+MATCH_WIDEN_PER_SECOND = float(os.getenv("MATCH_WIDEN_PER_SECOND", 25))
+MATCH_MAX_WINDOW = int(os.getenv("MATCH_MAX_WINDOW", 1000))
+# Players still unmatched after this long are taken out of the queue and told so
+MATCH_TIMEOUT = float(os.getenv("MATCH_TIMEOUT", 60))
+MATCH_SWEEP_INTERVAL = float(os.getenv("MATCH_SWEEP_INTERVAL", 1.0))
+WAIT_SAMPLES = 500
+
+def _percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3) if ordered else 0.0
+
+def wait_summary(samples) -> dict:
+    return {"count": len(samples), "p50": _percentile(samples, 0.5), "p95": _percentile(samples, 0.95),
+            "max": round(max(samples), 3) if samples else 0.0}
+
+class MatchQueue:
+    """
+    One FIFO deque per rating bucket plus one arrival-ordered deque for timeouts.
+
+    Every live ticket is in `live`; cancel() only removes it from there, and the stale
+    deque entries are skipped and discarded when they reach the front (lazy eviction).
+    Because the bucket width never exceeds the base window, two players in the same
+    bucket are always compatible, so a bucket's oldest live ticket is the only one that
+    needs checking. add() therefore looks at a bounded number of buckets around the
+    player's own, independent of how many players are queued.
+    """
+    def __init__(self, bucket_width: int = MATCH_BUCKET_WIDTH, base_window: int = MATCH_BASE_WINDOW,
+                 widen_per_second: float = MATCH_WIDEN_PER_SECOND, max_window: int = MATCH_MAX_WINDOW,
+                 timeout: float = MATCH_TIMEOUT):
+        self.bucket_width = max(1, min(bucket_width, base_window))
+        self.base_window = base_window
+        self.widen_per_second = widen_per_second
+        self.max_window = max(max_window, base_window)
+        self.timeout = timeout
+        self.reach = math.ceil(self.max_window / self.bucket_width)
+        self.buckets: dict[int, deque] = {}
+        self.arrivals = deque()  # tickets in arrival order, for timeouts
+        self.live: dict = {}  # ticket id -> ticket
+        self.waits = deque(maxlen=WAIT_SAMPLES)  # seconds waited by matched players
+        self.counters = {"queued": 0, "matched": 0, "cancelled": 0, "expired": 0}
+
+    def window(self, ticket: dict, now: float) -> float:
+        waited = max(0.0, now - ticket["queued_at"])
+        return min(self.max_window, self.base_window + self.widen_per_second * waited)
+
+    def _compatible(self, a: dict, b: dict, now: float) -> bool:
+        if a.get("user") is not None and a.get("user") == b.get("user"):
+            return False  # same account in two tabs
+        return abs(a["rating"] - b["rating"]) <= max(self.window(a, now), self.window(b, now))
+
+    def _bucket_of(self, ticket: dict) -> int:
+        return int(ticket["rating"]) // self.bucket_width
+
+    def _head(self, index: int):
+        """Oldest live ticket in a bucket, discarding stale entries in front of it."""
+        bucket = self.buckets.get(index)
+        while bucket:
+            ticket = bucket[0]
+            if self.live.get(ticket["id"]) is ticket:
+                return ticket
+            bucket.popleft()
+        if bucket is not None:
+            del self.buckets[index]
+        return None
+
+    def _best_opponent(self, ticket: dict, now: float):
+        home = self._bucket_of(ticket)
+        best = None
+        for index in range(home - self.reach, home + self.reach + 1):
+            if self._head(index) is None:
+                continue
+            for other in self.buckets[index]:
+                if self.live.get(other["id"]) is not other or (
+                        other.get("user") is not None and other.get("user") == ticket.get("user")):
+                    continue
+                # The oldest eligible ticket in the bucket has the widest window
+                if self._compatible(ticket, other, now):
+                    key = (abs(other["rating"] - ticket["rating"]), other["queued_at"])
+                    if best is None or key < best[0]:
+                        best = (key, other)
+                break
+        return best[1] if best else None
+
+    def _pair(self, a: dict, b: dict, now: float):
+        for ticket in (a, b):
+            del self.live[ticket["id"]]
+            self.waits.append(now - ticket["queued_at"])
+        self.counters["matched"] += 2
+        # Longer waiter first, as with the FIFO pool
+        return str(uuid.uuid4()), sorted([a, b], key=lambda t: t["queued_at"])
+
+    def add(self, ticket: dict, now: float = None):
+        """Returns (duel_id, [ticket_a, ticket_b]) if the player was paired straight away, else None."""
+        if ticket["id"] in self.live:
+            return None
+        now = time.time() if now is None else now
+        ticket = dict(ticket)
+        ticket.setdefault("queued_at", now)
+        ticket["rating"] = int(ticket.get("rating") or DEFAULT_RATING)
+        self.counters["queued"] += 1
+        opponent = self._best_opponent(ticket, now)
+        if opponent is not None:
+            self.live[ticket["id"]] = ticket
+            return self._pair(opponent, ticket, now)
+        self.live[ticket["id"]] = ticket
+        self.buckets.setdefault(self._bucket_of(ticket), deque()).append(ticket)
+        self.arrivals.append(ticket)
+        return None
+
+    def cancel(self, ticket_id: str):
+        if self.live.pop(ticket_id, None) is not None:
+            self.counters["cancelled"] += 1
+
+    def drop_worker(self, worker_id: str):
+        for ticket_id in [t for t, ticket in self.live.items() if ticket.get("worker") == worker_id]:
+            self.cancel(ticket_id)
+
+    def sweep(self, now: float = None):
+        """
+        Periodic housekeeping. Returns (pairs, expired): pairs that became compatible
+        because their windows widened, and tickets that waited past the timeout.
+        """
+        now = time.time() if now is None else now
+        expired = []
+        while self.arrivals:
+            ticket = self.arrivals[0]
+            if self.live.get(ticket["id"]) is not ticket:
+                self.arrivals.popleft()
+            elif now - ticket["queued_at"] >= self.timeout:
+                self.arrivals.popleft()
+                del self.live[ticket["id"]]
+                self.counters["expired"] += 1
+                expired.append(ticket)
+            else:
+                break
+
+        # add() already paired everyone who shares a bucket (bar one account in two tabs),
+        # so pairing neighbouring bucket heads in rating order covers widened windows
+        heads = [h for h in (self._head(i) for i in sorted(self.buckets)) if h is not None]
+        pairs = []
+        i = 0
+        while i < len(heads) - 1:
+            a, b = heads[i], heads[i + 1]
+            if self._compatible(a, b, now):
+                pairs.append(self._pair(a, b, now))
+                i += 2
+            else:
+                i += 1
+        return pairs, expired
+
+    def __len__(self):
+        return len(self.live)
+
+    def stats(self, now: float = None) -> dict:
+        now = time.time() if now is None else now
+        oldest = next((t for t in self.arrivals if self.live.get(t["id"]) is t), None)
+        depth_by_bucket = {}
+        for ticket in self.live.values():
+            low = self._bucket_of(ticket) * self.bucket_width
+            depth_by_bucket[low] = depth_by_bucket.get(low, 0) + 1
+        return {
+            "depth": len(self.live),
+            "depth_by_rating": dict(sorted(depth_by_bucket.items())),
+            "oldest_wait": round(now - oldest["queued_at"], 3) if oldest else 0.0,
+            "match_wait": wait_summary(self.waits),
+            **self.counters,
+        }
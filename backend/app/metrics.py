@@ -0,0 +1,233 @@
+"""
+In-process metrics in the Prometheus text exposition format, served at GET /metrics.
+
+Recording is a lock, a dict lookup and (for histograms) a bisect, so it stays on in
+production. Metrics are per process: with several uvicorn workers each one serves its
+own numbers, so scrape them individually or aggregate in Prometheus.
+Set METRICS_ENABLED=0 to turn recording off entirely.
+"""
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; spans a cached catalog read up to a cold AI call
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{_escape(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}  # label values tuple -> value (or histogram state)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items]
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    @contextmanager
+    def track(self, *labels):
+        """Counts the block as in flight while it runs."""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+    def total(self) -> float:
+        """Sum over all label sets."""
+        with self._lock:
+            return sum(self._values.values())
+
+    render = Counter.render
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self):
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self.header()
+        bounds = self.buckets + (float("inf"),)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []  # refresh gauges from subsystem state right before a scrape
+        self._names = {}
+
+    def _add(self, metric):
+        existing = self._names.get(metric.name)
+        if existing is not None:
+            return existing  # module reloads and repeated setup get the same metric
+        self._names[metric.name] = metric
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()) -> Gauge:
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def export(self, prefix: str, stats: dict, help: str):
+        """Publishes each numeric entry of a subsystem's stats dict as gauge <prefix>_<key>."""
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.gauge(f"{prefix}_{key}", f"{help} ({key}).").set(value)
+
+    def collector(self, fn):
+        """Registers fn() to run at scrape time (usable as a decorator)."""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"⚠️ Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# --- HTTP ---
+http_requests = registry.counter("deepblue_http_requests_total", "HTTP requests by route, method and status.",
+                                 ("route", "method", "status"))
+http_latency = registry.histogram("deepblue_http_request_duration_seconds", "HTTP request latency by route.",
+                                  ("route", "method"))
+http_in_flight = registry.gauge("deepblue_http_requests_in_flight", "HTTP requests currently being served.",
+                                ("route",))
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no per-request Request object or task, unlike BaseHTTPMiddleware).
+    Labels use the route template (/leaderboard/{mission_id}), never the raw path.
+    """
+    MAX_CACHED_PATHS = 4096
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = {}  # (method, path) -> route template
+
+    def _route_for(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        template = self._routes.get(key)
+        if template is None:
+            from starlette.routing import Match
+            template = "unmatched"
+            for route in scope["app"].router.routes:
+                match, _ = route.matches(scope)
+                if match != Match.NONE:
+                    template = getattr(route, "path", template)
+                    break
+            if len(self._routes) >= self.MAX_CACHED_PATHS:
+                self._routes.clear()  # paths with ids in them; cheap to rebuild
+            self._routes[key] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+        route = self._route_for(scope)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        http_in_flight.inc(route)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec(route)
+            http_latency.observe(time.perf_counter() - start, route, scope["method"])
+            http_requests.inc(route, scope["method"], str(status[0]))
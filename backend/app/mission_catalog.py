@@ -0,0 +1,99 @@
+import os
+import ast
+import json
+import threading
+from types import MappingProxyType
+
+MISSIONS_PATH = os.path.join(os.path.dirname(__file__), "data", "missions.json")
+
+def entry_point(starter_code) -> str:
+    """Name of the function a single-file mission's solution defines (its first top-level def)."""
+    if not isinstance(starter_code, str):
+        return None
+    try:
+        tree = ast.parse(starter_code)
+    except SyntaxError:
+        return None
+    return next((node.name for node in tree.body if isinstance(node, ast.FunctionDef)), None)
+
+class CatalogSnapshot:
+    """
+    One immutable, fully indexed view of missions.json.
+    Records are read-only mappings shared by every request; endpoints that need to
+    add per-user fields must copy them (dict(record)) first.
+    """
+    def __init__(self, data):
+        problems, missions = [], []
+        if isinstance(data, dict):
+            for category, items in data.items():
+                if not isinstance(items, list):
+                    continue
+                for m in items:
+                    problems.append(MappingProxyType({
+                        **m,
+                        "topic": category,
+                        "acceptance": f"{min(99, max(10, (m['id'] % 100)))}%"
+                    }))
+                    missions.append(MappingProxyType({**m, "category_tag": category}))
+        elif isinstance(data, list):
+            problems = [MappingProxyType(dict(m)) for m in data]
+            missions = list(problems)
+
+        self.problems = tuple(problems)
+        self.missions = tuple(missions)
+        self.by_id = {m["id"]: m for m in self.missions if "id" in m}
+        self.problems_by_topic = {}
+        for p in self.problems:
+            self.problems_by_topic.setdefault(p.get("topic"), []).append(p)
+        self.topics = tuple(t for t in self.problems_by_topic if t)
+
+        # Pre-serialized response bodies: the hot endpoints just return these bytes
+        free = [m for m in self.missions if m.get("difficulty", "").lower() == "easy"]
+        self.missions_json = {
+            True: json.dumps([dict(m) for m in self.missions]).encode("utf-8"),
+            False: json.dumps([dict(m) for m in free]).encode("utf-8"),
+        }
+        self.problems_locked_json = json.dumps([{**p, "status": "Locked"} for p in self.problems]).encode("utf-8")
+
+class MissionCatalog:
+    """
+    Loads missions.json once and re-parses it only when the file's mtime changes.
+    Reloads build a complete new snapshot and swap it in with a single assignment,
+    so readers never observe a half-built catalog.
+    """
+    def __init__(self, path: str = MISSIONS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._snapshot = CatalogSnapshot({})
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def snapshot(self) -> CatalogSnapshot:
+        mtime = self._current_mtime()
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._reload(mtime)
+        return self._snapshot
+
+    def _reload(self, mtime):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self._snapshot = CatalogSnapshot(data)
+            self._mtime = mtime
+        except Exception as e:
+            # Keep serving the last good snapshot (e.g. file caught mid-write);
+            # the next write bumps the mtime again and triggers another attempt
+            self._mtime = mtime
+            print(f"Error loading mission catalog: {e}")
+
+    def get(self, mission_id: int):
+        return self.snapshot().by_id.get(mission_id)
+
+mission_catalog = MissionCatalog()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, DateTime, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -11,6 +11,8 @@ class User(Base):
     email = Column(String, unique=True, index=True) 
     hashed_password = Column(String)
     is_premium = Column(Boolean, default=False)
+    # Maintained by /save-progress when a mission flips to completed; drives region unlocks
+    completed_missions = Column(Integer, default=0, server_default="0", nullable=False)
     progress = relationship("UserProgress", back_populates="user")
     scores = relationship("Leaderboard", back_populates="user")
     # New Relations
@@ -28,6 +30,11 @@ class UserProgress(Base):
 
 class Leaderboard(Base):
     __tablename__ = "leaderboard"
+    # One personal-best row per user per mission; ranking scans (mission_id, execution_time)
+    __table_args__ = (
+        Index("ux_leaderboard_mission_user", "mission_id", "user_id", unique=True),
+        Index("ix_leaderboard_mission_time", "mission_id", "execution_time"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     mission_id = Column(Integer, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -35,14 +42,34 @@ class Leaderboard(Base):
     execution_time = Column(Float)
     memory_usage = Column(Float)
     timestamp = Column(String)
+    # Empirical growth class of the personal-best solution (app/engine/complexity.py)
+    complexity = Column(String, nullable=True)
+    complexity_confidence = Column(Float, nullable=True)
     user = relationship("User", back_populates="scores")
 
-class OTP(Base):
-    __tablename__ = "otps"
+class MailOutbox(Base):
+    __tablename__ = "mail_outbox"
+    # Persistent queue for app.mailer: rows are deleted once delivered
+    __table_args__ = (Index("ix_mail_outbox_due", "status", "next_attempt_at"),)
     id = Column(Integer, primary_key=True, index=True)
-    email = Column(String, index=True)
-    otp_code = Column(String)
-    expires_at = Column(DateTime)
+    recipient = Column(String, nullable=False)
+    subject = Column(String)
+    body = Column(String)
+    subtype = Column(String, default="html")
+    status = Column(String, default="pending")  # pending | sending (claimed) | failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PendingOTP(Base):
+    __tablename__ = "otp_codes"
+    # Sign-up codes for app.otp_store, in the database so every API worker sees them
+    email = Column(String, primary_key=True)
+    code = Column(String, nullable=True)  # None once burned by too many wrong guesses
+    expires_at = Column(DateTime, index=True)
+    sent_at = Column(DateTime)
+    attempts = Column(Integer, default=0)
 
 # --- NEW: RPG & ECONOMY MODELS ---
 
@@ -51,10 +78,24 @@ class WorldProgress(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True)
     current_region = Column(String, default="Nexus Hub")
-    # Storing unlocked regions as a comma-separated string for simplicity in SQLite
+    # Legacy comma-separated unlock list; no longer read or written (see user_regions)
     unlocked_regions = Column(String, default="Nexus Hub") 
     user = relationship("User", back_populates="world_progress")
 
+class Region(Base):
+    __tablename__ = "regions"
+    # Synced from app.progression.REGION_UNLOCKS at startup
+    name = Column(String, primary_key=True)
+    missions_required = Column(Integer, nullable=False, index=True)
+    position = Column(Integer, default=0)
+
+class UserRegion(Base):
+    __tablename__ = "user_regions"
+    # Composite key: "is this region unlocked for this user" is a single primary-key lookup
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    region_name = Column(String, ForeignKey("regions.name"), primary_key=True)
+    unlocked_at = Column(DateTime, default=datetime.utcnow)
+
 class SoulboundToken(Base):
     __tablename__ = "soulbound_tokens"
     id = Column(Integer, primary_key=True, index=True)
@@ -0,0 +1,102 @@
+import os
+import string
+import secrets
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from app import models
+from app.database import AsyncSessionLocal
+
+OTP_TTL = int(os.getenv("OTP_TTL_SECONDS", 300))
+OTP_RESEND_INTERVAL = int(os.getenv("OTP_RESEND_SECONDS", 60))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", 5))
+OTP_SWEEP_INTERVAL = int(os.getenv("OTP_SWEEP_SECONDS", 60))
+
+class ResendThrottled(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"OTP recently sent. Retry in {int(retry_after) + 1}s.")
+        self.retry_after = retry_after
+
+class OTPStore:
+    """
+    Pending sign-up codes keyed by email, in the otp_codes table with a TTL, so a code
+    sent by one API worker verifies on any other. The resend throttle and the wrong-guess
+    count are conditional UPDATEs, which hold across workers too.
+    Expired rows are dropped lazily on access and by the periodic sweep task.
+    """
+    def __init__(self, session_factory=AsyncSessionLocal, ttl: float = OTP_TTL,
+                 resend_interval: float = OTP_RESEND_INTERVAL, max_attempts: int = OTP_MAX_ATTEMPTS):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.resend_interval = resend_interval
+        self.max_attempts = max_attempts
+
+    async def issue(self, db, email: str, length: int = 6) -> str:
+        """New code for this email; raises ResendThrottled if the last one went out too recently."""
+        now = datetime.utcnow()
+        code = ''.join(secrets.choice(string.digits) for _ in range(length))
+        values = {"code": code, "expires_at": now + timedelta(seconds=self.ttl), "sent_at": now, "attempts": 0}
+        otp = models.PendingOTP
+        result = await db.execute(
+            update(otp).where(otp.email == email, otp.sent_at <= now - timedelta(seconds=self.resend_interval))
+            .values(**values)
+        )
+        if not result.rowcount:
+            db.add(otp(email=email, **values))
+            try:
+                await db.flush()
+            except IntegrityError:
+                # A code exists and was sent too recently (possibly by another worker just now)
+                await db.rollback()
+                sent_at = (await db.execute(select(otp.sent_at).filter_by(email=email))).scalar() or now
+                raise ResendThrottled(self.resend_interval - (now - sent_at).total_seconds())
+        await db.commit()
+        return code
+
+    async def check(self, db, email: str, code: str) -> str:
+        """Returns "ok", "missing", "invalid" or "expired". Too many wrong guesses burn the code."""
+        now = datetime.utcnow()
+        otp = models.PendingOTP
+        entry = (await db.execute(select(otp.code, otp.expires_at).filter_by(email=email))).first()
+        if entry is None:
+            return "missing"
+        if now > entry.expires_at:
+            await db.execute(delete(otp).where(otp.email == email))
+            await db.commit()
+            return "expired"
+        # Bytes: compare_digest rejects non-ASCII str, and a malformed code is just a wrong one
+        if entry.code is None or not secrets.compare_digest(entry.code.encode(), (code or "").encode()):
+            # Counted in the database, so guesses spread over workers still add up.
+            # The burnt entry is kept, so the resend throttle still applies
+            await db.execute(
+                update(otp).where(otp.email == email)
+                .values(attempts=otp.attempts + 1)
+            )
+            await db.execute(
+                update(otp).where(otp.email == email, otp.attempts >= self.max_attempts)
+                .values(code=None)
+            )
+            await db.commit()
+            return "invalid"
+        return "ok"
+
+    async def consume(self, db, email: str):
+        await db.execute(delete(models.PendingOTP).where(models.PendingOTP.email == email))
+        await db.commit()
+
+    async def sweep(self) -> int:
+        async with self.session_factory() as db:
+            result = await db.execute(delete(models.PendingOTP).where(models.PendingOTP.expires_at < datetime.utcnow()))
+            await db.commit()
+        return result.rowcount
+
+    async def run_sweeper(self, interval: float = OTP_SWEEP_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"⚠️ OTP sweep error: {e}")
+
+otp_store = OTPStore()
@@ -0,0 +1,48 @@
+import time
+import threading
+from collections import OrderedDict
+from app import models
+
+class SolvedSetCache:
+    """
+    Per-user set of completed mission ids, loaded with a single query.
+    /save-progress invalidates the entry in this process; the TTL bounds how long
+    another worker can serve a stale set.
+    """
+    def __init__(self, max_users: int = 4096, ttl: float = 30.0):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (loaded_at, frozenset)
+        self._generations = {}  # bumped on invalidate so an in-flight load can't store a stale set
+        self._lock = threading.Lock()
+
+    def get(self, db, user_id: int) -> frozenset:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and now - entry[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+            generation = self._generations.get(user_id, 0)
+
+        rows = db.query(models.UserProgress.mission_id).filter(
+            models.UserProgress.user_id == user_id,
+            models.UserProgress.is_completed == True
+        ).all()
+        solved = frozenset(row[0] for row in rows)
+
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return solved
+            self._entries[user_id] = (now, solved)
+            self._entries.move_to_end(user_id)
+            if len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return solved
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+solved_cache = SolvedSetCache()
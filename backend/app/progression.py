@@ -0,0 +1,97 @@
+from sqlalchemy import text, inspect, select, update
+from app import models
+
+# Declarative unlock rules: a region opens once the user has completed this many missions.
+# Edit this table to add or re-balance regions; startup syncs it into the regions table
+# and backfills unlocks for users who already meet a new threshold.
+REGION_UNLOCKS = (
+    {"name": "Nexus Hub", "missions_required": 0},
+    {"name": "Algorithm Peaks", "missions_required": 1},
+    {"name": "Data Mines", "missions_required": 3},
+    {"name": "Neural Citadel", "missions_required": 5},
+)
+
+# Threshold-0 regions are open to everyone, so they're never stored per user
+STARTING_REGIONS = tuple(r["name"] for r in REGION_UNLOCKS if r["missions_required"] <= 0)
+DEFAULT_REGION = STARTING_REGIONS[0]
+UNLOCKS_AT = {}
+for _region in REGION_UNLOCKS:
+    if _region["missions_required"] > 0:
+        UNLOCKS_AT.setdefault(_region["missions_required"], []).append(_region["name"])
+
+def ensure_progression_schema(engine):
+    """
+    Brings an existing database up to the relational progression model:
+    adds and backfills users.completed_missions, syncs the regions table from
+    REGION_UNLOCKS and inserts any unlocks users already qualify for.
+    """
+    with engine.begin() as conn:
+        columns = {c["name"] for c in inspect(conn).get_columns("users")}
+        if "completed_missions" not in columns:
+            conn.execute(text("ALTER TABLE users ADD COLUMN completed_missions INTEGER NOT NULL DEFAULT 0"))
+            conn.execute(text("""
+                UPDATE users SET completed_missions = (
+                    SELECT COUNT(DISTINCT mission_id) FROM user_progress
+                    WHERE user_progress.user_id = users.id AND user_progress.is_completed = 1
+                )
+            """))
+
+        names = [r["name"] for r in REGION_UNLOCKS]
+        conn.execute(models.UserRegion.__table__.delete().where(models.UserRegion.region_name.not_in(names)))
+        conn.execute(models.Region.__table__.delete().where(models.Region.name.not_in(names)))
+        existing = {row[0] for row in conn.execute(select(models.Region.name))}
+        for position, region in enumerate(REGION_UNLOCKS):
+            values = {"missions_required": region["missions_required"], "position": position}
+            if region["name"] in existing:
+                conn.execute(update(models.Region).where(models.Region.name == region["name"]).values(**values))
+            else:
+                conn.execute(models.Region.__table__.insert().values(name=region["name"], **values))
+
+        conn.execute(text("""
+            INSERT INTO user_regions (user_id, region_name, unlocked_at)
+            SELECT users.id, regions.name, CURRENT_TIMESTAMP FROM users
+            JOIN regions ON regions.missions_required > 0 AND regions.missions_required <= users.completed_missions
+            WHERE NOT EXISTS (
+                SELECT 1 FROM user_regions
+                WHERE user_regions.user_id = users.id AND user_regions.region_name = regions.name
+            )
+        """))
+
+async def record_completion(db, user_id: int):
+    """
+    Bumps the user's completed-mission counter and unlocks the regions whose threshold
+    it just reached. The increment is a single UPDATE ... RETURNING, so every counter
+    value is observed by exactly one transaction and an unlock can't be inserted twice.
+    Caller commits.
+    """
+    count = (await db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(completed_missions=models.User.completed_missions + 1)
+        .returning(models.User.completed_missions)
+    )).scalar()
+    for name in UNLOCKS_AT.get(count, ()):
+        db.add(models.UserRegion(user_id=user_id, region_name=name))
+    return count
+
+def world_state(db, user_id: int) -> dict:
+    """Read-only: the user's current region unlocks and counter, each an indexed lookup by user."""
+    current = db.execute(
+        select(models.WorldProgress.current_region).where(models.WorldProgress.user_id == user_id)
+    ).scalar()
+    unlocked = db.execute(
+        select(models.UserRegion.region_name).where(models.UserRegion.user_id == user_id)
+    ).scalars().all()
+    completed = db.execute(
+        select(models.User.completed_missions).where(models.User.id == user_id)
+    ).scalar()
+    return {
+        "current_region": current or DEFAULT_REGION,
+        "unlocked_regions": [*STARTING_REGIONS, *(r for r in unlocked if r not in STARTING_REGIONS)],
+        "completed_missions": completed or 0,
+    }
+
+def is_unlocked(db, user_id: int, region: str) -> bool:
+    if region in STARTING_REGIONS:
+        return True
+    return db.get(models.UserRegion, (user_id, region)) is not None
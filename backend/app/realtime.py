@@ -0,0 +1,346 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+from collections import deque
+from app.backplane import InProcessBackplane
+from app.matchmaking import WAIT_SAMPLES, wait_summary
+
+# Per-connection outbound buffer. A peer that falls this far behind is a slow consumer.
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE", 64))
+# "drop_oldest": discard the oldest droppable message (see DROPPABLE) to make room;
+#                disconnect only if nothing in the queue is droppable.
+# "disconnect":  close the slow connection straight away.
+SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER", "drop_oldest")
+# A single send_text that takes longer than this means the client is gone or stuck
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", 5.0))
+# Message types that are safe to drop under backpressure: a newer code_update supersedes
+# older ones, and a client that misses a code_delta sees the version gap and asks for a snapshot
+DROPPABLE = frozenset({"code_update", "code_delta"})
+
+class Peer:
+    """
+    One WebSocket plus its bounded send queue and the task that drains it.
+    The writer task is the only thing that ever calls send_text on the socket, so
+    producers never block on a slow client and sends on one socket never interleave.
+    """
+    __slots__ = ("websocket", "maxsize", "queue", "ready", "task", "closed", "dropped", "on_slow")
+
+    def __init__(self, websocket, maxsize: int = SEND_QUEUE_SIZE, on_slow=None):
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.queue = deque()  # (kind, text)
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.dropped = 0
+        self.on_slow = on_slow
+        self.task = asyncio.create_task(self._writer())
+
+    def offer(self, kind: str, text: str) -> bool:
+        if self.closed:
+            return False
+        if len(self.queue) >= self.maxsize and not self._make_room():
+            if self.on_slow:
+                self.on_slow(self)
+            return False
+        self.queue.append((kind, text))
+        self.ready.set()
+        return True
+
+    def _make_room(self) -> bool:
+        if SLOW_CONSUMER_POLICY != "drop_oldest":
+            return False
+        for i, (kind, _) in enumerate(self.queue):
+            if kind in DROPPABLE:
+                del self.queue[i]
+                self.dropped += 1
+                return True
+        return False
+
+    async def _writer(self):
+        try:
+            while not self.closed:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.queue and not self.closed:
+                    _, text = self.queue.popleft()
+                    await asyncio.wait_for(self.websocket.send_text(text), timeout=SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Dead or stuck socket: treat like a slow consumer so the manager cleans it up
+            if not self.closed and self.on_slow:
+                self.on_slow(self)
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        self.task.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+def encode(payload) -> tuple:
+    """(kind, text) for a payload, serialized once no matter how many peers receive it."""
+    if isinstance(payload, tuple):
+        return payload
+    if isinstance(payload, str):
+        try:
+            kind = json.loads(payload).get("type", "")
+        except (ValueError, AttributeError):
+            kind = ""
+        return kind, payload
+    return payload.get("type", payload.get("role", "")), json.dumps(payload)
+
+QUESTIONS = [
+    {"q": "What is the complexity of binary search?", "a": "log"},
+    {"q": "What keyword breaks a loop?", "a": "break"},
+    {"q": "Mutable list or tuple?", "a": "list"},
+    {"q": "True or False: Python is compiled?", "a": "false"}
+]
+
+def _challenge_for(duel_id: str) -> dict:
+    # Derived from the duel id so workers holding either player pick the same question
+    return QUESTIONS[uuid.UUID(duel_id).int % len(QUESTIONS)]
+
+class ConnectionManager:
+    """
+    Rooms, matchmaking and duels for the sockets held by this worker. Anything that
+    may concern sockets on other workers also goes through the backplane (see
+    app/backplane.py); with the default in-process backplane that is a no-op.
+    Message kinds starting with "sync:" are worker-to-worker control traffic: they are
+    handed to channel_hooks and never delivered to clients.
+    """
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.backplane = InProcessBackplane()
+        self.peers: dict = {}  # WebSocket -> Peer
+        self.active_rooms: dict[str, set] = {}
+        self.room_of: dict = {}  # WebSocket -> session_id
+        self.waiting: dict = {}  # WebSocket -> match ticket id
+        self.by_ticket: dict = {}  # match ticket id -> WebSocket
+        self.match_waits = deque(maxlen=WAIT_SAMPLES)  # seconds our players waited for a match
+        self.match_timeouts = 0
+        self.active_duels: dict[str, set] = {}  # duel_id -> local participants
+        self.ws_to_duel: dict = {}
+        # duel_id -> {"seats": [ticket ids], "host": worker id of the first seat}; both workers agree on it
+        self.duel_info: dict[str, dict] = {}
+        self.seat_of: dict = {}  # WebSocket -> its ticket id in the duel
+        self.slow_disconnects = 0
+        self.dropped_closed = 0  # drops counted on peers that have since gone
+        self.room_closed_hooks = []  # called with the session_id when a room's last member leaves
+        self.channel_hooks = []  # called with (channel, kind, text) for messages from other workers
+        self.duel_started_hooks = []  # called with (duel_id, local sockets) once the duel has started
+        self.duel_closed_hooks = []  # called with the duel_id when the duel ends on this worker
+        self._ticket_seq = 0
+
+    async def start(self, backplane=None):
+        if backplane is not None:
+            self.backplane = backplane
+        await self.backplane.start(self._on_remote, self._on_matched, self._on_expired)
+
+    async def stop(self):
+        await self.backplane.stop()
+
+    async def connect(self, websocket, session_id: str = "default"):
+        await websocket.accept()
+        self.peers[websocket] = Peer(websocket, on_slow=self._on_slow)
+        self.join(websocket, session_id)
+
+    def join(self, websocket, session_id: str):
+        previous = self.room_of.get(websocket)
+        if previous == session_id:
+            return
+        if previous is not None:
+            self._leave_room(websocket, previous)
+        if session_id not in self.active_rooms:
+            self.active_rooms[session_id] = set()
+            self.backplane.subscribe("room:" + session_id)
+        self.active_rooms[session_id].add(websocket)
+        self.room_of[websocket] = session_id
+
+    def _leave_room(self, websocket, session_id):
+        members = self.active_rooms.get(session_id)
+        if members is not None:
+            members.discard(websocket)
+            if not members:
+                del self.active_rooms[session_id]
+                self.backplane.unsubscribe("room:" + session_id)
+                for hook in self.room_closed_hooks:
+                    hook(session_id)
+
+    def room_size(self, session_id: str) -> int:
+        """Members connected to this worker."""
+        return len(self.active_rooms.get(session_id, ()))
+
+    def _on_slow(self, peer):
+        if peer.closed:
+            return
+        self.slow_disconnects += 1
+        # 1013 "try again later": the client may reconnect and resync
+        asyncio.create_task(peer.close(code=1013))
+        self.disconnect(peer.websocket)
+
+    def disconnect(self, websocket, session_id: str = None):
+        peer = self.peers.pop(websocket, None)
+        if peer is not None:
+            self.dropped_closed += peer.dropped
+            if not peer.closed:
+                peer.closed = True
+                peer.task.cancel()
+        room = self.room_of.pop(websocket, session_id)
+        if room is not None:
+            self._leave_room(websocket, room)
+        ticket_id = self.waiting.pop(websocket, None)
+        if ticket_id is not None:
+            self.by_ticket.pop(ticket_id, None)
+            self.backplane.cancel_match(ticket_id)
+        duel_id = self.ws_to_duel.get(websocket)
+        if duel_id is not None:
+            self._duel_broadcast(duel_id, {"type": "duel_end", "result": "win", "reason": "opponent_disconnected"}, sender=websocket)
+            self.end_duel(duel_id)
+
+    def send(self, websocket, payload) -> bool:
+        peer = self.peers.get(websocket)
+        if peer is None:
+            return False
+        return peer.offer(*encode(payload))
+
+    def fan_out(self, recipients, payload, sender=None) -> int:
+        """Local delivery only."""
+        kind, text = encode(payload)
+        delivered = 0
+        # Snapshot: a slow-consumer disconnect during the loop mutates the room set
+        for websocket in tuple(recipients):
+            if websocket is sender:
+                continue
+            peer = self.peers.get(websocket)
+            if peer is not None and peer.offer(kind, text):
+                delivered += 1
+        return delivered
+
+    def publish_room(self, session_id: str, payload):
+        """Other workers only."""
+        self.backplane.publish("room:" + session_id, *encode(payload))
+
+    async def broadcast_to_room(self, message, session_id: str, sender=None) -> int:
+        """Queues the message for every other member; returns immediately, whatever the peers' speed."""
+        encoded = encode(message)
+        self.publish_room(session_id, encoded)
+        return self.fan_out(self.active_rooms.get(session_id, ()), encoded, sender)
+
+    def _on_remote(self, channel: str, kind: str, text: str):
+        for hook in self.channel_hooks:
+            hook(channel, kind, text)
+        if kind.startswith("sync:"):
+            return
+        scope, _, key = channel.partition(":")
+        if scope == "room":
+            self.fan_out(self.active_rooms.get(key, ()), (kind, text))
+        elif scope == "duel":
+            self.fan_out(self.active_duels.get(key, ()), (kind, text))
+            if kind == "duel_end":
+                self.end_duel(key)
+
+    # --- Matchmaking & duels ---
+
+    async def handle_matchmaking(self, websocket, rating: int = None, user_id: int = None):
+        """Queues the player; pairing is by rating (see app/matchmaking.py)."""
+        if websocket in self.waiting or websocket in self.ws_to_duel:
+            return
+        self._ticket_seq += 1
+        ticket = {"id": f"{self.worker_id}:{self._ticket_seq}", "worker": self.worker_id,
+                  "user": user_id, "rating": rating, "queued_at": time.time()}
+        self.waiting[websocket] = ticket["id"]
+        self.by_ticket[ticket["id"]] = websocket
+        self.backplane.match(ticket)
+
+    def _claim_tickets(self, tickets: list) -> dict:
+        """ticket id -> local socket for the given tickets, taken out of the waiting maps."""
+        claimed = {}
+        for ticket in tickets:
+            websocket = self.by_ticket.pop(ticket["id"], None)
+            if websocket is not None:
+                self.waiting.pop(websocket, None)
+                claimed[ticket["id"]] = websocket
+        return claimed
+
+    def _on_expired(self, tickets: list):
+        for websocket in self._claim_tickets(tickets).values():
+            self.match_timeouts += 1
+            self.send(websocket, {"type": "match_timeout", "msg": "No opponent found. Try again."})
+
+    def _on_matched(self, duel_id: str, tickets: list):
+        now = time.time()
+        for ticket in tickets:
+            if ticket["id"] in self.by_ticket:
+                self.match_waits.append(now - ticket["queued_at"])
+        claimed = self._claim_tickets(tickets)
+        if not claimed:
+            return
+        local = list(claimed.values())
+        self.active_duels[duel_id] = set(local)
+        self.duel_info[duel_id] = {"seats": [t["id"] for t in tickets], "host": tickets[0]["worker"]}
+        for seat, websocket in claimed.items():
+            self.ws_to_duel[websocket] = duel_id
+            self.seat_of[websocket] = seat
+        self.backplane.subscribe("duel:" + duel_id)
+
+        # 1. Start Duel
+        self.fan_out(local, {"type": "duel_start", "duel_id": duel_id})
+
+        # 2. SOCRATIC BATTLE INITIATION: Lock Editors & Send Challenge
+        challenge = _challenge_for(duel_id)
+        self.fan_out(local, {
+            "type": "duel_challenge",
+            "question": challenge['q'],
+            "expected": challenge['a']
+        })
+        for hook in self.duel_started_hooks:
+            hook(duel_id, local)
+
+    def _duel_broadcast(self, duel_id: str, payload, sender=None):
+        encoded = encode(payload)
+        self.backplane.publish("duel:" + duel_id, *encoded)
+        self.fan_out(self.active_duels.get(duel_id, ()), encoded, sender=sender)
+
+    def end_duel(self, duel_id: str):
+        if self.duel_info.pop(duel_id, None) is None:
+            return
+        for websocket in self.active_duels.pop(duel_id, ()):
+            self.ws_to_duel.pop(websocket, None)
+            self.seat_of.pop(websocket, None)
+        self.backplane.unsubscribe("duel:" + duel_id)
+        for hook in self.duel_closed_hooks:
+            hook(duel_id)
+
+    async def broadcast_duel_update(self, websocket, payload: dict):
+        duel_id = self.ws_to_duel.get(websocket)
+        if duel_id:
+            self._duel_broadcast(duel_id, payload, sender=websocket)
+            if payload.get("type") == "duel_end":
+                self.end_duel(duel_id)
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.peers),
+            "rooms": len(self.active_rooms),
+            "duels": len(self.active_duels),
+            "waiting": len(self.waiting),
+            "queued": sum(len(p.queue) for p in self.peers.values()),
+            "dropped": self.dropped_closed + sum(p.dropped for p in self.peers.values()),
+            "slow_disconnects": self.slow_disconnects,
+        }
+
+    def matchmaking_stats(self) -> dict:
+        return {
+            "waiting_here": len(self.waiting),
+            "timeouts_here": self.match_timeouts,
+            "match_wait_here": wait_summary(self.match_waits),
+            "queue": self.backplane.queue_stats(),
+        }
+
+manager = ConnectionManager()
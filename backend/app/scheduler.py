@@ -0,0 +1,205 @@
+"""
+Fair scheduler for the CPU-heavy engines (tracer, AST/radon analysis, sandbox runs).
+
+Every job is queued under its owner (the session token's user, else the client address).
+CPU_WORKERS jobs run at once, on the threadpool, and the next one is picked by
+weighted fair queuing. On arrival a job is tagged
+  start  = max(virtual time, finish tag of its owner's previous job)
+  finish = start + cost / weight
+and the owners' next jobs run in finish-tag order; the virtual time is the start tag
+of the latest job dispatched. An owner with many queued jobs therefore gets its share
+of the workers, not all of them, and premium owners (weight CPU_PREMIUM_WEIGHT) get
+proportionally more.
+
+Quotas, per owner:
+  rate         a token bucket of CPU_USER_RATE cost units per second, CPU_USER_BURST deep
+  concurrency  at most CPU_USER_CONCURRENCY of its jobs running; the rest wait in its queue
+  queue        at most CPU_USER_QUEUE jobs waiting; more are refused
+Refusals raise QuotaExceeded (HTTP 429 in main.py) with a retry delay.
+
+Some kinds are also capped globally (KIND_CONCURRENCY): growth estimates time the code
+themselves, so only COMPLEXITY_CONCURRENCY of them run at once. A capped job waits in its
+queue without holding a worker, and its owner's later jobs of other kinds are dispatched
+past it.
+
+Runs on the event loop: submit() and the dispatch bookkeeping need no locks.
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from app.engine.resilience import TokenBucket
+from app.matchmaking import wait_summary, WAIT_SAMPLES
+from app.metrics import registry
+
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", os.cpu_count() or 1))
+CPU_PREMIUM_WEIGHT = float(os.getenv("CPU_PREMIUM_WEIGHT", 3.0))
+CPU_USER_RATE = float(os.getenv("CPU_USER_RATE", 4.0))
+CPU_USER_BURST = float(os.getenv("CPU_USER_BURST", 20.0))
+CPU_USER_CONCURRENCY = int(os.getenv("CPU_USER_CONCURRENCY", 2))
+CPU_USER_QUEUE = int(os.getenv("CPU_USER_QUEUE", 8))
+# Idle owners are forgotten (bucket refilled) once more than this many are tracked
+CPU_MAX_OWNERS = int(os.getenv("CPU_MAX_OWNERS", 10_000))
+
+# Relative cost of one job by engine: its share of the rate quota and of the fair queue
+JOB_COSTS = {"analysis": 1.0, "tracer": 3.0, "sandbox": 4.0, "complexity": 4.0}
+# At most this many jobs of a kind run at once, across all owners
+KIND_CONCURRENCY = {"complexity": int(os.getenv("COMPLEXITY_CONCURRENCY", 1))}
+
+queue_wait = registry.histogram("deepblue_cpu_queue_wait_seconds", "Time a CPU-heavy job waited for a worker.",
+                                ("kind", "tier"), buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+jobs_refused = registry.counter("deepblue_cpu_jobs_refused_total", "CPU-heavy jobs refused by a per-user quota.",
+                                ("kind", "quota"))
+
+class QuotaExceeded(Exception):
+    def __init__(self, quota: str, retry_after: float):
+        super().__init__(f"Too many {'requests' if quota == 'rate' else 'queued jobs'}. Retry in {int(retry_after) + 1}s.")
+        self.quota = quota
+        self.retry_after = retry_after
+
+class _Owner:
+    __slots__ = ("key", "weight", "bucket", "queue", "running", "last_finish")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.weight = 1.0
+        self.bucket = TokenBucket(CPU_USER_RATE, CPU_USER_BURST)
+        self.queue = deque()
+        self.running = 0
+        self.last_finish = 0.0
+
+class _Job:
+    __slots__ = ("owner", "kind", "tier", "fn", "args", "future", "start", "finish", "queued_at")
+
+    def __init__(self, owner, kind, tier, fn, args, future, start, finish):
+        self.owner = owner
+        self.kind = kind
+        self.tier = tier
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.start = start
+        self.finish = finish
+        self.queued_at = time.monotonic()
+
+class FairScheduler:
+    def __init__(self, workers: int = CPU_WORKERS):
+        self.workers = max(1, workers)
+        self.owners = {}
+        self.running = 0
+        self.running_by_kind = {kind: 0 for kind in JOB_COSTS}
+        self.virtual_time = 0.0
+        self._tasks = set()  # running jobs' tasks, referenced until they finish
+        self.waits = {kind: deque(maxlen=WAIT_SAMPLES) for kind in JOB_COSTS}
+        self.counters = {"submitted": 0, "completed": 0, "refused_rate": 0, "refused_queue": 0, "cancelled": 0}
+
+    async def run(self, owner_key: str, kind: str, fn, *args, premium: bool = False):
+        """Runs fn(*args) on the threadpool when the owner's turn comes; returns its result."""
+        # If the caller is cancelled (client went away) so is the future: a queued job is
+        # then skipped, a running one finishes unobserved
+        return await self.submit(owner_key, kind, fn, *args, premium=premium).future
+
+    def submit(self, owner_key: str, kind: str, fn, *args, premium: bool = False) -> _Job:
+        owner = self.owners.get(owner_key)
+        if owner is None:
+            self._forget_idle()
+            owner = self.owners[owner_key] = _Owner(owner_key)
+        owner.weight = CPU_PREMIUM_WEIGHT if premium else 1.0
+        cost = JOB_COSTS[kind]
+        if len(owner.queue) >= CPU_USER_QUEUE:
+            self._refuse(kind, "queue")
+            raise QuotaExceeded("queue", 1.0)
+        if not owner.bucket.try_acquire(cost):
+            self._refuse(kind, "rate")
+            raise QuotaExceeded("rate", (cost - owner.bucket.tokens) / owner.bucket.rate)
+
+        start = max(self.virtual_time, owner.last_finish)
+        owner.last_finish = start + cost / owner.weight
+        job = _Job(owner, kind, "premium" if premium else "standard", fn, args,
+                   asyncio.get_running_loop().create_future(), start, owner.last_finish)
+        owner.queue.append(job)
+        self.counters["submitted"] += 1
+        self._dispatch()
+        return job
+
+    def _refuse(self, kind: str, quota: str):
+        self.counters[f"refused_{quota}"] += 1
+        jobs_refused.inc(kind, quota)
+
+    def _forget_idle(self):
+        if len(self.owners) < CPU_MAX_OWNERS:
+            return
+        for key in [k for k, o in self.owners.items() if not o.queue and not o.running]:
+            del self.owners[key]
+
+    def _first_dispatchable(self, owner: _Owner):
+        """The owner's earliest queued job whose kind is under its cap (queues hold at most CPU_USER_QUEUE)."""
+        for job in owner.queue:
+            if self.running_by_kind[job.kind] < KIND_CONCURRENCY.get(job.kind, self.workers):
+                return job
+        return None
+
+    def _next(self):
+        """The eligible owner and job with the smallest finish tag (ties: arrival order)."""
+        best, best_rank = None, None
+        for owner in self.owners.values():
+            if any(job.future.cancelled() for job in owner.queue):
+                live = deque(job for job in owner.queue if not job.future.cancelled())
+                self.counters["cancelled"] += len(owner.queue) - len(live)
+                owner.queue = live
+            if not owner.queue or owner.running >= CPU_USER_CONCURRENCY:
+                continue
+            job = self._first_dispatchable(owner)
+            if job is None:
+                continue
+            rank = (job.finish, job.queued_at)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = job, rank
+        return best
+
+    def _dispatch(self):
+        while self.running < self.workers:
+            job = self._next()
+            if job is None:
+                break
+            owner = job.owner
+            owner.queue.remove(job)
+            self.virtual_time = max(self.virtual_time, job.start)
+            owner.running += 1
+            self.running += 1
+            self.running_by_kind[job.kind] += 1
+            wait = time.monotonic() - job.queued_at
+            self.waits[job.kind].append(wait)
+            queue_wait.observe(wait, job.kind, job.tier)
+            task = asyncio.get_running_loop().create_task(self._execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: _Job):
+        try:
+            result = await asyncio.to_thread(job.fn, *job.args)
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            job.owner.running -= 1
+            self.running -= 1
+            self.running_by_kind[job.kind] -= 1
+            self.counters["completed"] += 1
+            self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "running_by_kind": dict(self.running_by_kind),
+            "queued": sum(len(o.queue) for o in self.owners.values()),
+            "owners": len(self.owners),
+            "busiest_queue": max((len(o.queue) for o in self.owners.values()), default=0),
+            "queue_wait": {kind: wait_summary(waits) for kind, waits in self.waits.items()},
+            **self.counters,
+        }
+
+cpu_scheduler = FairScheduler()
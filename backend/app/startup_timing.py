@@ -0,0 +1,29 @@
+import os
+import time
+import contextlib
+import threading
+
+# Set DEEPBLUE_STARTUP_TIMING=1 to print each phase as it finishes and to include
+# the report in /ready. For a per-module breakdown use `python -X importtime`.
+STARTUP_TIMING_ENABLED = os.getenv("DEEPBLUE_STARTUP_TIMING", "0") == "1"
+
+_phases = []
+_lock = threading.Lock()
+
+@contextlib.contextmanager
+def timed_phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with _lock:
+            _phases.append((name, elapsed_ms))
+        if STARTUP_TIMING_ENABLED:
+            print(f"⏱️ {name}: {elapsed_ms:.1f} ms")
+
+def startup_report():
+    with _lock:
+        phases = list(_phases)
+    # Phases can nest (init includes its imports), so no grand total is reported
+    return {"phases_ms": {name: round(ms, 1) for name, ms in phases}}
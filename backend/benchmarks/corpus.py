@@ -0,0 +1,98 @@
+"""
+Fixed corpus of student-style programs for the engine benchmarks.
+
+Every mission's starter code from app/data/missions.json, plus generated programs
+that stress one dimension each (size, nesting depth, loop iterations). Generation
+is deterministic, so two runs of the suite always measure the same inputs.
+"""
+import os
+import json
+
+MISSIONS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "data", "missions.json")
+
+def mission_programs():
+    with open(MISSIONS_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    missions = [m for items in data.values() if isinstance(items, list) for m in items] if isinstance(data, dict) else data
+    programs = []
+    for m in sorted(missions, key=lambda m: m.get("id", 0)):
+        starter = m.get("starter_code")
+        if isinstance(starter, dict):
+            # Multi-file missions: benchmark the entry file
+            starter = starter.get((m.get("meta") or {}).get("main_file", "main.py")) or next(iter(starter.values()), "")
+        if isinstance(starter, str) and starter.strip():
+            programs.append((f"mission_{m['id']}", starter))
+    return programs
+
+def large_program(functions: int = 120) -> str:
+    """Many small functions and a driver calling each: wide AST, many graph nodes."""
+    parts = []
+    for i in range(functions):
+        parts.append(
+            f"def step_{i}(values):\n"
+            f"    total = 0\n"
+            f"    for v in values:\n"
+            f"        if v % {i % 7 + 2} == 0:\n"
+            f"            total += v * {i}\n"
+            f"        else:\n"
+            f"            total -= 1\n"
+            f"    return total\n"
+        )
+    parts.append("data = list(range(20))\nresults = []\n")
+    parts.extend(f"results.append(step_{i}(data))\n" for i in range(functions))
+    return "\n".join(parts)
+
+def deep_program(depth: int = 25) -> str:
+    """Deeply nested branches and loops inside one function, plus a recursive helper."""
+    lines = ["def descend(n, acc):"]
+    for level in range(depth):
+        indent = "    " * (level + 1)
+        lines.append(indent + (f"if n > {level}:" if level % 2 == 0 else "for _ in range(1):"))
+        lines.append(indent + f"    acc = acc + {level}")
+    lines.append("    " * (depth + 1) + "return acc")
+    lines.append("    return acc")
+    lines.append("")
+    lines.append("def depth_first(n):")
+    lines.append("    if n == 0:")
+    lines.append("        return 0")
+    lines.append("    return 1 + depth_first(n - 1)")
+    lines.append("")
+    lines.append(f"value = descend({depth + 1}, 0)")
+    lines.append("levels = depth_first(60)")
+    return "\n".join(lines) + "\n"
+
+def loop_heavy_program(outer: int = 12, inner: int = 10) -> str:
+    """
+    Nested loops with list/dict mutation: many traced line events and heap snapshots.
+    Kept small: the tracer snapshots the whole heap on every line, so its cost grows
+    with (cells x steps) and 40x25 already takes tens of seconds.
+    """
+    return (
+        "grid = []\n"
+        f"for i in range({outer}):\n"
+        "    row = []\n"
+        f"    for j in range({inner}):\n"
+        "        row.append(i * j)\n"
+        "    grid.append(row)\n"
+        "counts = {}\n"
+        "for row in grid:\n"
+        "    for cell in row:\n"
+        "        key = cell % 10\n"
+        "        counts[key] = counts.get(key, 0) + 1\n"
+        "total = 0\n"
+        "k = 0\n"
+        f"while k < {outer * inner}:\n"
+        "    total += k\n"
+        "    k += 1\n"
+    )
+
+def synthetic_programs():
+    return [
+        ("synthetic_large", large_program()),
+        ("synthetic_deep", deep_program()),
+        ("synthetic_loop_heavy", loop_heavy_program()),
+    ]
+
+def build_corpus():
+    """[(name, source)] in a stable order."""
+    return mission_programs() + synthetic_programs()
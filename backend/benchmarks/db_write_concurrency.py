@@ -0,0 +1,152 @@
+"""
+Write-concurrency load test for the progress upsert used by /save-progress,
+mixed with the /get-progress read.
+
+Compares the old setup (sync session per request on the FastAPI threadpool,
+default rollback journal) with the new one (async session, WAL + busy_timeout).
+Each run uses a fresh temporary database. Besides write throughput it reports:
+  - read latency while writers are active (rollback journal blocks readers, WAL doesn't)
+  - threadpool wait: how long an unrelated sync route waits for a worker thread
+    while the writes are in flight (the starvation the async path removes)
+
+    cd backend
+    python benchmarks/db_write_concurrency.py --writes 2000
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app.database import Base, _apply_sqlite_pragmas
+from app import models
+
+# Starlette's default threadpool size (anyio's default token count)
+THREADPOOL_SIZE = 40
+
+def _ms(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] * 1000
+
+def _report(label, results, elapsed):
+    writes, reads, probes, errors = results["write"], results["read"], results["probe"], results["errors"]
+    print(f"{label}")
+    print(f"  writes      {len(writes) / elapsed:8.0f}/s   p50 {_ms(writes, 0.5):7.1f} ms   p95 {_ms(writes, 0.95):7.1f} ms   errors {errors}")
+    print(f"  reads                   p50 {_ms(reads, 0.5):7.1f} ms   p95 {_ms(reads, 0.95):7.1f} ms")
+    print(f"  threadpool wait         p50 {_ms(probes, 0.5):7.1f} ms   p95 {_ms(probes, 0.95):7.1f} ms")
+
+def _ops(writes):
+    # One read per write, interleaved
+    return [("write" if i % 2 == 0 else "read", i // 2) for i in range(writes * 2)]
+
+def _new_results():
+    return {"write": [], "read": [], "probe": [], "errors": 0}
+
+def _probe_threadpool(pool, results, stop):
+    """Submits a no-op every 10 ms and records how long it waited for a worker."""
+    while not stop["done"]:
+        submitted = time.perf_counter()
+        results["probe"].append(pool.submit(lambda: time.perf_counter() - submitted).result())
+        time.sleep(0.01)
+
+def run_legacy(path, writes):
+    # Mirrors the pre-change database.py: default journaling, sync sessions on the threadpool
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    results = _new_results()
+
+    def op(kind, i):
+        start = time.perf_counter()
+        db = Session()
+        try:
+            user_id, mission_id = i % 200, i % 70
+            existing = db.query(models.UserProgress).filter_by(user_id=user_id, mission_id=mission_id).first()
+            if kind == "write":
+                if existing:
+                    existing.code_solution = f"# attempt {i}"
+                else:
+                    db.add(models.UserProgress(user_id=user_id, mission_id=mission_id, code_solution=f"# attempt {i}"))
+                db.commit()
+            results[kind].append(time.perf_counter() - start)
+        except Exception:
+            results["errors"] += 1
+        finally:
+            db.close()
+
+    stop = {"done": False}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADPOOL_SIZE) as pool:
+        prober = ThreadPoolExecutor(max_workers=1).submit(_probe_threadpool, pool, results, stop)
+        futures = [pool.submit(op, kind, i) for kind, i in _ops(writes)]
+        for f in futures:
+            f.result()
+        elapsed = time.perf_counter() - start
+        stop["done"] = True
+        prober.result()
+    engine.dispose()
+    _report("sync sessions + rollback journal", results, elapsed)
+
+async def run_async(path, writes):
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", pool_size=10, max_overflow=20)
+    event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    Session = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+    # Cap in-flight requests like the legacy threadpool does, so only the DB path differs
+    semaphore = asyncio.Semaphore(THREADPOOL_SIZE)
+    results = _new_results()
+
+    async def op(kind, i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                async with Session() as db:
+                    user_id, mission_id = i % 200, i % 70
+                    existing = (await db.execute(
+                        select(models.UserProgress).filter_by(user_id=user_id, mission_id=mission_id)
+                    )).scalars().first()
+                    if kind == "write":
+                        if existing:
+                            existing.code_solution = f"# attempt {i}"
+                        else:
+                            db.add(models.UserProgress(user_id=user_id, mission_id=mission_id, code_solution=f"# attempt {i}"))
+                        await db.commit()
+                results[kind].append(time.perf_counter() - start)
+            except Exception:
+                results["errors"] += 1
+
+    stop = {"done": False}
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=THREADPOOL_SIZE) as pool:
+        prober = loop.run_in_executor(None, _probe_threadpool, pool, results, stop)
+        start = time.perf_counter()
+        await asyncio.gather(*(op(kind, i) for kind, i in _ops(writes)))
+        elapsed = time.perf_counter() - start
+        stop["done"] = True
+        await prober
+    await engine.dispose()
+    _report("async sessions + WAL", results, elapsed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writes", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run_legacy(os.path.join(tmp, "legacy.db"), args.writes)
+        asyncio.run(run_async(os.path.join(tmp, "wal.db"), args.writes))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Micro-benchmarks for the engine hot paths, over the fixed corpus in benchmarks/corpus.py:
+
+  parse_code_to_3d          AST -> 3D graph
+  analyze                   the shared pipeline behind /analyze, /analyze-quality, /analyze-all (cold cache)
+  MemoryTracer.run          line tracer with heap snapshots (/visualize)
+  SocraticAI._get_mock_response   offline tutor: static rules + canned answer (cache cleared per run)
+  execute_code_safely       sandbox process round trip (subset of the corpus; it's ~10 ms per call)
+  /problems                 the handler itself, anonymous and per-user filtered/paged, on a seeded temp DB
+
+Time is the median of --repeats runs per case; an engine's time is the sum of its case
+medians. Peak memory is measured in a separate tracemalloc pass (Python allocations in
+this process; for the sandbox that's the parent side only). Runs offline: no API key,
+no network, and a throwaway database.
+
+    cd backend
+    python benchmarks/engine_hot_paths.py                      # run, save, compare to the baseline
+    python benchmarks/engine_hot_paths.py --update-baseline    # accept the current numbers
+    python benchmarks/engine_hot_paths.py --only tracer --repeats 9
+
+Exits with status 1 when an engine is slower than the baseline by more than --threshold.
+The committed benchmarks/engine_hot_paths.baseline.json is a reference run (its meta says
+where it was recorded). Baselines are machine-specific: to gate changes, record one with
+--update-baseline on the machine you compare on, or pass --baseline.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from datetime import datetime
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# Offline and isolated, before any app module reads its settings
+os.environ["GOOGLE_API_KEY"] = ""
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="deepblue-bench-"), "bench.db")
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+from benchmarks.corpus import build_corpus
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(HERE, "results", "engine_hot_paths.json")
+# The reference baseline is committed next to this script; results/ holds local runs only
+DEFAULT_BASELINE = os.path.join(HERE, "engine_hot_paths.baseline.json")
+SANDBOX_CASES = 8  # execute_code_safely forks a process per call; a sample is enough
+MOCK_QUERIES = ("why is this wrong?", "how do I loop?", "what is this variable?", "")
+
+def _measure(fn, repeats: int):
+    """(median seconds, peak bytes) for one case."""
+    fn()  # warm-up: imports, first-call caches
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(times), peak
+
+# --- Engines: each returns [(case name, zero-arg callable)] ---
+
+def ast_cases(corpus):
+    from app.engine.ast_parser import parse_code_to_3d
+    return [(name, lambda src=src: parse_code_to_3d(src)) for name, src in corpus]
+
+def tracer_cases(corpus):
+    from app.engine.memory_tracer import MemoryTracer
+    return [(name, lambda src=src: MemoryTracer().run(src)) for name, src in corpus]
+
+def analysis_cases(corpus):
+    from app.engine import analysis
+
+    def run(src):
+        analysis._cache.clear()  # cold: one parse plus every registered pass
+        analysis.analyze(src)
+    return [(name, lambda src=src: run(src)) for name, src in corpus]
+
+def mock_tutor_cases(corpus):
+    from app.engine import analysis
+    from app.engine.rag_agent import SocraticAI
+    # _get_mock_response only uses the static analysis engine, so skip building the
+    # LangChain stack in __init__ (that's startup cost, not the hot path)
+    tutor = SocraticAI.__new__(SocraticAI)
+
+    def run(src):
+        for query in MOCK_QUERIES:
+            analysis._cache.clear()  # measure the analysis, not a cache hit
+            tutor._get_mock_response(src, query)
+    return [(name, lambda src=src: run(src)) for name, src in corpus]
+
+def sandbox_cases(corpus):
+    from app.engine.executor import execute_code_safely
+    sample = corpus[:SANDBOX_CASES - 1] + [c for c in corpus if c[0] == "synthetic_loop_heavy"]
+    return [(name, lambda src=src: execute_code_safely(src, timeout=5.0)) for name, src in sample]
+
+def _seed_progress():
+    from app.database import SessionLocal
+    from app import models
+    from app.mission_catalog import mission_catalog
+    ids = [m["id"] for m in mission_catalog.snapshot().missions]
+    with SessionLocal() as db:
+        for user_id in range(1, 51):
+            db.add(models.User(id=user_id, username=f"bench{user_id}", email=f"bench{user_id}@example.com"))
+            for mission_id in ids[user_id % 7::5]:
+                db.add(models.UserProgress(user_id=user_id, mission_id=mission_id, is_completed=True))
+        db.commit()
+
+def problems_cases(corpus):
+    import main  # creates the schema in the temp database
+    from app.database import SessionLocal
+    _seed_progress()
+
+    def call(**params):
+        with SessionLocal() as db:
+            query = {"user_id": None, "topic": None, "difficulty": None, "status": None,
+                     "search": None, "page": None, "page_size": 20, **params}
+            return main.get_problems(db=db, **query)
+
+    topic = main.mission_catalog.snapshot().topics[0]
+    return [
+        ("anonymous", lambda: call()),
+        ("user_all", lambda: call(user_id=7)),
+        ("user_topic_difficulty", lambda: call(user_id=7, topic=topic, difficulty="easy")),
+        ("user_search_paged", lambda: call(user_id=7, search="a", page=2)),
+        ("user_solved_filter", lambda: call(user_id=7, status="Solved")),
+    ]
+
+ENGINES = {
+    "ast_parser": ast_cases,
+    "analysis": analysis_cases,
+    "tracer": tracer_cases,
+    "mock_tutor": mock_tutor_cases,
+    "sandbox": sandbox_cases,
+    "problems": problems_cases,
+}
+
+def run_suite(engines, repeats):
+    corpus = build_corpus()
+    results = {}
+    for engine in engines:
+        cases = {}
+        for name, fn in ENGINES[engine](corpus):
+            median, peak = _measure(fn, repeats)
+            cases[name] = {"median_ms": round(median * 1000, 4), "peak_kib": round(peak / 1024, 1)}
+        results[engine] = {
+            "total_ms": round(sum(c["median_ms"] for c in cases.values()), 3),
+            "max_peak_kib": max(c["peak_kib"] for c in cases.values()),
+            "cases": cases,
+        }
+        print(f"{engine:12s} {results[engine]['total_ms']:10.2f} ms   peak {results[engine]['max_peak_kib']:9.1f} KiB   ({len(cases)} cases)")
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": repeats,
+            "corpus_size": len(corpus),
+        },
+        "engines": results,
+    }
+
+def compare(current, baseline, threshold):
+    """Prints the per-engine change; returns the engines that regressed past the threshold."""
+    regressed = []
+    print(f"\nvs baseline from {baseline['meta']['timestamp']} (threshold +{threshold:.0%}):")
+    for engine, result in current["engines"].items():
+        before = baseline["engines"].get(engine)
+        if before is None or not before["total_ms"]:
+            print(f"  {engine:12s} no baseline")
+            continue
+        change = result["total_ms"] / before["total_ms"] - 1
+        mem_change = result["max_peak_kib"] / before["max_peak_kib"] - 1 if before["max_peak_kib"] else 0.0
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"  {engine:12s} time {change:+7.1%}   peak mem {mem_change:+7.1%}   {flag}")
+        if flag:
+            regressed.append(engine)
+            worst = sorted(result["cases"].items(),
+                           key=lambda kv: kv[1]["median_ms"] - before["cases"].get(kv[0], kv[1])["median_ms"],
+                           reverse=True)[:3]
+            for name, case in worst:
+                old = before["cases"].get(name)
+                if old:
+                    print(f"      {name}: {old['median_ms']:.3f} -> {case['median_ms']:.3f} ms")
+    return regressed
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Engine hot-path micro-benchmarks.")
+    parser.add_argument("--only", nargs="+", choices=sorted(ENGINES), help="run only these engines")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown, as a fraction")
+    parser.add_argument("--update-baseline", action="store_true", help="save this run as the new baseline")
+    args = parser.parse_args()
+
+    current = run_suite(args.only or list(ENGINES), args.repeats)
+    _write(args.output, current)
+    print(f"\nresults saved to {args.output}")
+
+    if args.update_baseline:
+        _write(args.baseline, current)
+        print(f"baseline updated: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("no baseline yet; record one with --update-baseline")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    return 1 if compare(current, baseline, args.threshold) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""
+Classroom load test: hundreds of simulated students against the real app over
+WebSocket (/ws/chat) and HTTP, with a configurable mix of behaviours:
+
+  code_sync   full-document edit in a two-student pair room; latency is edit -> partner receives it
+              (includes CodeSyncHub's debounce window)
+  chat        tutor question over the socket; latency is send -> AI reply
+  find_match  join the duel queue; latency is send -> duel_start (then the student reconnects)
+  visualize   POST /visualize with a mission's starter code
+
+By default it starts its own uvicorn on a throwaway database with LLM_BACKEND=fake,
+so chat runs the real SocraticAI pipeline (breaker, rate limiter, RAG lookup) against
+the deterministic stand-ins in app/engine/fake_llm.py instead of Gemini. The --llm-*
+and --embed-* flags set their latency and 429 rate. Other server settings (GEMINI_RPM,
+WS_BACKPLANE, MATCH_TIMEOUT, ...) are passed through from your environment, and
+GEMINI_RPM caps chat throughput exactly as it does in production.
+
+    cd backend
+    python benchmarks/load_test.py --students 200 --duration 60
+    python benchmarks/load_test.py --mix code_sync=1 --students 400 --think 0.2
+    python benchmarks/load_test.py --llm-error-rate 0.05 --workers 2
+    python benchmarks/load_test.py --url http://localhost:8000    # an already running server
+
+Reports, per message type: throughput, latency percentiles, and error rate with the
+reasons. For chat, "fallback" counts answers that came from the offline tutor because
+the breaker or the rate limiter refused the call (only meaningful with the fake backend).
+Needs the websockets and httpx packages.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter, defaultdict
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import httpx
+from websockets.asyncio.client import connect
+from benchmarks.corpus import mission_programs
+
+FAKE_MARKER = "[fake-llm]"  # app/engine/fake_llm.py tags every fake answer with it
+EDIT_PATTERN = re.compile(r"# edit (\d+):(\d+)")
+KEPT_EDIT_LINES = 20  # each student's document keeps its last N edit lines, so it stays small
+CHAT_QUESTIONS = ("why is this wrong?", "how do I loop over this?", "give me a hint", "what is this variable for?")
+DEFAULT_MIX = "code_sync=6,chat=1,find_match=1,visualize=2"
+
+def _ms(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] * 1000
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise SystemExit(f"unknown behaviour {name!r}; choose from {', '.join(ACTIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+class Recorder:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(Counter)  # type -> reason -> count
+        self.fallback = 0
+        self.recording = False  # off during ramp-up
+
+    def ok(self, kind: str, seconds: float):
+        if self.recording:
+            self.latency[kind].append(seconds)
+
+    def error(self, kind: str, reason: str):
+        if self.recording:
+            self.errors[kind][reason] += 1
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.base_url = args.url.rstrip("/")
+        self.ws_url = re.sub(r"^http", "ws", self.base_url) + "/ws/chat"
+        self.mix = parse_mix(args.mix)
+        self.programs = [src for _, src in mission_programs()]
+        self.recorder = Recorder()
+        self.edits = {}  # (student, seq) -> sent_at, until the partner sees the edit
+        self.stop = False
+
+    # --- Shared edit tracking (code_sync latency is measured at the receiving partner) ---
+    def _seen(self, text: str):
+        now = time.perf_counter()
+        for student, seq in EDIT_PATTERN.findall(text or ""):
+            sent_at = self.edits.pop((int(student), int(seq)), None)
+            if sent_at is not None:
+                self.recorder.ok("code_sync", now - sent_at)
+
+    def _expire_edits(self):
+        cutoff = time.perf_counter() - self.args.timeout
+        for key, sent_at in list(self.edits.items()):
+            if sent_at < cutoff:
+                del self.edits[key]
+                self.recorder.error("code_sync", "not_delivered")
+
+    async def run(self):
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.args.timeout,
+                                     limits=httpx.Limits(max_connections=self.args.students)) as http:
+            self.http = http
+            students = [asyncio.create_task(Student(self, i).run()) for i in range(self.args.students)]
+            await asyncio.sleep(self.args.ramp)
+            self.recorder.recording = True
+            started = time.perf_counter()
+            while time.perf_counter() - started < self.args.duration:
+                await asyncio.sleep(min(1.0, self.args.duration))
+                self._expire_edits()
+            elapsed = time.perf_counter() - started
+            self.recorder.recording = False
+            self.stop = True
+            for task in students:
+                task.cancel()
+            await asyncio.gather(*students, return_exceptions=True)
+        return elapsed
+
+class Student:
+    """One simulated student: a socket in a pair room, picking behaviours by weight."""
+    def __init__(self, test: LoadTest, index: int):
+        self.test = test
+        self.index = index
+        self.rng = random.Random(test.args.seed * 100_003 + index)
+        self.room = f"load-pair-{index // 2}"
+        self.has_partner = (index ^ 1) < test.args.students
+        self.starter = self.rng.choice(test.programs)
+        self.edit_lines = []
+        self.seq = 0
+        self.waiting = None  # (kind, future) for the reply this student is waiting on
+        self.ws = None
+
+    async def run(self):
+        # Spread connections over the ramp so the server isn't hit by one thundering herd
+        await asyncio.sleep(self.rng.uniform(0, self.test.args.ramp))
+        while not self.test.stop:
+            try:
+                await self._session()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.test.recorder.error("connect", type(e).__name__)
+                await asyncio.sleep(1.0)
+
+    async def _session(self):
+        """One connection; returns when the student should reconnect (after a duel starts)."""
+        async with connect(self.test.ws_url, max_size=None, open_timeout=self.test.args.timeout) as ws:
+            self.ws = ws
+            reader = asyncio.create_task(self._read(ws))
+            try:
+                await self._send({"type": "code_snapshot_request"})  # joins the pair room
+                kinds, weights = zip(*self.test.mix.items())
+                while not self.test.stop:
+                    await asyncio.sleep(self.rng.expovariate(1 / self.test.args.think) if self.test.args.think else 0)
+                    kind = self.rng.choices(kinds, weights)[0]
+                    if await ACTIONS[kind](self):
+                        return
+            finally:
+                reader.cancel()
+
+    async def _send(self, message: dict):
+        await self.ws.send(json.dumps({"session_id": self.room, **message}))
+
+    async def _read(self, ws):
+        async for raw in ws:
+            message = json.loads(raw)
+            kind = message.get("type")
+            if kind == "code_delta":
+                self.test._seen("".join(str(op.get("text", "")) for op in message.get("ops", [])))
+            elif kind == "code_snapshot":
+                self.test._seen(message.get("code"))
+            elif self.waiting is not None and not self.waiting[1].done():
+                wanted, future = self.waiting
+                if wanted == "chat" and message.get("role") == "ai":
+                    future.set_result(message.get("text", ""))
+                elif wanted == "find_match" and kind in ("duel_start", "match_timeout"):
+                    future.set_result(kind)
+
+    async def _await_reply(self, kind: str, message: dict, timeout: float):
+        future = asyncio.get_running_loop().create_future()
+        self.waiting = (kind, future)
+        try:
+            await self._send(message)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.waiting = None
+
+    # --- Behaviours: each returns True when the student should reconnect ---
+    async def code_sync(self):
+        self.seq += 1
+        self.edit_lines = (self.edit_lines + [f"# edit {self.index}:{self.seq}"])[-KEPT_EDIT_LINES:]
+        if self.has_partner:
+            self.test.edits[(self.index, self.seq)] = time.perf_counter()
+        await self._send({"type": "code_sync", "code": self.starter + "\n" + "\n".join(self.edit_lines) + "\n"})
+
+    async def chat(self):
+        start = time.perf_counter()
+        try:
+            text = await self._await_reply("chat", {"type": "chat", "message": self.rng.choice(CHAT_QUESTIONS),
+                                                    "code": self.starter}, self.test.args.timeout)
+        except asyncio.TimeoutError:
+            self.test.recorder.error("chat", "timeout")
+            return True  # the socket is still busy with that call; start over
+        if text.startswith("⚠️ **System Error**"):
+            self.test.recorder.error("chat", "system_error")
+            return
+        self.test.recorder.ok("chat", time.perf_counter() - start)
+        if self.test.recorder.recording and FAKE_MARKER not in text:
+            self.test.recorder.fallback += 1
+
+    async def find_match(self):
+        start = time.perf_counter()
+        try:
+            outcome = await self._await_reply("find_match", {"type": "find_match"}, self.test.args.match_wait)
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+        if outcome == "duel_start":
+            self.test.recorder.ok("find_match", time.perf_counter() - start)
+        else:
+            self.test.recorder.error("find_match", outcome)
+        return True  # leave the duel (or the queue) by reconnecting
+
+    async def visualize(self):
+        start = time.perf_counter()
+        try:
+            # Own session id: the CPU scheduler queues and rate-limits per student, not per load generator
+            response = await self.test.http.post("/visualize", json={"code": self.starter,
+                                                                    "session_id": f"load-student-{self.index}"})
+        except httpx.HTTPError as e:
+            self.test.recorder.error("visualize", type(e).__name__)
+            return
+        if response.status_code == 200:
+            self.test.recorder.ok("visualize", time.perf_counter() - start)
+        else:
+            self.test.recorder.error("visualize", f"http_{response.status_code}")
+
+ACTIONS = {
+    "code_sync": Student.code_sync,
+    "chat": Student.chat,
+    "find_match": Student.find_match,
+    "visualize": Student.visualize,
+}
+
+def start_server(args):
+    """uvicorn on a throwaway database with the fake LLM backend."""
+    workdir = tempfile.mkdtemp(prefix="deepblue-load-")
+    env = dict(os.environ,
+               LLM_BACKEND="fake",
+               GOOGLE_API_KEY="",
+               DATABASE_URL="sqlite:///" + os.path.join(workdir, "load.db"),
+               FAKE_LLM_LATENCY=str(args.llm_latency),
+               FAKE_LLM_JITTER=str(args.llm_jitter),
+               FAKE_LLM_ERROR_RATE=str(args.llm_error_rate),
+               FAKE_EMBED_LATENCY=str(args.embed_latency),
+               FAKE_EMBED_ERROR_RATE=str(args.embed_error_rate),
+               FAKE_LLM_SEED=str(args.seed))
+    processes = []
+    if args.workers > 1:
+        # Several workers need the backplane broker, or rooms and the match queue split per worker
+        env.update(WS_BACKPLANE="unix", WS_BACKPLANE_SOCKET=os.path.join(workdir, "backplane.sock"))
+        processes.append(subprocess.Popen([sys.executable, "-m", "app.backplane"], cwd=BACKEND, env=env))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--workers", str(args.workers),
+         "--log-level", "warning"],
+        cwd=BACKEND, env=env)
+    processes.append(server)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            stop_processes(processes)
+            raise SystemExit(f"server exited with status {server.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/", timeout=1).status_code == 200:
+                return processes
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    stop_processes(processes)
+    raise SystemExit("server did not come up within 60 s")
+
+def stop_processes(processes):
+    for process in reversed(processes):
+        process.terminate()
+        process.wait(timeout=30)
+
+def report(recorder, elapsed, args):
+    print(f"\n{args.students} students, {elapsed:.0f} s measured (after a {args.ramp:.0f} s ramp), mix {args.mix}")
+    print(f"{'type':11s} {'ok/s':>8s} {'p50 ms':>9s} {'p90 ms':>9s} {'p99 ms':>9s} {'max ms':>9s} {'errors':>7s} {'err %':>6s}  reasons")
+    summary = {}
+    for kind in list(ACTIONS) + ["connect"]:
+        ok, errors = recorder.latency.get(kind, []), recorder.errors.get(kind, Counter())
+        failed = sum(errors.values())
+        if not ok and not failed:
+            continue
+        total = len(ok) + failed
+        summary[kind] = {
+            "ok": len(ok), "errors": failed, "error_rate": failed / total,
+            "throughput": len(ok) / elapsed,
+            "p50_ms": _ms(ok, 0.5), "p90_ms": _ms(ok, 0.9), "p99_ms": _ms(ok, 0.99),
+            "max_ms": max(ok) * 1000 if ok else float("nan"),
+            "error_reasons": dict(errors),
+        }
+        s = summary[kind]
+        reasons = ", ".join(f"{reason} {count}" for reason, count in errors.most_common())
+        print(f"{kind:11s} {s['throughput']:8.1f} {s['p50_ms']:9.1f} {s['p90_ms']:9.1f} {s['p99_ms']:9.1f} "
+              f"{s['max_ms']:9.1f} {failed:7d} {s['error_rate']:6.1%}  {reasons}")
+    if "chat" in summary:
+        summary["chat"]["fallback"] = recorder.fallback
+        print(f"chat answers from the offline fallback (breaker open or rate limited): {recorder.fallback}")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Classroom load test over WebSocket and HTTP.")
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds, after the ramp")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which students connect")
+    parser.add_argument("--think", type=float, default=1.0, help="mean pause between a student's actions (s)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="behaviour weights, e.g. code_sync=6,chat=1")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per request / edit delivery (s)")
+    parser.add_argument("--match-wait", type=float, default=75.0, help="find_match wait (server MATCH_TIMEOUT is 60 s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--llm-jitter", type=float, default=0.4)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="fraction of chat calls answered 429")
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--embed-error-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    processes = []
+    if not args.url:
+        processes = start_server(args)
+        args.url = f"http://127.0.0.1:{args.port}"
+    try:
+        test = LoadTest(args)
+        elapsed = asyncio.run(test.run())
+    finally:
+        stop_processes(processes)
+    summary = report(test.recorder, elapsed, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "elapsed": elapsed, "types": summary}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
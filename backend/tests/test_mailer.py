@@ -0,0 +1,196 @@
+"""
+MailWorker against a local SMTP stand-in (aiosmtpd), with the outbox in a throwaway
+SQLite database. Run from backend/:  python -m pytest -q tests
+"""
+import asyncio
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("aiosmtplib")
+pytest.importorskip("aiosqlite")
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app import mailer, models
+from app.database import Base
+
+
+class Inbox:
+    """aiosmtpd handler: records every message, or answers DATA with `reply` while it is set."""
+    def __init__(self):
+        self.messages = []
+        self.reply = None
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.reply:
+            return self.reply
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    inbox = Inbox()
+    controller = aiosmtpd_controller.Controller(inbox, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    try:
+        yield controller, inbox
+    finally:
+        controller.stop()
+
+
+@pytest.fixture(autouse=True)
+def no_login(monkeypatch):
+    # The stand-in doesn't authenticate; don't let a developer's MAIL_USERNAME trigger a login
+    monkeypatch.setattr(mailer, "MAIL_USERNAME", None)
+    monkeypatch.setattr(mailer, "MAIL_FROM", "noreply@deepblue.test")
+
+
+def _settings(port: int) -> dict:
+    return {"hostname": "127.0.0.1", "port": port, "start_tls": False,
+            "use_tls": False, "validate_certs": False, "timeout": 5}
+
+
+def _run(tmp_path, scenario):
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'outbox.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+        try:
+            return await scenario(sessions)
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
+
+
+async def _enqueue(worker, sessions, count: int):
+    async with sessions() as db:
+        for n in range(count):
+            await worker.enqueue(db, f"pilot{n}@deepblue.test", f"Mission {n}", "<b>hello</b>")
+
+
+async def _rows(sessions):
+    async with sessions() as db:
+        return (await db.execute(select(models.MailOutbox).order_by(models.MailOutbox.id))).scalars().all()
+
+
+async def _make_due(sessions):
+    # Skip the backoff instead of sleeping through it
+    async with sessions() as db:
+        await db.execute(update(models.MailOutbox).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+        await db.commit()
+
+
+def test_delivers_batch_over_one_connection(tmp_path, smtp_server):
+    controller, inbox = smtp_server
+
+    async def scenario(sessions):
+        worker = mailer.MailWorker(session_factory=sessions, settings=_settings(controller.port))
+        await _enqueue(worker, sessions, 3)
+        assert await worker.run_once() == 3
+        await _enqueue(worker, sessions, 2)
+        assert await worker.run_once() == 2
+        remaining = await _rows(sessions)
+        await worker._close()
+        return worker, remaining
+
+    worker, remaining = _run(tmp_path, scenario)
+    assert remaining == []
+    assert len(inbox.messages) == 5
+    assert inbox.messages[0].rcpt_tos == ["pilot0@deepblue.test"]
+    assert worker.stats["sent"] == 5
+    # Both batches went over the same connection
+    assert worker.stats["connections"] == 1
+
+
+def test_transient_failure_is_retried(tmp_path, smtp_server):
+    controller, inbox = smtp_server
+
+    async def scenario(sessions):
+        worker = mailer.MailWorker(session_factory=sessions, settings=_settings(controller.port))
+        await _enqueue(worker, sessions, 2)
+        inbox.reply = "451 Try again later"
+        await worker.run_once()
+        after_failure = [(row.status, row.attempts, row.last_error) for row in await _rows(sessions)]
+
+        inbox.reply = None
+        await _make_due(sessions)
+        await worker.run_once()
+        remaining = await _rows(sessions)
+        await worker._close()
+        return worker, after_failure, remaining
+
+    worker, after_failure, remaining = _run(tmp_path, scenario)
+    assert [(status, attempts) for status, attempts, _ in after_failure] == [("pending", 1), ("pending", 1)]
+    assert all("Try again later" in error for _, _, error in after_failure)
+    assert worker.stats["retried"] == 2
+    assert remaining == []
+    assert len(inbox.messages) == 2
+    # The failed DATA closed the first connection; the retry opened a second one
+    assert worker.stats["connections"] == 2
+
+
+def test_server_down_then_up(tmp_path):
+    port = _free_port()
+
+    async def scenario(sessions):
+        worker = mailer.MailWorker(session_factory=sessions, settings=_settings(port))
+        await _enqueue(worker, sessions, 1)
+        await worker.run_once()
+        row, = await _rows(sessions)
+        assert (row.status, row.attempts) == ("pending", 1)
+        assert worker.stats["connections"] == 0
+
+        inbox = Inbox()
+        controller = aiosmtpd_controller.Controller(inbox, hostname="127.0.0.1", port=port)
+        controller.start()
+        try:
+            await _make_due(sessions)
+            await worker.run_once()
+            await worker._close()
+        finally:
+            controller.stop()
+        return inbox, await _rows(sessions)
+
+    inbox, remaining = _run(tmp_path, scenario)
+    assert remaining == []
+    assert len(inbox.messages) == 1
+
+
+def test_unexpected_error_is_dead_lettered(tmp_path, smtp_server):
+    controller, inbox = smtp_server
+
+    async def scenario(sessions):
+        worker = mailer.MailWorker(session_factory=sessions, settings=_settings(controller.port), max_attempts=2)
+        await _enqueue(worker, sessions, 1)
+
+        def broken(row):
+            raise ValueError("cannot build message")
+        worker._build = broken
+
+        await worker.run_once()
+        first = [(row.status, row.attempts) for row in await _rows(sessions)]
+        await _make_due(sessions)
+        await worker.run_once()
+        second = await _rows(sessions)
+        # A failed row is never claimed again
+        await _make_due(sessions)
+        assert await worker.run_once() == 0
+        await worker._close()
+        return first, second
+
+    first, second = _run(tmp_path, scenario)
+    assert first == [("pending", 1)]
+    assert [(row.status, row.attempts, row.last_error) for row in second] == [("failed", 2, "cannot build message")]
+    assert inbox.messages == []
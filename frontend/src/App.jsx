@@ -5,6 +5,13 @@ import LoginModal from './components/LoginModal';
 import HomeScene from './three-scene/HomeScene'; 
 import TheConstruct from './components/TheConstruct'; 
 import { AnimatePresence, motion } from 'framer-motion';
+import axios from 'axios';
+
+// Every API call carries the session token issued at login/registration
+const setSessionToken = (token) => {
+  if (token) axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
+  else delete axios.defaults.headers.common['Authorization'];
+};
 
 // --- [NEW] REFACTORING GYM COMPONENT ---
 const RefactorGym = ({ onBack }) => {
@@ -208,7 +215,9 @@ function App() {
   useEffect(() => {
     const savedUser = localStorage.getItem('deepblue_user');
     if (savedUser) {
-      setUser(JSON.parse(savedUser));
+      const parsed = JSON.parse(savedUser);
+      setSessionToken(parsed.token);
+      setUser(parsed);
     }
     const handlePopState = () => {
       if (currentScreen !== 'menu') {
@@ -220,12 +229,31 @@ function App() {
     return () => window.removeEventListener('popstate', handlePopState);
   }, [currentScreen]);
 
+  // A 401 on a request that carried the token means it expired or the server's key changed:
+  // drop it and ask for a fresh login instead of resending it with every call
+  useEffect(() => {
+    const interceptor = axios.interceptors.response.use(
+      (response) => response,
+      (error) => {
+        if (error.response?.status === 401 && error.config?.headers?.Authorization) {
+          setSessionToken(null);
+          setUser(null);
+          localStorage.removeItem('deepblue_user');
+        }
+        return Promise.reject(error);
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   const handleLogin = (userData) => {
+    setSessionToken(userData.token);
     setUser(userData);
     localStorage.setItem('deepblue_user', JSON.stringify(userData));
   };
 
   const handleLogout = () => {
+    setSessionToken(null);
     setUser(null);
     localStorage.removeItem('deepblue_user');
     setCurrentScreen('menu');
@@ -268,6 +268,20 @@ const SocraticLockOverlay = ({ question, onUnlock, locked }) => {
     );
 };
 
+// --- COLLABORATIVE SYNC (mirrors backend app/code_sync.py) ---
+// Smallest single range-replace turning oldText into newText, or null if unchanged
+const diffOp = (oldText, newText) => {
+  if (oldText === newText) return null;
+  const limit = Math.min(oldText.length, newText.length);
+  let start = 0;
+  while (start < limit && oldText[start] === newText[start]) start++;
+  let endOld = oldText.length, endNew = newText.length;
+  while (endOld > start && endNew > start && oldText[endOld - 1] === newText[endNew - 1]) { endOld--; endNew--; }
+  return { from: start, to: endOld, text: newText.slice(start, endNew) };
+};
+
+const applyOps = (text, ops) => ops.reduce((t, op) => t.slice(0, op.from) + op.text + t.slice(op.to), text);
+
 const Dashboard = ({ user, initialCode, missionId, missionDesc, onBack, onUpgrade }) => {
   // --- VFS & EDITOR STATE ---
   const [files, setFiles] = useState({ 
@@ -280,6 +294,10 @@ const Dashboard = ({ user, initialCode, missionId, missionDesc, onBack, onUpgrad
   const [cognitiveStats, setCognitiveStats] = useState({}); // { lineNo: { dwell: 0, edits: 0 } }
   const [showHeatmap, setShowHeatmap] = useState(false);
   const trackingRef = useRef({ lastLine: 1, lastTime: Date.now() });
+  // Last document version/text exchanged with the room, and the live editor text for rebasing
+  const syncRef = useRef({ version: 0, text: '' });
+  const codeRef = useRef(code);
+  codeRef.current = code;
 
   // --- CORE STATE ---
   const [visualData, setVisualData] = useState(null);
@@ -441,14 +459,46 @@ const Dashboard = ({ user, initialCode, missionId, missionDesc, onBack, onUpgrad
     initMission();
 
     const socket = new WebSocket('ws://127.0.0.1:8000/ws/chat');
-    socket.onopen = () => console.log(">> Neural Link Established (WebSocket)");
+    syncRef.current = { version: 0, text: '' };
+    // Pilot: send whatever the editor has that the room's document doesn't
+    const pushEdits = () => {
+        const sync = syncRef.current;
+        const op = diffOp(sync.text, codeRef.current);
+        if (!op) return;
+        socket.send(JSON.stringify({ type: "code_ops", session_id: sessionKey, base_version: sync.version, ops: [op] }));
+        sync.version += 1;
+        sync.text = codeRef.current;
+    };
+    socket.onopen = () => {
+        console.log(">> Neural Link Established (WebSocket)");
+        if (sessionKey && crewRole) {
+            // Joining the room makes the server send its current document (if any)
+            socket.send(JSON.stringify({ type: "join", session_id: sessionKey }));
+            if (crewRole === 'pilot') pushEdits();
+        }
+    };
     socket.onmessage = (event) => {
         const data = JSON.parse(event.data);
         
         // --- MULTIPLAYER HANDLERS ---
-        if (data.type === "code_update") {
+        if (data.type === "code_delta") {
             if (crewRole === 'navigator') {
-                setFiles(prev => ({ ...prev, [activeFile]: data.code })); 
+                const sync = syncRef.current;
+                if (data.base_version !== sync.version) {
+                    // Missed a delta: fetch the whole document instead of guessing
+                    socket.send(JSON.stringify({ type: "code_snapshot_request", session_id: sessionKey }));
+                } else {
+                    sync.text = applyOps(sync.text, data.ops);
+                    sync.version = data.version;
+                    setFiles(prev => ({ ...prev, [activeFile]: sync.text }));
+                }
+            }
+        } else if (data.type === "code_snapshot") {
+            syncRef.current = { version: data.version, text: data.code };
+            if (crewRole === 'navigator') {
+                setFiles(prev => ({ ...prev, [activeFile]: data.code }));
+            } else if (crewRole === 'pilot') {
+                pushEdits(); // rebase local edits onto the server's document
             }
         } else if (data.type === "terminal_update") {
             if (crewRole === 'navigator') {
@@ -459,15 +509,34 @@ const Dashboard = ({ user, initialCode, missionId, missionDesc, onBack, onUpgrad
             setIsMatchmaking(false);
             setSessionKey(data.duel_id);
             setOutput("\n>> DUEL PROTOCOL INITIATED. OPPONENT FOUND.\n");
+        } else if (data.type === "match_timeout") {
+            setIsMatchmaking(false);
+            setOutput(`\n>> ${data.msg}\n`);
         } else if (data.type === "opponent_visual") {
             setOpponentVisualData(data.data);
+        } else if (data.type === "duel_mission") {
+            const mission = data.mission;
+            const mainFile = mission?.meta?.main_file || 'main.py';
+            setMissionData(mission);
+            setFiles({ [mainFile]: mission.starter_code });
+            setActiveFile(mainFile);
+            setOutput(prev => prev + `>> DUEL MISSION: ${mission.title}\n`);
+        } else if (data.type === "opponent_submitted") {
+            setOutput(prev => prev + "\n>> OPPONENT HAS SUBMITTED A SOLUTION.\n");
         } else if (data.type === "duel_end") {
+            const timing = (r) => !r ? "n/a"
+                : r.correct ? `${r.passed}/${r.total} passed, median ${r.median_ms} ms`
+                : `${r.passed}/${r.total} passed${r.error ? ` (${r.error})` : ""}`;
+            const breakdown = data.reason === 'judged'
+                ? `\n   YOU:      ${timing(data.you)}\n   OPPONENT: ${timing(data.opponent)}\n` : "";
             if (data.result === 'lose') {
                 setSystemOverload(true);
-                setOutput("\n>> SYSTEM OVERLOAD: OPPONENT VICTORY DETECTED.\n");
+                setOutput("\n>> SYSTEM OVERLOAD: OPPONENT VICTORY DETECTED.\n" + breakdown);
                 setTimeout(() => setSystemOverload(false), 3000);
             } else if (data.result === 'win') {
-                setOutput("\n>> VICTORY: OPPONENT SYSTEM COMPROMISED.\n");
+                setOutput("\n>> VICTORY: OPPONENT SYSTEM COMPROMISED.\n" + breakdown);
+            } else if (data.result === 'draw') {
+                setOutput("\n>> STALEMATE: NEITHER SYSTEM PREVAILED.\n" + breakdown);
             }
         } else if (data.type === "duel_challenge") {
             // SOCRATIC BATTLE: LOCK SCREEN
@@ -536,12 +605,16 @@ const Dashboard = ({ user, initialCode, missionId, missionDesc, onBack, onUpgrad
               updateDwellTime(trackingRef.current.lastLine); // Flush last timer
               setTimeout(() => setShowHeatmap(true), 1500);
 
-              await axios.post('http://localhost:8000/submit-score', {
+              const scoreRes = await axios.post('http://localhost:8000/submit-score', {
                   user_id: user.id,
                   mission_id: missionId,
                   execution_time: 0.05, 
-                  memory_usage: 12.5
+                  memory_usage: 12.5,
+                  code: files[mainFile]
               });
+              if (scoreRes.data.complexity?.feedback) {
+                  setOutput(prev => prev + `\n>> ${scoreRes.data.complexity.feedback}`);
+              }
           }
       } catch (error) {
           console.error(error);
@@ -728,8 +801,9 @@ test_db_conn.close()
               if (allPassed) {
                   // --- DUEL WIN LOGIC ---
                   if (gameMode === 'duel') {
-                      ws.send(JSON.stringify({ type: "duel_win", session_id: sessionKey }));
-                      setOutput(prev => prev + "\n>> VICTORY: OPPONENT SYSTEM OVERLOADED.\n");
+                      // The server re-runs both solutions and decides the duel
+                      ws.send(JSON.stringify({ type: "duel_submit", session_id: sessionKey, code: codeToExecute }));
+                      setOutput(prev => prev + "\n>> SOLUTION TRANSMITTED. AWAITING JUDGE.\n");
                   }
                   
                   if ('AudioContext' in window) {
@@ -808,6 +882,24 @@ test_db_conn.close()
     }));
   };
 
+  const handleProfile = async () => {
+    setLoading(true);
+    try {
+        const response = await axios.post('http://127.0.0.1:8000/profile', {
+            code: code, is_premium: isPremium
+        });
+        const { profile, visual_data } = response.data;
+        if (visual_data) setVisualData(visual_data);
+        const hottest = [...profile.lines].sort((a, b) => b.time_ms - a.time_ms).slice(0, 3)
+            .map(l => `   line ${l.lineno}: ${l.time_ms.toFixed(2)} ms${l.hits != null ? ` (${l.hits} hits)` : ''}`).join('\n');
+        const status = profile.stopped ? `STOPPED (${profile.stopped}) — likely a runaway loop` : (profile.error || 'OK');
+        setOutput(`>> PROFILE [${profile.mode}]: ${status}, ${profile.total_ms ?? '—'} ms\n${hottest}`);
+    } catch (e) {
+        setOutput(">> Error: Profiler unavailable.");
+    }
+    setLoading(false);
+  };
+
   const handleChatSend = (text) => {
       if (ws && ws.readyState === WebSocket.OPEN) {
           setChatMessages(prev => [...prev, { role: 'user', text }]);
@@ -824,7 +916,8 @@ test_db_conn.close()
   const startMatchmaking = () => {
       setIsMatchmaking(true);
       if (ws && ws.readyState === WebSocket.OPEN) {
-          ws.send(JSON.stringify({ type: "find_match" }));
+          // Identity lets the server pair players of similar rating
+          ws.send(JSON.stringify({ type: "find_match", token: user.token, user_id: user.id }));
       }
   };
 
@@ -848,11 +941,19 @@ test_db_conn.close()
       setFiles(prev => ({ ...prev, [activeFile]: newCode }));
       
       if (gameMode === 'bridge' && crewRole === 'pilot' && ws && ws.readyState === WebSocket.OPEN) {
-          ws.send(JSON.stringify({
-              type: "code_sync",
-              session_id: sessionKey,
-              code: newCode
-          }));
+          // Only the changed range goes over the wire; the server batches it with nearby edits
+          const sync = syncRef.current;
+          const op = diffOp(sync.text, newCode);
+          if (op) {
+              ws.send(JSON.stringify({
+                  type: "code_ops",
+                  session_id: sessionKey,
+                  base_version: sync.version,
+                  ops: [op]
+              }));
+              sync.version += 1;
+              sync.text = newCode;
+          }
       }
   };
 
@@ -1095,6 +1196,10 @@ test_db_conn.close()
                             {loading ? <span className="animate-spin rounded-full h-3 w-3 border-2 border-emerald-400 border-t-transparent"></span> : <Icons.Run />}
                             <span>Execute</span>
                         </button>
+                        <button onClick={handleProfile} disabled={loading} title="Per-line hits and time; premium shows it as a heatmap on the graph" className="px-4 py-2 rounded-lg bg-orange-500/10 hover:bg-orange-500/20 text-orange-400 border border-orange-500/20 transition-all text-xs font-bold uppercase tracking-wider flex items-center gap-2 disabled:opacity-50">
+                            <Icons.Fire />
+                            <span>Profile</span>
+                        </button>
                         <button onClick={handleAnalyze} disabled={loading} className="px-5 py-2 rounded-lg bg-blue-600 hover:bg-blue-500 text-white shadow-lg shadow-blue-600/20 transition-all text-xs font-bold uppercase tracking-wider flex items-center gap-2 disabled:opacity-50 hover:shadow-[0_0_20px_rgba(37,99,235,0.5)]">
                             <Icons.Analyze />
                             <span>Analyze</span>
@@ -114,7 +114,8 @@ const LoginModal = ({ onLogin }) => {
                 onLogin({
                     id: response.data.user_id,
                     username: username,
-                    is_premium: response.data.is_premium
+                    is_premium: response.data.is_premium,
+                    token: response.data.token
                 });
             }, 500);
         } catch (err) {
@@ -145,7 +146,8 @@ const LoginModal = ({ onLogin }) => {
                 onLogin({
                     id: response.data.user_id,
                     username: username,
-                    is_premium: response.data.is_premium
+                    is_premium: response.data.is_premium,
+                    token: response.data.token
                 });
             }, 500);
         } catch (err) {
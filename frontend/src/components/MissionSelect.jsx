@@ -62,6 +62,7 @@ const LeaderboardModal = ({ missionId, onClose }) => {
                                 <tr className="text-slate-500 border-b border-white/5">
                                     <th className="pb-2">Rank</th>
                                     <th className="pb-2">Operative</th>
+                                    <th className="pb-2">Growth</th>
                                     <th className="pb-2 text-right">Time</th>
                                 </tr>
                             </thead>
@@ -70,6 +71,7 @@ const LeaderboardModal = ({ missionId, onClose }) => {
                                     <tr key={s.id} className="text-slate-300">
                                         <td className="py-2 pl-1 font-mono text-cyan-500">#{i + 1}</td>
                                         <td className="py-2 font-bold">{s.username}</td>
+                                        <td className="py-2 font-mono text-slate-400" title={s.complexity_confidence != null ? `confidence ${Math.round(s.complexity_confidence * 100)}%` : undefined}>{s.complexity || '—'}</td>
                                         <td className="py-2 text-right font-mono text-emerald-400">{s.execution_time.toFixed(4)}s</td>
                                     </tr>
                                 ))}
@@ -154,8 +154,7 @@ const ProblemDataStrip = ({ problem, index, onClick }) => {
 // --- MAIN COMPONENT ---
 
 const ProblemList = ({ user, onSelectMission }) => {
-  const [missions, setMissions] = useState([]);
-  const [filteredMissions, setFilteredMissions] = useState([]);
+  const [currentItems, setCurrentItems] = useState([]);
   const [loading, setLoading] = useState(true);
   
   // Filter States
@@ -163,58 +162,45 @@ const ProblemList = ({ user, onSelectMission }) => {
   const [selectedCategory, setSelectedCategory] = useState('All Topics');
   const [selectedDifficulty, setSelectedDifficulty] = useState('Difficulty');
   
-  // Pagination
+  // Pagination (server-side: the API filters and slices, we only receive one page)
   const [currentPage, setCurrentPage] = useState(1);
+  const [totalPages, setTotalPages] = useState(0);
+  const [stats, setStats] = useState({ total: 0, solved: 0, topics: [] });
   const itemsPerPage = 8;
 
+  // Any filter change returns to the first page
   useEffect(() => {
+    setCurrentPage(1);
+  }, [searchTerm, selectedCategory, selectedDifficulty]);
+
+  useEffect(() => {
+    if (!user) return;
+    const params = { user_id: user.id, page: currentPage, page_size: itemsPerPage };
+    if (searchTerm) params.search = searchTerm;
+    if (selectedCategory !== 'All Topics') params.topic = selectedCategory;
+    if (selectedDifficulty !== 'Difficulty') params.difficulty = selectedDifficulty;
+
+    let cancelled = false;
     const fetchProblems = async () => {
       try {
-        const response = await axios.get(`http://localhost:8000/problems?user_id=${user.id}`);
-        setMissions(response.data);
-        setFilteredMissions(response.data);
+        const response = await axios.get('http://localhost:8000/problems', { params });
+        if (cancelled) return;
+        const data = response.data;
+        setCurrentItems(data.items);
+        setTotalPages(Math.ceil(data.total / data.page_size));
+        setStats({ total: data.catalog_total, solved: data.solved_total, topics: data.topics });
       } catch (error) {
         console.error("Failed to fetch problems", error);
       } finally {
-        setLoading(false);
+        if (!cancelled) setLoading(false);
       }
     };
-    if (user) fetchProblems();
-  }, [user]);
-
-  // Handle Filtering
-  useEffect(() => {
-    let result = missions;
-
-    if (searchTerm) {
-      const lowerTerm = searchTerm.toLowerCase();
-      result = result.filter(m => 
-        m.title.toLowerCase().includes(lowerTerm) ||
-        (m.topic && m.topic.toLowerCase().includes(lowerTerm))
-      );
-    }
-
-    if (selectedCategory !== 'All Topics') {
-      result = result.filter(m => m.topic === selectedCategory);
-    }
-
-    if (selectedDifficulty !== 'Difficulty') {
-      result = result.filter(m => 
-          m.difficulty && m.difficulty.toLowerCase() === selectedDifficulty.toLowerCase()
-      );
-    }
-
-    setFilteredMissions(result);
-    setCurrentPage(1); 
-  }, [searchTerm, selectedCategory, selectedDifficulty, missions]);
-
-  // Pagination Logic
-  const indexOfLastItem = currentPage * itemsPerPage;
-  const indexOfFirstItem = indexOfLastItem - itemsPerPage;
-  const currentItems = filteredMissions.slice(indexOfFirstItem, indexOfLastItem);
-  const totalPages = Math.ceil(filteredMissions.length / itemsPerPage);
+    // Debounce so typing in the search bar doesn't fire a request per keystroke
+    const timer = setTimeout(fetchProblems, searchTerm ? 250 : 0);
+    return () => { cancelled = true; clearTimeout(timer); };
+  }, [user, currentPage, searchTerm, selectedCategory, selectedDifficulty]);
 
-  const categories = ['All Topics', ...new Set(missions.map(m => m.topic).filter(Boolean))];
+  const categories = ['All Topics', ...stats.topics];
 
   return (
     <div className="font-sans text-slate-300">
@@ -234,11 +220,11 @@ const ProblemList = ({ user, onSelectMission }) => {
         <div className="flex gap-4">
             <div className="bg-[#0f172a]/60 border border-white/5 px-4 py-2 rounded-xl backdrop-blur-sm">
                 <span className="block text-[10px] text-slate-500 font-bold uppercase tracking-widest">Total</span>
-                <span className="text-xl font-mono text-white">{missions.length}</span>
+                <span className="text-xl font-mono text-white">{stats.total}</span>
             </div>
             <div className="bg-[#0f172a]/60 border border-white/5 px-4 py-2 rounded-xl backdrop-blur-sm">
                 <span className="block text-[10px] text-slate-500 font-bold uppercase tracking-widest">Solved</span>
-                <span className="text-xl font-mono text-emerald-400">{missions.filter(m => m.status === 'Solved').length}</span>
+                <span className="text-xl font-mono text-emerald-400">{stats.solved}</span>
             </div>
         </div>
       </div>
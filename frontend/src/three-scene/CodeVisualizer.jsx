@@ -376,8 +376,15 @@ const GhostNode = React.memo(({ position, type, label, isActive }) => {
 });
 
 
-const GraphNode = React.memo(({ position, type, label, isActive }) => {
-    const style = NODE_STYLE_MAP[type?.toLowerCase()] || NODE_STYLE_MAP.default;
+// Profiler heat (0..1, share of run time) blended from the node's own color towards red
+const heatColor = (baseColor, heat) => {
+    if (heat == null) return baseColor;
+    return '#' + new THREE.Color(baseColor).lerp(new THREE.Color('#ef4444'), Math.sqrt(heat)).getHexString();
+};
+
+const GraphNode = React.memo(({ position, type, label, isActive, heat, hits, timeMs }) => {
+    const baseStyle = NODE_STYLE_MAP[type?.toLowerCase()] || NODE_STYLE_MAP.default;
+    const style = heat == null ? baseStyle : { ...baseStyle, color: heatColor(baseStyle.color, heat) };
     const meshRef = useRef();
     const [hovered, setHover] = useState(false);
     
@@ -438,6 +445,9 @@ const GraphNode = React.memo(({ position, type, label, isActive }) => {
                     <div className="bg-black/80 text-white text-[10px] p-2 rounded border border-blue-500/50 whitespace-nowrap backdrop-blur-md">
                         <strong className="block text-blue-400 uppercase">{style.text}</strong>
                         {label}
+                        {timeMs != null && (
+                            <span className="block text-orange-300">{timeMs.toFixed(2)} ms{hits != null ? ` · ${hits} hits` : ''}</span>
+                        )}
                     </div>
                 </Html>
             )}
@@ -445,6 +455,15 @@ const GraphNode = React.memo(({ position, type, label, isActive }) => {
     );
 });
 
+// Fallback for graphs without the server's line_index (e.g. an opponent's older payload)
+const buildLineIndex = (nodes) => {
+    const index = {};
+    nodes.forEach(n => {
+        if (n.lineno != null) (index[n.lineno] = index[n.lineno] || []).push(n.id);
+    });
+    return index;
+};
+
 // --- MAIN DYNAMIC SCENE ---
 const DynamicASTVisualization = ({ data, trace, ghostTrace }) => {
     const positionedNodes = useForceLayout(data.nodes, data.links);
@@ -455,6 +474,7 @@ const DynamicASTVisualization = ({ data, trace, ghostTrace }) => {
 
     // Utility map for quick lookups
     const positionedNodesMap = new Map(positionedNodes.map(n => [n.id, n]));
+    const lineIndex = useMemo(() => data.line_index || buildLineIndex(data.nodes), [data]);
     
     // Playback Logic (Active Trace)
     useEffect(() => {
@@ -469,20 +489,20 @@ const DynamicASTVisualization = ({ data, trace, ghostTrace }) => {
                 return;
             }
 
-            const lineNo = trace[step];
-            const node = positionedNodes.find(n => n.lineno === lineNo);
+            // Server-side line index: the first id on a line is its outermost statement
+            const nodeId = lineIndex[trace[step]]?.[0];
             
-            if (node) {
-                if (activeNodeId !== null && activeNodeId !== node.id) {
-                    setActiveLink({ source: activeNodeId, target: node.id });
+            if (nodeId !== undefined) {
+                if (activeNodeId !== null && activeNodeId !== nodeId) {
+                    setActiveLink({ source: activeNodeId, target: nodeId });
                 }
-                setActiveNodeId(node.id);
+                setActiveNodeId(nodeId);
             }
             step++;
         }, 500); 
 
         return () => clearInterval(interval);
-    }, [trace, positionedNodes]);
+    }, [trace, lineIndex]);
     
     // Ghost Playback Logic (Passive Trace)
     useEffect(() => {
@@ -491,11 +511,6 @@ const DynamicASTVisualization = ({ data, trace, ghostTrace }) => {
             return;
         }
 
-        const nodesMapByLine = new Map();
-        positionedNodes.forEach(n => {
-            if (n.lineno) nodesMapByLine.set(n.lineno, n.id);
-        });
-        
         let ghostStep = 0;
         let lastTime = ghostTrace[0].timestamp;
         
@@ -511,9 +526,9 @@ const DynamicASTVisualization = ({ data, trace, ghostTrace }) => {
             const nextEvent = ghostTrace[ghostStep + 1];
 
             const lineNo = currentEvent.line;
-            const nodeId = nodesMapByLine.get(lineNo);
+            const nodeId = lineIndex[lineNo]?.[0];
             
-            if (nodeId) {
+            if (nodeId !== undefined) {
                 // Ghost Link activation
                 if (activeGhostNodeId !== null && activeGhostNodeId !== nodeId) {
                     setActiveGhostLink({ source: activeGhostNodeId, target: nodeId });
@@ -549,7 +564,7 @@ const DynamicASTVisualization = ({ data, trace, ghostTrace }) => {
         }, 500); // Fixed interval for simple visual ghost effect
 
         return () => clearInterval(ghostInterval);
-    }, [ghostTrace, positionedNodes]);
+    }, [ghostTrace, lineIndex]);
 
 
     const renderableLinks = data.links.map(link => {
@@ -607,6 +622,9 @@ const DynamicASTVisualization = ({ data, trace, ghostTrace }) => {
                     type={node.type} 
                     label={node.label} 
                     isActive={node.id === activeNodeId} 
+                    heat={node.heat}
+                    hits={node.hits}
+                    timeMs={node.time_ms}
                 />
             ))}
             